@@ -16,17 +16,33 @@ TO_NUMBER = os.getenv('PHONE_NUMBER')
 
 # paths
 DATA_SCREEN_TIME_DIR = os.path.join("..", "data", "screen_time")
-DATA_SCREEN_TIME_PICKLE = os.path.join("..", "data", "screen_time", "screen_time.pickle")
 DATA_CALENDAR_DIR = os.path.join("..", "data", "calendar")
 DATA_CALENDAR = os.path.join("..", "data", "calendar", "CT_calendar.CSV")
-DATA_CALENDAR_PICKLE = os.path.join("..", "data", "calendar", "CT_calendar.pickle")
 DATA_JOURNAL_DIR = os.path.join("..", "data", "journal")
 DATA_JOURNAL_TXT_FILE = os.path.join("..", "data", "journal", "journal.txt")
 DATA_JOURNAL_JSON_FILE = os.path.join("..", "data", "journal", "journal.json")
-DATA_JOURNAL_PICKLE = os.path.join("..", "data", "journal", "journal.pickle")
+DATA_JOURNAL_DB = os.path.join("..", "data", "journal", "journal.sqlite")
 
 DATA_WEEKLY_NOTES_DIR = os.path.join("..", "data", "weekly_notes")
-DATA_WEEKLY_NOTES_PICKLE = os.path.join("..", "data", "weekly_notes", "weekly_notes.pickle")
 
-DATA_WEEKLY_PERCEPTION_PICKLE = os.path.join("..", "data", "weekly_perception", "weekly_perception.pickle")
 DATA_WEEKLY_PERCEPTION_JSON_FILE = os.path.join("..", "data", "weekly_perception", "weekly_perception.json")
+
+# columnar store (project_s/storage.py): Parquet datasets partitioned by week_id, written
+# by data_prep (save_dataset, or update_*_store(folder, key, DATA_*_STORE)) and read by
+# batch.load_user_state. Older pickles: see ingestion.migrate_pickle_store.
+DATA_STORE_DIR = os.path.join("..", "data", "store")
+DATA_SCREEN_TIME_STORE = os.path.join(DATA_STORE_DIR, "screen_time")
+DATA_CALENDAR_STORE = os.path.join(DATA_STORE_DIR, "calendar")
+DATA_JOURNAL_STORE = os.path.join(DATA_STORE_DIR, "journal")
+DATA_JOURNAL_TRANSCRIPTS_STORE = os.path.join(DATA_STORE_DIR, "journal_transcripts")
+DATA_WEEKLY_NOTES_STORE = os.path.join(DATA_STORE_DIR, "weekly_notes")
+DATA_WEEKLY_PERCEPTION_STORE = os.path.join(DATA_STORE_DIR, "weekly_perception")
+
+DATA_VISION_CACHE_DIR = os.path.join("..", "data", "cache", "vision")
+DATA_REFLECTION_CACHE_DIR = os.path.join("..", "data", "cache", "reflection")
+DATA_ARCHETYPE_CACHE_DIR = os.path.join("..", "data", "cache", "archetypes")
+DATA_WHISPER_OUTBOX = os.path.join("..", "data", "whisper_outbox.sqlite")
+DATA_WHISPER_SINK = os.path.join("..", "data", "whisper_sink.jsonl")
+DATA_CHECKPOINT_DB = os.path.join("..", "data", "checkpoints.sqlite")
+DATA_METRICS_JSONL = os.path.join("..", "data", "metrics", "calls.jsonl")
+DATA_METRICS_PROM = os.path.join("..", "data", "metrics", "project_s.prom")
@@ -0,0 +1,172 @@
+import os
+import time
+import asyncio
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from tqdm import tqdm
+from graph import build_graph, build_async_graph
+from graph_state import GraphState
+from openai_client import close_async_clients
+from transports import close_transports
+
+
+DEFAULT_MAX_CONCURRENCY = 8
+# perceive is local pandas work; reflect (GPT-4o) and whisper (Twilio) hit rate-limited APIs
+DEFAULT_STAGE_LIMITS = {"reflect": 4, "whisper": 2}
+
+
+def load_user_state(data_dir: str, **state_fields) -> GraphState:
+    """
+    Build a GraphState from one user's data folder.
+
+    Expects the layout produced by data_prep.ipynb:
+        journal/journal.txt, and the Parquet stores (storage.save_dataset)
+        store/weekly_notes, store/screen_time, store/calendar
+
+    The stores are passed as lazy handles, so only the target week is ever read.
+    (Data kept as pickles by earlier versions: see ingestion.migrate_pickle_store.)
+
+    Args:
+        data_dir (str): The user's data folder.
+        **state_fields: Remaining GraphState fields (credentials, phone numbers, target_week, ...).
+    """
+    with open(os.path.join(data_dir, "journal", "journal.txt"), "r", encoding="utf-8") as f:
+        journal_text = f.read()
+
+    return GraphState(
+        journal_text=journal_text,
+        weekly_notes=os.path.join(data_dir, "store", "weekly_notes"),
+        screen_time=os.path.join(data_dir, "store", "screen_time"),
+        calendar=os.path.join(data_dir, "store", "calendar"),
+        **state_fields,
+    )
+
+
+def _ok_row(user_id, final_state: GraphState, latency: float) -> dict:
+    whisper_status = (final_state.whisper_status or {}).get("status")
+    return {"user_id": user_id, "status": "ok", "latency_s": round(latency, 2),
+            "error": None, "whisper_status": whisper_status}
+
+
+def _failed_row(user_id, error: Exception) -> dict:
+    print(f"❌ {user_id}: {error}")
+    return {"user_id": user_id, "status": "failed", "latency_s": None,
+            "error": f"{type(error).__name__}: {error}", "whisper_status": None}
+
+
+def _summarize(rows: list, started: float, summary_path: str = None) -> pd.DataFrame:
+    summary = pd.DataFrame(rows, columns=["user_id", "status", "latency_s", "error", "whisper_status"])
+    summary = summary.sort_values("user_id").reset_index(drop=True)
+
+    elapsed = time.perf_counter() - started
+    failed = int((summary["status"] == "failed").sum())
+    print(f"✅ {len(summary) - failed}/{len(summary)} users in {elapsed:.1f}s ({failed} failed)")
+
+    if summary_path:
+        summary.to_csv(summary_path, index=False)
+    return summary
+
+
+def run_batch(
+    users: dict,
+    max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+    stage_limits: dict = None,
+    summary_path: str = None,
+    graph=None,
+    checkpointer=None,
+):
+    """
+    Run the reflection graph for many users concurrently.
+
+    Each user runs on its own worker thread; stage_limits caps how many users can be
+    inside a given node at once (so e.g. only 2 Twilio sends are in flight). A failing
+    user is recorded and does not affect the others.
+
+    Args:
+        users (dict): user_id → GraphState, or user_id → callable returning one
+            (e.g. functools.partial(load_user_state, data_dir, ...)) so loading also runs in the pool.
+        max_concurrency (int): Users processed at the same time.
+        stage_limits (dict): Per-node concurrency caps; DEFAULT_STAGE_LIMITS if None.
+        summary_path (str): Optional CSV path for the per-user summary.
+        graph: A compiled graph to reuse; built with stage_limits if None.
+        checkpointer (Checkpointer): Checkpoint every node of the built graph, so failed
+            users can be continued with graph.resume (see checkpointer.runs("failed")).
+
+    Returns:
+        tuple: (final_states, summary). final_states maps user_id → final GraphState for
+        successful users; summary is a DataFrame with user_id, status, latency_s, error
+        and whisper_status.
+    """
+    if graph is None:
+        graph = build_graph(DEFAULT_STAGE_LIMITS if stage_limits is None else stage_limits, checkpointer=checkpointer)
+
+    def _run(user_id, state):
+        started = time.perf_counter()
+        if callable(state):
+            state = state()
+        if state.user_id is None:
+            state.user_id = str(user_id)  # keys the whisper outbox, if one is configured
+        final_state = GraphState(**graph.invoke(state))
+        return final_state, time.perf_counter() - started
+
+    final_states = {}
+    rows = []
+    started = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=max_concurrency) as pool:
+        futures = {pool.submit(_run, user_id, state): user_id for user_id, state in users.items()}
+        for future in tqdm(as_completed(futures), total=len(futures), desc="users"):
+            user_id = futures[future]
+            try:
+                final_state, latency = future.result()
+            except Exception as e:
+                rows.append(_failed_row(user_id, e))
+                continue
+
+            final_states[user_id] = final_state
+            rows.append(_ok_row(user_id, final_state, latency))
+
+    return final_states, _summarize(rows, started, summary_path)
+
+
+async def run_batch_async(
+    users: dict,
+    max_concurrency: int = 100,
+    stage_limits: dict = None,
+    summary_path: str = None,
+    graph=None,
+    checkpointer=None,
+):
+    """
+    Async run_batch: every user is a task on one event loop, driving the async graph.
+
+    Same arguments and return value as run_batch; max_concurrency can be much higher
+    since an in-flight user costs a coroutine, not a thread. Callables in `users`
+    (data loading) run in worker threads.
+    """
+    if graph is None:
+        graph = build_async_graph(DEFAULT_STAGE_LIMITS if stage_limits is None else stage_limits, checkpointer=checkpointer)
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def _run(user_id, state):
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                if callable(state):
+                    state = await asyncio.to_thread(state)
+                if state.user_id is None:
+                    state.user_id = str(user_id)
+                final_state = GraphState(**await graph.ainvoke(state))
+            except Exception as e:
+                return user_id, None, _failed_row(user_id, e)
+            return user_id, final_state, _ok_row(user_id, final_state, time.perf_counter() - started)
+
+    started = time.perf_counter()
+    try:
+        results = await asyncio.gather(*(_run(user_id, state) for user_id, state in users.items()))
+    finally:
+        await close_async_clients()
+        await close_transports()
+
+    final_states = {user_id: final_state for user_id, final_state, _ in results if final_state is not None}
+    return final_states, _summarize([row for _, _, row in results], started, summary_path)
@@ -0,0 +1,245 @@
+import os
+import io
+import json
+import time
+import uuid
+import pickle
+import sqlite3
+import hashlib
+import threading
+import weakref
+from datetime import datetime
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from graph_state import GraphState
+from data_handles import FrameHandle
+
+
+# Graph checkpoints in SQLite. After each node the GraphState is saved under its
+# run_id, so a run that fails (say, on a Twilio outage) resumes from the last
+# completed node instead of paying for perception and the GPT-4o reflection again.
+#
+# In-memory datasets (FrameHandle) are stored as zstd Parquet (dtypes, categories
+# included, round-trip exactly), keyed by content hash: the frames are written once
+# per run, not once per node. Parquet-backed handles are stored as their folder only.
+# The remaining fields are pickled. Secrets are never stored; pass them again to resume().
+START = "__start__"  # checkpoint of the input state, saved before the first node
+SECRET_FIELDS = ("twilio_token", "openai_key")
+PARQUET_COMPRESSION = "zstd"
+
+# Run statuses: running → done, or failed (resumable)
+RUNNING, DONE, FAILED = "running", "done", "failed"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    user_id TEXT,
+    status TEXT NOT NULL,
+    last_node TEXT,
+    failed_node TEXT,
+    error TEXT,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runs_status ON runs (status);
+CREATE TABLE IF NOT EXISTS checkpoints (
+    run_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    node TEXT NOT NULL,
+    fields BLOB NOT NULL,
+    frames TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    PRIMARY KEY (run_id, seq)
+);
+CREATE TABLE IF NOT EXISTS frames (
+    hash TEXT PRIMARY KEY,
+    format TEXT NOT NULL,
+    data BLOB NOT NULL
+);
+"""
+
+
+def _now() -> str:
+    return datetime.now().isoformat(timespec="seconds")
+
+
+def frame_to_bytes(df: pd.DataFrame) -> tuple:
+    """(format, bytes) of df: Parquet, or pickle for object columns Arrow cannot type."""
+    try:
+        table = pa.Table.from_pandas(df)
+        buffer = io.BytesIO()
+        pq.write_table(table, buffer, compression=PARQUET_COMPRESSION)
+        return "parquet", buffer.getvalue()
+    except (pa.ArrowException, TypeError, ValueError):
+        return "pickle", pickle.dumps(df, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def frame_from_bytes(fmt: str, data: bytes) -> pd.DataFrame:
+    if fmt == "parquet":
+        return pq.read_table(pa.BufferReader(data)).to_pandas()
+    return pickle.loads(data)
+
+
+class Checkpointer:
+    """
+    SQLite-backed GraphState checkpoints, one sequence per run.
+
+    Usage:
+        checkpointer = Checkpointer(DATA_CHECKPOINT_DB)
+        graph = build_graph(checkpointer=checkpointer)
+        graph.invoke(GraphState(run_id="alice-2025-26", ...))  # fails in whisper
+        final_state = resume("alice-2025-26", checkpointer, twilio_token=..., openai_key=...)
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        # id(df) → (weakref, hash) of frames already stored by this process
+        self._frame_hashes = {}
+        with self._lock, self._conn:
+            self._conn.executescript(SCHEMA)
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def _frame_hash(self, df: pd.DataFrame) -> tuple:
+        """(hash, format, bytes) of df; bytes is None when this process already stored it."""
+        known = self._frame_hashes.get(id(df))
+        if known is not None and known[0]() is df:
+            return known[1], None, None
+
+        fmt, data = frame_to_bytes(df)
+        frame_hash = hashlib.sha256(data).hexdigest()
+        # Nodes replace frames rather than mutate them, so identity stands for content
+        self._frame_hashes[id(df)] = (weakref.ref(df), frame_hash)
+        return frame_hash, fmt, data
+
+    def save(self, state: GraphState, node: str) -> None:
+        """Checkpoint state as completed up to node (START for the input state)."""
+        fields, frames, new_frames = {}, {}, []
+        for name in GraphState.model_fields:
+            if name in SECRET_FIELDS:
+                continue
+            value = getattr(state, name)
+            if isinstance(value, FrameHandle):
+                value = value.load()  # restored into a handle by GraphState's validator
+            if isinstance(value, pd.DataFrame):
+                frame_hash, fmt, data = self._frame_hash(value)
+                frames[name] = frame_hash
+                if data is not None:
+                    new_frames.append((frame_hash, fmt, data))
+            else:
+                fields[name] = value
+        blob = pickle.dumps(fields, protocol=pickle.HIGHEST_PROTOCOL)
+
+        now = _now()
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT OR IGNORE INTO frames (hash, format, data) VALUES (?, ?, ?)", new_frames)
+            seq = self._conn.execute(
+                "SELECT COALESCE(MAX(seq), -1) + 1 FROM checkpoints WHERE run_id = ?", (state.run_id,)
+            ).fetchone()[0]
+            self._conn.execute(
+                "INSERT INTO checkpoints (run_id, seq, node, fields, frames, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (state.run_id, seq, node, blob, json.dumps(frames), now),
+            )
+            self._conn.execute(
+                """
+                INSERT INTO runs (run_id, user_id, status, last_node, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (run_id) DO UPDATE SET
+                    status = excluded.status, last_node = excluded.last_node,
+                    failed_node = NULL, error = NULL, updated_at = excluded.updated_at
+                """,
+                (state.run_id, state.user_id, RUNNING, node, now, now),
+            )
+
+    def mark_failed(self, run_id: str, node: str, error: Exception) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE runs SET status = ?, failed_node = ?, error = ?, updated_at = ? WHERE run_id = ?",
+                (FAILED, node, f"{type(error).__name__}: {error}", _now(), run_id),
+            )
+
+    def mark_done(self, run_id: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE runs SET status = ?, updated_at = ? WHERE run_id = ?", (DONE, _now(), run_id))
+
+    def load(self, run_id: str, **state_fields) -> tuple:
+        """
+        The latest checkpoint of run_id.
+
+        Args:
+            run_id (str): The run.
+            **state_fields: Fields to set on the restored state (secrets, or e.g. a corrected twilio_to).
+
+        Returns:
+            tuple: (GraphState, node it was saved after).
+
+        Raises:
+            KeyError: No checkpoint for run_id.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT node, fields, frames FROM checkpoints WHERE run_id = ? ORDER BY seq DESC LIMIT 1", (run_id,)
+            ).fetchone()
+            if row is None:
+                raise KeyError(f"No checkpoint for run '{run_id}'.")
+            frame_hashes = json.loads(row["frames"])
+            stored = {
+                frame_row["hash"]: (frame_row["format"], frame_row["data"])
+                for frame_row in self._conn.execute(
+                    f"SELECT hash, format, data FROM frames WHERE hash IN ({', '.join('?' * len(frame_hashes))})",
+                    list(frame_hashes.values()),
+                )
+            }
+
+        fields = pickle.loads(row["fields"])
+        for name, frame_hash in frame_hashes.items():
+            fields[name] = frame_from_bytes(*stored[frame_hash])
+        fields.update(state_fields)
+        return GraphState(**fields), row["node"]
+
+    def runs(self, status: str = None) -> list:
+        """Runs (run_id, user_id, status, last_node, failed_node, error, ...), newest first."""
+        where, params = ("WHERE status = ?", (status,)) if status else ("", ())
+        with self._lock:
+            rows = self._conn.execute(f"SELECT * FROM runs {where} ORDER BY updated_at DESC", params).fetchall()
+        return [dict(row) for row in rows]
+
+    def delete(self, run_id: str) -> None:
+        """Drop a run's checkpoints, and the frames no other run refers to."""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM checkpoints WHERE run_id = ?", (run_id,))
+            self._conn.execute("DELETE FROM runs WHERE run_id = ?", (run_id,))
+            self._conn.execute(
+                """
+                DELETE FROM frames WHERE hash NOT IN (
+                    SELECT DISTINCT value FROM checkpoints, json_each(checkpoints.frames)
+                )
+                """
+            )
+        self._frame_hashes.clear()
+
+
+_checkpointers = {}
+_checkpointers_lock = threading.Lock()
+
+
+def get_checkpointer(path: str) -> Checkpointer:
+    """Shared Checkpointer for path, one connection per process."""
+    with _checkpointers_lock:
+        checkpointer = _checkpointers.get(path)
+        if checkpointer is None:
+            checkpointer = _checkpointers[path] = Checkpointer(path)
+        return checkpointer
+
+
+def new_run_id(user_id=None) -> str:
+    """A fresh run id, prefixed with the user for readability."""
+    suffix = f"{time.strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}"
+    return f"{user_id}-{suffix}" if user_id is not None else suffix
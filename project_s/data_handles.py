@@ -0,0 +1,112 @@
+import os
+from abc import ABC, abstractmethod
+import pandas as pd
+from schema import compact_frame
+from storage import load_dataset, PARTITION_COLUMN
+from week_key import WEEK_ID_DTYPE, week_ids_of
+
+
+# Lazy handles to the perception datasets. GraphState carries a handle per dataset
+# instead of the frame itself: a Parquet-backed handle is checkpointed as its folder
+# only, and a node loads only the slice it needs (the target week). Handles use
+# __slots__: a state holds three of them per run.
+#
+# Dates used to derive the week when a frame has no week_id column
+DATE_COLUMNS = {"calendar": "start"}
+
+
+class DatasetHandle(ABC):
+    """A dataset of one kind (see schema.SCHEMAS), loaded on demand."""
+
+    __slots__ = ("kind",)
+
+    def __init__(self, kind: str):
+        self.kind = kind
+
+    @property
+    def date_column(self):
+        return DATE_COLUMNS.get(self.kind)
+
+    @abstractmethod
+    def week_ids(self) -> pd.Series:
+        """The distinct week_ids present."""
+
+    @abstractmethod
+    def week(self, week_id: int, columns: list = None) -> pd.DataFrame:
+        """The rows of one week."""
+
+    @abstractmethod
+    def load(self, columns: list = None) -> pd.DataFrame:
+        """The whole dataset."""
+
+
+class FrameHandle(DatasetHandle):
+    """Handle over a frame already in memory (pickles, notebooks); the frame is shared, never copied."""
+
+    __slots__ = ("_df",)
+
+    def __init__(self, df: pd.DataFrame, kind: str):
+        super().__init__(kind)
+        self._df = compact_frame(df, kind)
+
+    def __repr__(self) -> str:
+        return f"FrameHandle({self.kind}, {len(self._df)} rows)"
+
+    def week_ids(self) -> pd.Series:
+        return week_ids_of(self._df, date_column=self.date_column).dropna().drop_duplicates()
+
+    def week(self, week_id: int, columns: list = None) -> pd.DataFrame:
+        mask = (week_ids_of(self._df, date_column=self.date_column) == week_id).fillna(False).to_numpy()
+        rows = self._df[mask]
+        return rows[columns] if columns is not None else rows
+
+    def load(self, columns: list = None) -> pd.DataFrame:
+        return self._df[columns] if columns is not None else self._df
+
+
+class ParquetHandle(DatasetHandle):
+    """Handle over a week-partitioned Parquet dataset (storage.save_dataset); reads one partition per week."""
+
+    __slots__ = ("root", "_week_ids")
+
+    def __init__(self, root: str, kind: str):
+        super().__init__(kind)
+        self.root = root
+        self._week_ids = None
+
+    def __repr__(self) -> str:
+        return f"ParquetHandle({self.kind}, {self.root!r})"
+
+    def __getstate__(self):
+        # Pickled (e.g. into a checkpoint) as its location only
+        return {"kind": self.kind, "root": self.root}
+
+    def __setstate__(self, state):
+        self.kind, self.root, self._week_ids = state["kind"], state["root"], None
+
+    def week_ids(self) -> pd.Series:
+        if self._week_ids is None:
+            # The partition column alone: only directory names and row counts are read
+            week_ids = load_dataset(self.root, columns=[PARTITION_COLUMN])[PARTITION_COLUMN]
+            self._week_ids = week_ids.dropna().drop_duplicates().astype(WEEK_ID_DTYPE).reset_index(drop=True)
+        return self._week_ids
+
+    def week(self, week_id: int, columns: list = None) -> pd.DataFrame:
+        return compact_frame(load_dataset(self.root, columns=columns, week_ids=[week_id]), self.kind)
+
+    def load(self, columns: list = None) -> pd.DataFrame:
+        return compact_frame(load_dataset(self.root, columns=columns), self.kind)
+
+
+def as_handle(value, kind: str):
+    """
+    A DatasetHandle for value: a handle (returned as is), a DataFrame, or the folder
+    of a Parquet dataset. None stays None.
+    """
+    if value is None or isinstance(value, DatasetHandle):
+        return value
+    if isinstance(value, pd.DataFrame):
+        return FrameHandle(value, kind)
+    if isinstance(value, (str, os.PathLike)):
+        return ParquetHandle(os.fspath(value), kind)
+    raise TypeError(f"Expected a DataFrame, a dataset folder or a DatasetHandle for {kind}, got {type(value).__name__}.")
@@ -1,21 +1,232 @@
+import time
+import asyncio
+import threading
+from functools import wraps
 from langgraph.graph import StateGraph, END
-from perception import perception_node_from_state
+from perception import perception_node_from_state, perception_node_from_state_async
 from interpretation import interpretation_node_from_state
-from socratic import socratic_node_from_state
-from whisper import whisper_node_from_state
+from socratic import socratic_node_from_state, socratic_node_from_state_async
+from whisper import whisper_node_from_state, whisper_node_from_state_async
 from graph_state import GraphState  # assuming you saved the class above
+from checkpoint import Checkpointer, START, new_run_id
+from metrics import NODE, get_recorder, scope
 
 
-def build_graph():
+# Nodes in execution order: name → (sync node, async node)
+NODES = {
+    "perceive": (perception_node_from_state, perception_node_from_state_async),
+    "reflect": (socratic_node_from_state, socratic_node_from_state_async),
+    "whisper": (whisper_node_from_state, whisper_node_from_state_async),
+}
+NODE_ORDER = list(NODES)
+
+
+def _limited(node, limit):
+    """Wrap a node so at most `limit` calls run at once across all graph invocations."""
+    if not limit:
+        return node
+    semaphore = threading.BoundedSemaphore(limit)
+
+    @wraps(node)
+    def _node(state):
+        with semaphore:
+            return node(state)
+
+    return _node
+
+
+def _limited_async(node, limit):
+    """Async counterpart of _limited, using an asyncio.Semaphore."""
+    if not limit:
+        return node
+    semaphore = asyncio.Semaphore(limit)
+
+    @wraps(node)
+    async def _node(state):
+        async with semaphore:
+            return await node(state)
+
+    return _node
+
+
+def _instrumented(node, name):
+    """Wrap a node so its wall time, and every LLM / message call inside it, is recorded under its run."""
+
+    @wraps(node)
+    def _node(state):
+        if state.run_id is None:
+            state.run_id = new_run_id(state.user_id)
+        with scope(run_id=state.run_id, user_id=state.user_id, node=name):
+            started_at, started = time.time(), time.perf_counter()
+            try:
+                state = node(state)
+            except Exception as e:
+                get_recorder().record(NODE, name, time.perf_counter() - started, started_at=started_at, error=e)
+                raise
+            get_recorder().record(NODE, name, time.perf_counter() - started, started_at=started_at)
+        return state
+
+    return _node
+
+
+def _instrumented_async(node, name):
+    """Async counterpart of _instrumented; calls in worker threads (asyncio.to_thread) keep the scope."""
+
+    @wraps(node)
+    async def _node(state):
+        if state.run_id is None:
+            state.run_id = new_run_id(state.user_id)
+        with scope(run_id=state.run_id, user_id=state.user_id, node=name):
+            started_at, started = time.time(), time.perf_counter()
+            try:
+                state = await node(state)
+            except Exception as e:
+                get_recorder().record(NODE, name, time.perf_counter() - started, started_at=started_at, error=e)
+                raise
+            get_recorder().record(NODE, name, time.perf_counter() - started, started_at=started_at)
+        return state
+
+    return _node
+
+
+def _checkpointed(node, name, checkpointer: Checkpointer, save_input: bool):
+    """Wrap a node so its output state is checkpointed, and a failure recorded against the run."""
+    if checkpointer is None:
+        return node
+    last = name == NODE_ORDER[-1]
+
+    @wraps(node)
+    def _node(state):
+        if state.run_id is None:
+            state.run_id = new_run_id(state.user_id)
+        if save_input:
+            checkpointer.save(state, START)
+        try:
+            state = node(state)
+        except Exception as e:
+            checkpointer.mark_failed(state.run_id, name, e)
+            raise
+        checkpointer.save(state, name)
+        if last:
+            checkpointer.mark_done(state.run_id)
+        return state
+
+    return _node
+
+
+def _checkpointed_async(node, name, checkpointer: Checkpointer, save_input: bool):
+    """Async counterpart of _checkpointed; checkpoints are written off the event loop."""
+    if checkpointer is None:
+        return node
+    last = name == NODE_ORDER[-1]
+
+    @wraps(node)
+    async def _node(state):
+        if state.run_id is None:
+            state.run_id = new_run_id(state.user_id)
+        if save_input:
+            await asyncio.to_thread(checkpointer.save, state, START)
+        try:
+            state = await node(state)
+        except Exception as e:
+            await asyncio.to_thread(checkpointer.mark_failed, state.run_id, name, e)
+            raise
+        await asyncio.to_thread(checkpointer.save, state, name)
+        if last:
+            await asyncio.to_thread(checkpointer.mark_done, state.run_id)
+        return state
+
+    return _node
+
+
+def _next_node(node: str):
+    """Node to run after a checkpoint taken at node; None when the run had finished."""
+    if node == START:
+        return NODE_ORDER[0]
+    position = NODE_ORDER.index(node) + 1
+    return NODE_ORDER[position] if position < len(NODE_ORDER) else None
+
+
+def build_graph(stage_limits: dict = None, checkpointer: Checkpointer = None, entry_point: str = NODE_ORDER[0]):
+    """
+    Compile the perceive → reflect → whisper graph.
+
+    Args:
+        stage_limits (dict): Optional per-node concurrency caps, e.g. {"reflect": 4, "whisper": 2},
+            shared by every invocation of the compiled graph (see batch.run_batch).
+        checkpointer (Checkpointer): Save the state under state.run_id after each node,
+            so a failed run can be continued with resume().
+        entry_point (str): First node to run; earlier nodes are left out of the graph.
+
+    Every node is instrumented (wall time, and the tokens, cost and bytes of its LLM and
+    message calls); see metrics.get_recorder().summary().
+    """
+    stage_limits = stage_limits or {}
     builder = StateGraph(GraphState)
 
-    builder.add_node("perceive", perception_node_from_state)
-    builder.add_node("reflect", socratic_node_from_state)
-    builder.add_node("whisper", whisper_node_from_state)
+    names = NODE_ORDER[NODE_ORDER.index(entry_point):]
+    for name in names:
+        node = _limited(_instrumented(NODES[name][0], name), stage_limits.get(name))
+        builder.add_node(name, _checkpointed(node, name, checkpointer, save_input=name == NODE_ORDER[0]))
 
-    builder.set_entry_point("perceive")
-    builder.add_edge("perceive", "reflect")
-    builder.add_edge("reflect", "whisper")
-    builder.add_edge("whisper", END)
+    builder.set_entry_point(names[0])
+    for name, next_name in zip(names, names[1:]):
+        builder.add_edge(name, next_name)
+    builder.add_edge(names[-1], END)
 
     return builder.compile()
+
+
+def build_async_graph(stage_limits: dict = None, checkpointer: Checkpointer = None, entry_point: str = NODE_ORDER[0]):
+    """
+    Same graph with async nodes, to be driven with `await graph.ainvoke(state)`.
+
+    One event loop can then keep many users' reflections and sends in flight
+    without a thread per user (see batch.run_batch_async).
+    """
+    stage_limits = stage_limits or {}
+    builder = StateGraph(GraphState)
+
+    names = NODE_ORDER[NODE_ORDER.index(entry_point):]
+    for name in names:
+        node = _limited_async(_instrumented_async(NODES[name][1], name), stage_limits.get(name))
+        builder.add_node(name, _checkpointed_async(node, name, checkpointer, save_input=name == NODE_ORDER[0]))
+
+    builder.set_entry_point(names[0])
+    for name, next_name in zip(names, names[1:]):
+        builder.add_edge(name, next_name)
+    builder.add_edge(names[-1], END)
+
+    return builder.compile()
+
+
+def resume(run_id: str, checkpointer: Checkpointer, stage_limits: dict = None, **state_fields) -> GraphState:
+    """
+    Continue a checkpointed run from the node after its last completed one.
+
+    Secrets are not checkpointed: pass twilio_token / openai_key again (and any other
+    field to change, e.g. a corrected twilio_to) as state_fields.
+
+    Returns:
+        GraphState: The final state; the checkpointed one unchanged if the run had finished.
+    """
+    state, node = checkpointer.load(run_id, **state_fields)
+    next_node = _next_node(node)
+    if next_node is None:
+        return state
+
+    print(f"⏯️ Resuming run {run_id} at '{next_node}'")
+    graph = build_graph(stage_limits, checkpointer=checkpointer, entry_point=next_node)
+    return GraphState(**graph.invoke(state))
+
+
+async def resume_async(run_id: str, checkpointer: Checkpointer, stage_limits: dict = None, **state_fields) -> GraphState:
+    """Async resume(), on the async graph."""
+    state, node = await asyncio.to_thread(checkpointer.load, run_id, **state_fields)
+    next_node = _next_node(node)
+    if next_node is None:
+        return state
+
+    print(f"⏯️ Resuming run {run_id} at '{next_node}'")
+    graph = build_async_graph(stage_limits, checkpointer=checkpointer, entry_point=next_node)
+    return GraphState(**await graph.ainvoke(state))
@@ -1,30 +1,99 @@
-from pydantic import BaseModel
-from typing import Optional, Dict, Any
+from pydantic import BaseModel, ConfigDict, Field, field_validator, model_validator
+from typing import Optional, Dict, Any, Union
 import pandas as pd
+from data_handles import DatasetHandle, as_handle
+
+# Dataset field → schema kind; each also accepts the old <field>_df keyword
+DATASET_FIELDS = {
+    "weekly_notes": "weekly_notes",
+    "screen_time": "screen_time",
+    "calendar": "calendar",
+}
 
 class GraphState(BaseModel):
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
     journal_text: Optional[str] = None
+    # journal entries sent with the reflection prompt (see journal_index.py); None sends the whole journal
+    journal_top_k: Optional[int] = 8
 
     weekly_perception_text: Optional[str] = None
 
-    weekly_notes_df: Optional[pd.DataFrame] = None
-    screen_time_df: Optional[pd.DataFrame] = None
-    calendar_df: Optional[pd.DataFrame] = None
+    # Perception datasets as handles (see data_handles.py): perceive loads only the
+    # target week. Set from a DataFrame, a Parquet dataset folder or a handle; only a
+    # folder keeps the rows out of the state, a DataFrame's handle still holds the frame
+    # (and checkpoints store it)
+    weekly_notes: Optional[DatasetHandle] = None
+    screen_time: Optional[DatasetHandle] = None
+    calendar: Optional[DatasetHandle] = None
+
+    # week to reflect on: a week_id (202526), a label ('Jun 23–29') or "latest"
+    target_week: Optional[Union[int, str]] = "latest"
 
     perception: Optional[Dict[str, Any]] = None
     interpretation: Optional[str] = None
     socratic_observation: Optional[str] = None
+    # fingerprint of the reflection's inputs (socratic.reflection_cache_key)
+    reflection_key: Optional[str] = None
+
+    # Reflection cache folder (None disables caching); reuse_reflection=False forces
+    # a new LLM reflection even when the inputs match a cached one
+    reflection_cache_dir: Optional[str] = None
+    reuse_reflection: bool = True
 
     whisper_status: Optional[Dict[str, Any]] = None
 
+    # Durable whisper outbox (see whisper_outbox.py): with a path set, whispers are
+    # enqueued under a user/week/reflection_key key, so a re-run on the same inputs
+    # does not send again even when the LLM words the reflection differently;
+    # whisper_defer only enqueues, leaving delivery to whisper_outbox.deliver
+    user_id: Optional[str] = None
+    # Checkpoint key when the graph is built with a checkpointer (see checkpoint.py);
+    # assigned on the first node if None
+    run_id: Optional[str] = None
+    whisper_outbox_path: Optional[str] = None
+    whisper_defer: bool = False
 
+    # Message transport (see transports.py): "twilio", "jsonl" or "local", with its
+    # constructor options; None uses PROJECT_S_WHISPER_TRANSPORT (default "twilio")
+    whisper_transport: Optional[str] = None
+    whisper_transport_options: Optional[Dict[str, Any]] = None
+
+    # Secrets stay on the state for the nodes that call the APIs, but are left out of
+    # its repr and never checkpointed (see checkpoint.SECRET_FIELDS)
     twilio_sid: Optional[str] = None
-    twilio_token: Optional[str] = None
+    twilio_token: Optional[str] = Field(default=None, repr=False)
     twilio_from: Optional[str] = None
     twilio_to: Optional[str] = None
 
-    openai_key: Optional[str] = None
+    openai_key: Optional[str] = Field(default=None, repr=False)
+
+    @model_validator(mode="before")
+    @classmethod
+    def _dataset_aliases(cls, data):
+        # GraphState(weekly_notes_df=df, ...) as before the handles
+        if isinstance(data, dict) and any(f"{name}_df" in data for name in DATASET_FIELDS):
+            data = dict(data)
+            for name in DATASET_FIELDS:
+                if f"{name}_df" in data:
+                    data[name] = data.pop(f"{name}_df")
+        return data
+
+    # In-memory frames get the compact perception dtypes (see schema.py) once, here
+    @field_validator(*DATASET_FIELDS, mode="before")
+    @classmethod
+    def _dataset_handles(cls, value, info):
+        return as_handle(value, DATASET_FIELDS[info.field_name])
+
+    # Whole frames, for notebooks and callers that predate the handles
+    @property
+    def weekly_notes_df(self) -> Optional[pd.DataFrame]:
+        return self.weekly_notes.load() if self.weekly_notes is not None else None
 
+    @property
+    def screen_time_df(self) -> Optional[pd.DataFrame]:
+        return self.screen_time.load() if self.screen_time is not None else None
 
-    class Config:
-        arbitrary_types_allowed = True
+    @property
+    def calendar_df(self) -> Optional[pd.DataFrame]:
+        return self.calendar.load() if self.calendar is not None else None
@@ -0,0 +1,196 @@
+import io
+import os
+import json
+import math
+import base64
+
+
+# Preprocessing before vision calls. Phone screenshots and photos are uploaded at
+# 3x Retina resolution, far more than GPT-4o needs to read them: each image is
+# trimmed of uniform margins, downsampled to the resolution its extraction needs,
+# re-encoded as JPEG or PNG (whichever is smaller) and sent with an explicit detail level.
+#
+# Profiles:
+#   max_side   longest side after downsampling (pixels)
+#   grayscale  drop colour (text and handwriting read the same)
+#   quality    JPEG quality
+#   detail     "low", "high" or "auto" (low when the image fits a single 512px tile)
+#   crop       (left, top, right, bottom) fractions of the image to keep, before margin
+#              trimming; None keeps it whole
+PREP_PROFILES = {
+    # Screen Time report: large UI text, a 1x-sized screenshot is plenty; the status bar
+    # (clock, battery) at the top is noise
+    "screenshot": {"max_side": 1024, "grayscale": True, "quality": 80, "detail": "auto", "crop": (0, 0.05, 1, 1)},
+    # Handwritten pages: keep enough pixels for messy handwriting
+    "handwriting": {"max_side": 2048, "grayscale": True, "quality": 85, "detail": "high", "crop": None},
+}
+
+TRIM_TOLERANCE = 12  # max channel difference from the corner colour still counted as margin
+TRIM_PADDING = 8
+
+# GPT-4o image token accounting (high detail: 85 base + 170 per 512px tile)
+LOW_DETAIL_TOKENS = 85
+TILE_TOKENS = 170
+TILE_SIZE = 512
+
+
+def estimate_image_tokens(width: int, height: int, detail: str = "high") -> int:
+    """Input tokens GPT-4o charges for a width x height image at the given detail."""
+    if detail == "low":
+        return LOW_DETAIL_TOKENS
+
+    # Fit within 2048 x 2048, then scale the shortest side down to 768
+    scale = min(1.0, 2048 / max(width, height))
+    width, height = width * scale, height * scale
+    scale = min(1.0, 768 / min(width, height))
+    width, height = width * scale, height * scale
+
+    tiles = math.ceil(width / TILE_SIZE) * math.ceil(height / TILE_SIZE)
+    return LOW_DETAIL_TOKENS + TILE_TOKENS * tiles
+
+
+def estimate_prepared_tokens(image_path: str, profile: str = None) -> int:
+    """
+    Tokens prepare_image(image_path, profile) will cost, from the image header only
+    (an upper bound: margin trimming can only shrink the image).
+    """
+    try:
+        from PIL import Image
+
+        with Image.open(image_path) as image:
+            width, height = image.size
+    except (ImportError, OSError):
+        return estimate_image_tokens(2048, 2048)
+
+    if profile is None:
+        return estimate_image_tokens(width, height)
+
+    settings = PREP_PROFILES[profile]
+    if settings["crop"] is not None:
+        left, top, right, bottom = settings["crop"]
+        width, height = max(round((right - left) * width), 1), max(round((bottom - top) * height), 1)
+    scale = min(1.0, settings["max_side"] / max(width, height))
+    width, height = max(round(width * scale), 1), max(round(height * scale), 1)
+    detail = settings["detail"]
+    if detail == "auto":
+        detail = "low" if max(width, height) <= TILE_SIZE else "high"
+    return estimate_image_tokens(width, height, detail)
+
+
+def profile_fingerprint(profile: str = None) -> str:
+    """The profile's name and settings as text, for cache keys: changing a profile changes what the model sees."""
+    settings = PREP_PROFILES[profile] if profile is not None else None
+    return json.dumps({"profile": profile, "settings": settings}, sort_keys=True)
+
+
+def _trim_margins(image):
+    """Crop away uniform borders (background around a page, empty screenshot edges)."""
+    from PIL import Image, ImageChops
+
+    rgb = image.convert("RGB")
+    background = rgb.getpixel((0, 0))
+    # Largest per-channel difference from the corner colour, thresholded into a content mask
+    diff = ImageChops.difference(rgb, Image.new("RGB", rgb.size, background))
+    red, green, blue = diff.split()
+    mask = ImageChops.lighter(ImageChops.lighter(red, green), blue)
+    bbox = mask.point(lambda v: 255 if v > TRIM_TOLERANCE else 0).getbbox()
+    if bbox is None:
+        return image
+
+    left, top, right, bottom = bbox
+    bbox = (
+        max(left - TRIM_PADDING, 0),
+        max(top - TRIM_PADDING, 0),
+        min(right + TRIM_PADDING, image.width),
+        min(bottom + TRIM_PADDING, image.height),
+    )
+    return image.crop(bbox)
+
+
+def prepare_image(image_path: str, profile: str = None, report: bool = True) -> dict:
+    """
+    Load an image for a vision request, shrunk according to PREP_PROFILES[profile].
+
+    Args:
+        image_path (str): Image file.
+        profile (str): Key of PREP_PROFILES; None sends the original file unchanged.
+        report (bool): Print bytes and estimated tokens saved for the image.
+
+    Returns:
+        dict: url (base64 data URL), detail, and bytes_before / bytes_after /
+        tokens_before / tokens_after for reporting.
+    """
+    with open(image_path, "rb") as f:
+        raw = f.read()
+
+    original_size = None
+    try:
+        from PIL import Image, ImageOps
+
+        with Image.open(io.BytesIO(raw)) as image:
+            original_size = image.size
+    except ImportError:
+        profile = None  # Pillow not installed: upload as is
+    except OSError:
+        profile = None  # not an image Pillow can read; let the API decide
+
+    tokens_before = estimate_image_tokens(*original_size) if original_size else None
+    if profile is None:
+        mime = "image/jpeg" if image_path.lower().endswith((".jpg", ".jpeg")) else "image/png"
+        return {
+            "url": f"data:{mime};base64,{base64.b64encode(raw).decode('utf-8')}",
+            "detail": "auto",
+            "bytes_before": len(raw),
+            "bytes_after": len(raw),
+            "tokens_before": tokens_before,
+            "tokens_after": tokens_before,
+        }
+
+    settings = PREP_PROFILES[profile]
+    with Image.open(io.BytesIO(raw)) as image:
+        image = ImageOps.exif_transpose(image)  # phone photos are often stored rotated
+        if settings["crop"] is not None:
+            left, top, right, bottom = settings["crop"]
+            image = image.crop((
+                round(left * image.width), round(top * image.height),
+                round(right * image.width), round(bottom * image.height),
+            ))
+        image = _trim_margins(image)
+
+        image = image.convert("L" if settings["grayscale"] else "RGB")
+        image.thumbnail((settings["max_side"], settings["max_side"]), Image.LANCZOS)
+
+        # JPEG wins for photos and anti-aliased text, PNG for flat UI; keep the smaller
+        encodings = []
+        for fmt, options in (("JPEG", {"quality": settings["quality"], "optimize": True}), ("PNG", {"optimize": True})):
+            buffer = io.BytesIO()
+            image.save(buffer, format=fmt, **options)
+            encodings.append((len(buffer.getvalue()), fmt, buffer.getvalue()))
+        _, fmt, encoded = min(encodings)
+        width, height = image.size
+
+    detail = settings["detail"]
+    if detail == "auto":
+        detail = "low" if max(width, height) <= TILE_SIZE else "high"
+
+    prepared = {
+        "url": f"data:image/{fmt.lower()};base64,{base64.b64encode(encoded).decode('utf-8')}",
+        "detail": detail,
+        "bytes_before": len(raw),
+        "bytes_after": len(encoded),
+        "tokens_before": tokens_before,
+        "tokens_after": estimate_image_tokens(width, height, detail),
+    }
+    if report:
+        print(
+            f"🖼️ {os.path.basename(image_path)}: {prepared['bytes_before'] / 1024:.0f} KB → "
+            f"{prepared['bytes_after'] / 1024:.0f} KB, ~{prepared['tokens_before']} → "
+            f"{prepared['tokens_after']} tokens ({detail} detail)"
+        )
+    return prepared
+
+
+def image_content(image_path: str, profile: str = None, **kwargs) -> dict:
+    """The chat message content part for image_path, preprocessed with prepare_image."""
+    prepared = prepare_image(image_path, profile, **kwargs)
+    return {"type": "image_url", "image_url": {"url": prepared["url"], "detail": prepared["detail"]}}
@@ -0,0 +1,408 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import threading
+from datetime import datetime
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from tqdm import tqdm
+import pandas as pd
+from metrics import propagate
+from storage import load_dataset, save_dataset, save_dataset_file, PARTITION_COLUMN
+
+
+# --- Defaults (conservative for a single GPT-4o key) ---
+DEFAULT_MAX_WORKERS = 4
+DEFAULT_RPM = 60
+DEFAULT_TPM = 30000
+DEFAULT_TOKENS_PER_CALL = 2500  # image + prompt + max_tokens=1500 completion
+
+
+class RateLimiter:
+    """
+    Sliding one-minute window over requests and tokens, shared by all worker threads.
+
+    Pass the same instance to several parse_all_* calls so they share one budget.
+    clock and sleep default to time.monotonic and time.sleep (injectable for tests).
+    """
+
+    def __init__(self, rpm: int = DEFAULT_RPM, tpm: int = DEFAULT_TPM, clock=time.monotonic, sleep=time.sleep):
+        self.rpm = rpm
+        self.tpm = tpm
+        self._clock = clock
+        self._sleep = sleep
+        self._events = deque()  # (timestamp, tokens)
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: int = DEFAULT_TOKENS_PER_CALL) -> None:
+        """Block until one request of `tokens` tokens fits in the current window."""
+        while True:
+            with self._lock:
+                now = self._clock()
+                while self._events and now - self._events[0][0] >= 60:
+                    self._events.popleft()
+
+                used_tokens = sum(t for _, t in self._events)
+                fits_rpm = len(self._events) < self.rpm
+                fits_tpm = used_tokens + tokens <= self.tpm or not self._events
+                if fits_rpm and fits_tpm:
+                    self._events.append((now, tokens))
+                    return
+
+                wait = 60 - (now - self._events[0][0])
+            self._sleep(max(wait, 0.05))
+
+
+def list_images(folder_path: str, extensions=(".png",)) -> list:
+    """Image filenames in folder_path, sorted by name."""
+    return [f for f in sorted(os.listdir(folder_path)) if f.lower().endswith(extensions)]
+
+
+def run_work_units(
+    folder_path: str,
+    units: list,
+    work_fn,
+    max_workers: int = DEFAULT_MAX_WORKERS,
+    desc: str = None,
+    on_result=None,
+):
+    """
+    Shared engine of run_vision_ingestion and vision_batch.run_batched_vision_ingestion.
+
+    Each unit is a list of filenames handled together (one image, or one batched
+    request); work_fn(image_paths) returns {image_path: (output, error)} for them, and
+    an exception it raises fails every file of the unit. Units run on a bounded thread
+    pool with one progress bar counting files.
+
+    Returns:
+        tuple: (results, stats) as described in run_vision_ingestion, without printing.
+    """
+    filenames = sorted(f for unit in units for f in unit)
+
+    def _run(unit):
+        return work_fn([os.path.join(folder_path, f) for f in unit])
+
+    outcomes = {}
+    started = time.perf_counter()
+    run = propagate(_run, node=desc)  # LLM calls are recorded under desc (see metrics.py)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {pool.submit(run, unit): unit for unit in units}
+        with tqdm(total=len(filenames), desc=desc) as progress:
+            for future in as_completed(futures):
+                unit = futures[future]
+                try:
+                    by_path = future.result()
+                    unit_outcomes = {f: by_path[os.path.join(folder_path, f)] for f in unit}
+                except Exception as e:
+                    unit_outcomes = {f: (None, e) for f in unit}
+
+                for filename, outcome in unit_outcomes.items():
+                    outcomes[filename] = outcome
+                    if on_result:
+                        on_result(filename, *outcome)
+                progress.update(len(unit))
+
+    elapsed = time.perf_counter() - started
+    results = [(filename, *outcomes[filename]) for filename in filenames]
+    failed = sum(1 for _, _, error in results if error is not None)
+
+    stats = {
+        "files": len(results),
+        "succeeded": len(results) - failed,
+        "failed": failed,
+        "elapsed_s": round(elapsed, 2),
+        "images_per_min": round(len(results) / elapsed * 60, 1) if elapsed > 0 else 0.0,
+    }
+    return results, stats
+
+
+def run_vision_ingestion(
+    folder_path: str,
+    parse_fn,
+    filenames: list = None,
+    max_workers: int = DEFAULT_MAX_WORKERS,
+    rate_limiter: RateLimiter = None,
+    desc: str = None,
+    on_result=None,
+):
+    """
+    Run parse_fn(image_path, rate_limiter) for every image in folder_path on a bounded thread pool.
+
+    parse_fn must call rate_limiter.acquire() right before its network call, so
+    cache hits and other local work do not consume the request budget.
+
+    Args:
+        folder_path (str): Folder with the images.
+        parse_fn (callable): Called with the full image path and the limiter; its return value is collected.
+        filenames (list): Optional subset of filenames; defaults to all PNGs in the folder.
+        max_workers (int): Number of vision calls in flight at once.
+        rate_limiter (RateLimiter): Shared request/token budget; a fresh default one if None.
+        desc (str): Label for the progress bar.
+        on_result (callable): Optional on_result(filename, output, error), called from the
+            calling thread as each file completes (used for per-file checkpoints).
+
+    Returns:
+        tuple: (results, stats). results is a list of (filename, output, error) in
+        filename order, with exactly one of output/error set. stats holds counts,
+        elapsed seconds and throughput.
+    """
+    if filenames is None:
+        filenames = list_images(folder_path)
+    rate_limiter = rate_limiter or RateLimiter()
+
+    def _parse(image_paths):
+        (image_path,) = image_paths
+        return {image_path: (parse_fn(image_path, rate_limiter), None)}
+
+    results, stats = run_work_units(
+        folder_path, [[f] for f in sorted(filenames)], _parse, max_workers=max_workers, desc=desc, on_result=on_result
+    )
+    print(
+        f"⚡ {stats['files']} images in {stats['elapsed_s']}s "
+        f"({stats['images_per_min']} images/min, {stats['failed']} failed)"
+    )
+    return results, stats
+
+
+# --- Incremental ingestion ---
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _atomic_write(path: str, write_fn) -> None:
+    tmp_path = f"{path}.tmp"
+    write_fn(tmp_path)
+    os.replace(tmp_path, path)
+
+
+class IngestionManifest:
+    """
+    JSON record of the files already ingested from a folder.
+
+    Each entry holds mtime, size, sha256, status ('ok' or 'failed'), the last
+    error and when it was ingested. A file needs ingesting when it is new, its
+    content hash changed, or its last attempt failed.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f)
+
+    def needs_ingest(self, folder_path: str, filename: str) -> bool:
+        entry = self.entries.get(filename)
+        if entry is None or entry.get("status") != "ok":
+            return True
+
+        stat = os.stat(os.path.join(folder_path, filename))
+        if stat.st_mtime == entry["mtime"] and stat.st_size == entry["size"]:
+            return False
+
+        # Touched but maybe not changed: only the hash decides
+        if file_sha256(os.path.join(folder_path, filename)) != entry["sha256"]:
+            return True
+        entry["mtime"], entry["size"] = stat.st_mtime, stat.st_size
+        return False
+
+    def record(self, folder_path: str, filename: str, status: str, error: str = None) -> None:
+        path = os.path.join(folder_path, filename)
+        stat = os.stat(path)
+        self.entries[filename] = {
+            "mtime": stat.st_mtime,
+            "size": stat.st_size,
+            "sha256": file_sha256(path),
+            "status": status,
+            "error": error,
+            "ingested_at": datetime.now().isoformat(timespec="seconds"),
+        }
+
+    def save(self) -> None:
+        def _write(tmp_path):
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.entries, f, ensure_ascii=False, indent=2)
+
+        _atomic_write(self.path, _write)
+
+
+def _weeks(rows: pd.DataFrame) -> set:
+    """Week partitions holding rows (None: rows without a week_id, in Parquet's null partition)."""
+    return {None if pd.isna(w) else int(w) for w in rows[PARTITION_COLUMN].unique()}
+
+
+def _file_name(source_file: str) -> str:
+    """Parquet file name of a source file's rows in an unpartitioned store."""
+    return hashlib.sha256(str(source_file).encode("utf-8")).hexdigest()[:16]
+
+
+def _partition_dir(dataset_path: str, week_id) -> str:
+    value = "__HIVE_DEFAULT_PARTITION__" if week_id is None else week_id
+    return os.path.join(dataset_path, f"{PARTITION_COLUMN}={value}")
+
+
+def _save_partitions(dataset_path: str, files: dict, week_files: dict, filename: str, rows: pd.DataFrame, previous: pd.DataFrame) -> None:
+    """
+    Persist one ingested file: rewrite only the week partitions holding its new or previous rows.
+
+    files maps source_file → rows, week_files week → source files with rows in it (both
+    already updated for filename except week_files, updated here). A store without
+    week_id (e.g. journal transcripts) keeps one Parquet file per source file instead.
+    """
+    if PARTITION_COLUMN not in rows.columns:
+        save_dataset_file(rows, dataset_path, _file_name(filename))
+        return
+
+    before = _weeks(previous) if previous is not None else set()
+    after = _weeks(rows)
+    for week_id in before - after:
+        week_files[week_id].discard(filename)
+    for week_id in after:
+        week_files[week_id].add(filename)
+
+    touched = before | after
+    sources = set().union(*(week_files[week_id] for week_id in touched))
+    frames = []
+    for source in sorted(sources):
+        source_rows = files[source]
+        in_week = source_rows[PARTITION_COLUMN].isin([w for w in touched if w is not None])
+        if None in touched:
+            in_week |= source_rows[PARTITION_COLUMN].isna()
+        frames.append(source_rows[in_week])
+    if frames:
+        save_dataset(pd.concat(frames, ignore_index=True), dataset_path)
+    # A week left without rows has nothing to replace its partition with
+    for week_id in touched:
+        if not week_files[week_id]:
+            shutil.rmtree(_partition_dir(dataset_path, week_id), ignore_errors=True)
+
+
+def run_incremental_ingestion(
+    folder_path: str,
+    parse_fn,
+    to_frame,
+    dataset_path: str,
+    manifest_path: str = None,
+    max_workers: int = DEFAULT_MAX_WORKERS,
+    rate_limiter: RateLimiter = None,
+    desc: str = None,
+    runner=None,
+) -> pd.DataFrame:
+    """
+    Ingest only new, changed or previously failed images into a Parquet dataset.
+
+    The dataset (storage.save_dataset, partitioned by week_id) and the manifest are
+    both written after every file, so a crash loses at most the files still in flight.
+    Each file rewrites only the week partitions it touches, so ingesting N files writes
+    O(N) rows in total rather than the whole store per file. Rows of a changed file
+    replace its old rows (matched on 'source_file').
+
+    Args:
+        folder_path (str): Folder with the images.
+        parse_fn (callable): parse_fn(image_path, rate_limiter), as for run_vision_ingestion.
+        to_frame (callable): to_frame(filename, output) -> DataFrame of rows for that file;
+            raise to mark the file as failed.
+        dataset_path (str): Parquet dataset folder holding the accumulated rows (e.g.
+            config's DATA_SCREEN_TIME_STORE), which load_user_state reads through a
+            ParquetHandle. See migrate_pickle_store for stores kept as pickles.
+        manifest_path (str): Manifest JSON; defaults to '<dataset_path>.manifest.json'.
+        runner (callable): Ingestion engine with run_vision_ingestion's signature, e.g. a
+            functools.partial of vision_batch.run_batched_vision_ingestion (parse_fn is then
+            its batch_fn). Defaults to run_vision_ingestion.
+
+    Returns:
+        pd.DataFrame: The full store, sorted by source_file.
+    """
+    manifest = IngestionManifest(manifest_path or _manifest_path(dataset_path))
+    files = {}  # source_file → its rows
+    week_files = defaultdict(set)  # week_id → source files with rows in that week
+    stored = load_dataset(dataset_path) if os.path.isdir(dataset_path) else pd.DataFrame()
+    if "source_file" in stored.columns:
+        for source, rows in stored.groupby("source_file", sort=False, observed=True):
+            files[source] = rows.reset_index(drop=True)
+            if PARTITION_COLUMN in rows.columns:
+                for week_id in _weeks(rows):
+                    week_files[week_id].add(source)
+
+    pending = [f for f in list_images(folder_path) if manifest.needs_ingest(folder_path, f)]
+    if manifest.entries:
+        manifest.save()  # persist refreshed mtimes of touched-but-unchanged files
+    print(f"📂 {len(pending)} new, changed or failed files in {folder_path}")
+
+    def _checkpoint(filename, output, error):
+        rows = None
+        if error is None:
+            try:
+                rows = to_frame(filename, output)
+            except Exception as e:
+                error = e
+
+        if error is not None:
+            print(f"❌ Failed to process {filename}: {error}")
+            manifest.record(folder_path, filename, "failed", str(error))
+            manifest.save()
+            return
+
+        rows = rows.reset_index(drop=True)
+        previous = files.get(filename)
+        files[filename] = rows
+        _save_partitions(dataset_path, files, week_files, filename, rows, previous)
+        manifest.record(folder_path, filename, "ok")
+        manifest.save()
+
+    (runner or run_vision_ingestion)(
+        folder_path,
+        parse_fn,
+        filenames=pending,
+        max_workers=max_workers,
+        rate_limiter=rate_limiter,
+        desc=desc,
+        on_result=_checkpoint,
+    )
+
+    if not files:
+        return pd.DataFrame()
+    store = pd.concat(list(files.values()), ignore_index=True)
+    return store.sort_values("source_file", kind="stable").reset_index(drop=True)
+
+
+def _manifest_path(dataset_path: str) -> str:
+    return f"{os.path.normpath(dataset_path)}.manifest.json"
+
+
+def migrate_pickle_store(pickle_path: str, dataset_path: str) -> bool:
+    """
+    One-time migration of a pickle store (and its manifest) to a Parquet dataset.
+
+    Earlier versions kept the accumulated frame of run_incremental_ingestion, and the
+    notebooks' frames, in pickles. Writes the pickle's rows to dataset_path (one file
+    per source file if it has no week_id) and moves '<pickle_path>.manifest.json' next
+    to the dataset, so already ingested files are not sent to the model again. The
+    pickle itself is left in place.
+
+    Returns:
+        bool: Whether anything was migrated (False if the dataset already exists or
+        there is no pickle).
+    """
+    if os.path.isdir(dataset_path) or not os.path.exists(pickle_path):
+        return False
+
+    store = pd.read_pickle(pickle_path)
+    if PARTITION_COLUMN in store.columns or "source_file" not in store.columns:
+        save_dataset(store, dataset_path)
+    else:
+        for source, rows in store.groupby("source_file", sort=False, observed=True):
+            save_dataset_file(rows, dataset_path, _file_name(source))
+
+    old_manifest = f"{pickle_path}.manifest.json"
+    if os.path.exists(old_manifest) and not os.path.exists(_manifest_path(dataset_path)):
+        os.replace(old_manifest, _manifest_path(dataset_path))
+    print(f"📦 Migrated {len(store)} rows from {pickle_path} to {dataset_path}")
+    return True
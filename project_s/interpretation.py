@@ -1,7 +1,8 @@
-import openai
 import os
 import pandas as pd
 from graph_state import GraphState
+from openai_client import chat_completion
+from journal_store import JournalStore
 
 
 # --- Prompt Template ---
@@ -54,11 +55,14 @@ Write a 3–6 sentence paragraph that reflects meaningful insights about this we
 
 # --- Utility to sample journal ---
 def sample_journal(journal_df, n=10):
+    # A JournalStore answers from its date index; a DataFrame is sorted here
+    if isinstance(journal_df, JournalStore):
+        return "\n".join(journal_df.latest(n)["content"].tolist())
     sorted_journal = journal_df.sort_values("date", ascending=False)
     return "\n".join(sorted_journal["content"].head(n).tolist())
 
 # --- Main callable function ---
-def interpretation_node(state: dict, journal_df: pd.DataFrame, openai_key: str) -> dict:
+def interpretation_node(state: dict, journal_df, openai_key: str) -> dict:
     journal_sample = sample_journal(journal_df, n=10)
 
     prompt = BASE_PROMPT.format(
@@ -71,7 +75,8 @@ def interpretation_node(state: dict, journal_df: pd.DataFrame, openai_key: str)
         journal_sample=journal_sample
     )
 
-    response = openai.chat.completions.create(
+    response = chat_completion(
+        openai_key,
         model="gpt-4o",
         messages=[
             {"role": "system", "content": "You are a perceptive and thoughtful reflection assistant."},
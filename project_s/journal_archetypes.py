@@ -1,26 +1,39 @@
-import openai
 import pandas as pd
 import json
 import re
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from openai_client import chat_completion
+from journal_index import JournalIndex
+from journal_store import JournalStore
+from vision_cache import VisionCache
+from ingestion import DEFAULT_MAX_WORKERS
 
-def extract_journal_archetypes(journal_df: pd.DataFrame, openai_key: str, sample_size: int = 500) -> dict:
-    """
-    Analyze a journal DataFrame and return emergent soul/psychological themes.
 
-    Parameters:
-    - journal_df: DataFrame with a 'content' column
-    - openai_key: OpenAI API key
-    - sample_size: how many recent entries to analyze (default = 50)
+# Map-reduce extraction: the journal is cut into fixed chunks of consecutive entries
+# (oldest first), so new entries only change the last chunk and add new ones. Each
+# chunk's themes are cached by content hash; the reduce step merges the chunk themes.
+DEFAULT_CHUNK_SIZE = 50
+ARCHETYPE_MODEL = "gpt-4o"
+# Bump when the archetype prompts change, so cached chunk themes are recomputed
+ARCHETYPE_PROMPT_VERSION = "archetypes-v1"
+SYSTEM_PROMPT = "You extract the psychological and philosophical structure behind journals."
 
-    Returns:
-    - dict of theme name → description
-    """
-    openai.api_key = openai_key
 
-    entries = journal_df.sort_values("date", ascending=False).head(sample_size)
-    journal_text = "\n".join(entries["content"].tolist())
+class ArchetypeCache(VisionCache):
+    """On-disk cache of per-chunk and merged journal themes, keyed by content hash."""
+
+    label = "Archetype cache"
 
-    prompt = f"""
+    @staticmethod
+    def archetype_key(*parts: str) -> str:
+        digest = hashlib.sha256(ARCHETYPE_PROMPT_VERSION.encode("utf-8"))
+        for part in parts:
+            digest.update(b"\0" + part.encode("utf-8"))
+        return digest.hexdigest()
+
+def _archetype_prompt(journal_text: str) -> str:
+    return f"""
         You are a philosophical AI trained to extract latent soul patterns from a personal journal.
 
         Given the journal below, identify 3–7 inner themes that emerge across the entries.
@@ -42,11 +55,43 @@ def extract_journal_archetypes(journal_df: pd.DataFrame, openai_key: str, sample
         }}
         """
 
+
+def extract_journal_archetypes(journal_df, openai_key: str, sample_size: int = 500, query: str = None) -> dict:
+    """
+    Analyze a journal DataFrame and return emergent soul/psychological themes.
+
+    Parameters:
+    - journal_df: DataFrame with a 'content' column, or a JournalStore
+    - openai_key: OpenAI API key
+    - sample_size: how many recent entries to analyze (default = 50)
+    - query: if given (e.g. the weekly perception text), analyze the sample_size entries
+      most relevant to it instead of the most recent ones
+
+    Returns:
+    - dict of theme name → description
+    """
+    if isinstance(journal_df, JournalStore):
+        # Recent entries straight from the date index; a query still needs every entry
+        if not query:
+            journal_df = journal_df.latest(sample_size)
+        else:
+            journal_df = journal_df.all()
+
+    if query:
+        matches = JournalIndex.from_frame(journal_df).search(query, k=sample_size)
+        entries = pd.DataFrame([entry for _, entry in matches], columns=journal_df.columns)
+    else:
+        entries = journal_df.sort_values("date", ascending=False).head(sample_size)
+    journal_text = "\n".join(entries["content"].tolist())
+
+    prompt = _archetype_prompt(journal_text)
+
     try:
-        response = openai.chat.completions.create(
+        response = chat_completion(
+            openai_key,
             model="gpt-4o",
             messages=[
-                {"role": "system", "content": "You extract the psychological and philosophical structure behind journals."},
+                {"role": "system", "content": SYSTEM_PROMPT},
                 {"role": "user", "content": prompt}
             ],
             temperature=0.7,
@@ -61,3 +106,134 @@ def extract_journal_archetypes(journal_df: pd.DataFrame, openai_key: str, sample
     except Exception as e:
         print(f"[Error] Could not parse GPT output: {e}")
         return {"raw_output": result_text}
+
+
+def _parse_themes(result_text: str) -> dict:
+    if result_text.startswith("```"):
+        result_text = re.sub(r"^```json|```$", "", result_text, flags=re.MULTILINE).strip()
+    themes = json.loads(result_text)
+    if not isinstance(themes, dict):
+        raise ValueError("expected a JSON object of theme → description")
+    return themes
+
+
+def _request_themes(prompt: str, openai_key: str, max_tokens: int = 700) -> dict:
+    response = chat_completion(
+        openai_key,
+        model=ARCHETYPE_MODEL,
+        messages=[
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ],
+        temperature=0.7,
+        max_tokens=max_tokens
+    )
+    return _parse_themes(response.choices[0].message.content.strip())
+
+
+def _merge_prompt(chunk_themes: list) -> str:
+    listed = "\n".join(
+        f"- {name}: {description}"
+        for themes in chunk_themes
+        for name, description in themes.items()
+    )
+    return f"""
+        Below are inner themes extracted separately from consecutive parts of one person's journal.
+
+        Merge them into the 3–7 themes that best describe this person across the whole journal.
+        Combine themes that are the same pattern under different names; keep recurring ones,
+        drop ones that appear only once unless they are striking.
+
+        Keep the same style: a word or short phrase as the name, a 1–2 sentence description,
+        poetic, precise, human language, no clinical labels.
+
+        Themes:
+        {listed}
+
+        Return your answer in JSON format, like:
+        {{
+        "Theme Name 1": "Description...",
+        "Theme Name 2": "Description...",
+        ...
+        }}
+        """
+
+
+def journal_chunks(journal_df, chunk_size: int = DEFAULT_CHUNK_SIZE) -> list:
+    """Journal text of consecutive chunk_size entries, oldest first (stable as entries are appended)."""
+    if isinstance(journal_df, JournalStore):
+        entries = journal_df.all()["content"].tolist()  # already in date order
+    else:
+        entries = journal_df.sort_values("date", kind="stable")["content"].tolist()
+    return ["\n".join(entries[i:i + chunk_size]) for i in range(0, len(entries), chunk_size)]
+
+
+def extract_journal_archetypes_map_reduce(
+    journal_df,
+    openai_key: str,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    cache: ArchetypeCache = None,
+    max_workers: int = DEFAULT_MAX_WORKERS,
+) -> dict:
+    """
+    Map-reduce variant of extract_journal_archetypes for journals of any length.
+
+    Map: themes are extracted for each chunk of chunk_size entries, in parallel.
+    Reduce: one small request merges the chunk themes into the final 3–7.
+    With a cache, only chunks whose text changed since the last call (normally just
+    the newest) are sent to the LLM, and an unchanged journal makes no call at all.
+
+    Parameters:
+    - journal_df: DataFrame with 'date' and 'content' columns, or a JournalStore
+    - openai_key: OpenAI API key
+    - chunk_size: entries per map request
+    - cache: ArchetypeCache for chunk and merged themes
+    - max_workers: parallel map requests
+
+    Returns:
+    - dict of theme name → description
+    """
+    chunks = journal_chunks(journal_df, chunk_size)
+    if not chunks:
+        return {}
+
+    keys = [ArchetypeCache.archetype_key(ARCHETYPE_MODEL, chunk) for chunk in chunks]
+    chunk_themes = [cache.get(key) if cache is not None else None for key in keys]
+    pending = [i for i, themes in enumerate(chunk_themes) if themes is None]
+
+    def _map(i):
+        try:
+            return i, _request_themes(_archetype_prompt(chunks[i]), openai_key)
+        except Exception as e:
+            print(f"[Error] Could not extract themes for chunk {i}: {e}")
+            return i, None
+
+    if pending:
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            for i, themes in pool.map(_map, pending):
+                chunk_themes[i] = themes
+                if themes is not None and cache is not None:
+                    cache.put(keys[i], themes)
+    print(f"🧩 {len(chunks) - len(pending)}/{len(chunks)} journal chunks from cache")
+
+    # None marks a failed chunk; {} is a valid answer (no themes in that chunk)
+    complete = all(themes is not None for themes in chunk_themes)
+    chunk_themes = [themes for themes in chunk_themes if themes is not None]
+    if not chunk_themes:
+        return {}
+    if len(chunk_themes) == 1:
+        return chunk_themes[0]
+
+    merge_key = ArchetypeCache.archetype_key(ARCHETYPE_MODEL, "merge", *keys)
+    merged = cache.get(merge_key) if cache is not None else None
+    if merged is None:
+        try:
+            merged = _request_themes(_merge_prompt(chunk_themes), openai_key)
+        except Exception as e:
+            # Keep the map results: the union of the chunk themes, not cached so the merge is retried
+            print(f"[Error] Could not merge journal themes: {e}")
+            return {name: description for themes in chunk_themes for name, description in themes.items()}
+        # A merge missing a failed chunk is returned but not cached, so it is retried next time
+        if cache is not None and complete:
+            cache.put(merge_key, merged)
+    return merged
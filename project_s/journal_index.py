@@ -0,0 +1,205 @@
+import re
+import math
+import heapq
+import hashlib
+import threading
+import unicodedata
+from collections import Counter, OrderedDict, defaultdict
+from perception_journal import parse_journal_entries
+
+
+# Retrieval over journal entries, so prompts carry the few entries relevant to the
+# week instead of the whole journal. BM25 over an in-memory inverted index; tokens
+# are casefolded and stripped of accents, so Greek ("Μοναξιά" / "μοναξια") and
+# English match regardless of tonos or case.
+DEFAULT_TOP_K = 8
+DEFAULT_MAX_CHARS = 6000
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# Built indexes kept per process: one per user (or per journal text when no user is
+# given), least recently used dropped past either bound
+INDEX_CACHE_SIZE = 64
+INDEX_CACHE_MAX_CHARS = 50_000_000
+
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+STOPWORDS = frozenset("""
+a an and are as at be but by for from had has have he her his i if in into is it its
+me my not of on or our she so that the their them then there they this to was we were
+what when which who will with you your
+αλλα αν αυτα αυτη αυτο αυτος για δε δεν εγω εινα ειναι εκει και κι μα με μετα μη μην
+μια μου να ο οι οπως οτι οταν πιο που προς σε σου στα στη στην στο στον στους τα την
+της τι το τον του τους των ωστε
+""".split())
+
+
+def fold(text: str) -> str:
+    """Casefold text and strip accents ('Μοναξιά' → 'μοναξια'), for matching."""
+    decomposed = unicodedata.normalize("NFD", text.casefold())
+    return "".join(c for c in decomposed if unicodedata.category(c) != "Mn")
+
+
+def tokenize(text: str) -> list:
+    """Lowercase, accent-free word tokens of text, without stopwords and single letters."""
+    tokens = TOKEN_PATTERN.findall(fold(text))
+    return [t for t in tokens if len(t) > 1 and not t.isdigit() and t not in STOPWORDS]
+
+
+class JournalIndex:
+    """
+    BM25 index over journal entries.
+
+    Entries are the records produced by parse_journal_entries (date, week_id, content).
+    Building is linear in the journal size; a search only touches the postings of the
+    query terms.
+    """
+
+    def __init__(self, entries: list, k1: float = BM25_K1, b: float = BM25_B):
+        self.entries = list(entries)
+        self.k1 = k1
+        self.b = b
+        self._postings = defaultdict(list)  # token → [(entry index, term frequency)]
+        self._lengths = []
+
+        for i, entry in enumerate(self.entries):
+            counts = Counter(tokenize(entry["content"]))
+            self._lengths.append(sum(counts.values()))
+            for token, tf in counts.items():
+                self._postings[token].append((i, tf))
+
+        self._avg_length = (sum(self._lengths) / len(self._lengths)) if self._lengths else 0.0
+
+    @classmethod
+    def from_text(cls, journal_text: str, default_year=2025) -> "JournalIndex":
+        """Index a raw journal; text without '=== date ===' headers is split into paragraphs."""
+        entries = parse_journal_entries(journal_text, default_year)
+        if not entries:
+            entries = [
+                {"date": None, "week_id": None, "content": paragraph.strip()}
+                for paragraph in re.split(r"\n\s*\n", journal_text)
+                if paragraph.strip()
+            ]
+        return cls(entries)
+
+    @classmethod
+    def from_frame(cls, journal_df) -> "JournalIndex":
+        """Index a journal DataFrame with date and content columns (week_id optional)."""
+        return cls(journal_df.to_dict("records"))
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def _idf(self, token: str) -> float:
+        df = len(self._postings.get(token, ()))
+        return math.log(1 + (len(self.entries) - df + 0.5) / (df + 0.5))
+
+    def search(self, query: str, k: int = DEFAULT_TOP_K) -> list:
+        """
+        Top-k entries for query, best first.
+
+        Returns:
+            list: (score, entry) tuples; entries without any query term are never returned.
+        """
+        scores = defaultdict(float)
+        for token in set(tokenize(query)):
+            postings = self._postings.get(token)
+            if not postings:
+                continue
+            idf = self._idf(token)
+            for i, tf in postings:
+                norm = self.k1 * (1 - self.b + self.b * self._lengths[i] / self._avg_length)
+                scores[i] += idf * tf * (self.k1 + 1) / (tf + norm)
+
+        best = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+        return [(score, self.entries[i]) for i, score in best]
+
+
+_indexes = OrderedDict()  # user_id or text hash → (text hash, chars, JournalIndex)
+_indexes_lock = threading.Lock()
+
+
+def index_for_text(journal_text: str, user_id: str = None) -> JournalIndex:
+    """
+    JournalIndex for journal_text, reused across runs on the same journal in this process.
+
+    With user_id the user holds one slot, replaced when their journal changes; the
+    cache is keyed by a hash, so the raw text is not kept alive by it.
+    """
+    text_hash = hashlib.sha256(journal_text.encode("utf-8")).hexdigest()
+    key = user_id if user_id is not None else text_hash
+    with _indexes_lock:
+        cached = _indexes.get(key)
+        if cached is not None and cached[0] == text_hash:
+            _indexes.move_to_end(key)
+            return cached[2]
+
+    index = JournalIndex.from_text(journal_text)
+    with _indexes_lock:
+        _indexes[key] = (text_hash, len(journal_text), index)
+        _indexes.move_to_end(key)
+        total_chars = sum(chars for _, chars, _ in _indexes.values())
+        while len(_indexes) > 1 and (len(_indexes) > INDEX_CACHE_SIZE or total_chars > INDEX_CACHE_MAX_CHARS):
+            _, (_, chars, _) = _indexes.popitem(last=False)
+            total_chars -= chars
+    return index
+
+
+def format_entries(entries: list) -> str:
+    """Entries back in the journal's own '=== date ===' layout, oldest first."""
+    entries = sorted(entries, key=lambda e: e.get("date") or "")
+    blocks = []
+    for entry in entries:
+        header = f"=== {entry['date']} ===\n" if entry.get("date") else ""
+        blocks.append(f"{header}{entry['content']}")
+    return "\n\n".join(blocks)
+
+
+def select_journal_context(
+    journal_text: str,
+    query: str,
+    k: int = DEFAULT_TOP_K,
+    week_id: int = None,
+    max_chars: int = DEFAULT_MAX_CHARS,
+    user_id: str = None,
+) -> str:
+    """
+    The part of the journal to send with a prompt: the k entries most relevant to query.
+
+    Entries written in week_id come first, then BM25 matches for the query (usually the
+    weekly perception text). The result never exceeds max_chars, whatever the journal size.
+
+    Args:
+        journal_text (str): The full journal.
+        query (str): Text to rank entries against.
+        k (int): Maximum number of entries.
+        week_id (int): Target week; its entries are always included (within k).
+        max_chars (int): Character budget for the returned text.
+        user_id (str): Owner of the journal, to cache its index under (see index_for_text).
+
+    Returns:
+        str: Selected entries in date order, in the journal's text layout.
+    """
+    if not journal_text:
+        return ""
+    index = index_for_text(journal_text, user_id)
+
+    selected = []
+    if week_id is not None:
+        selected = [e for e in index.entries if e.get("week_id") == week_id][:k]
+    for _, entry in index.search(query or "", k=k):
+        if len(selected) >= k:
+            break
+        if not any(entry is s for s in selected):
+            selected.append(entry)
+
+    budgeted = []
+    used = 0
+    for entry in selected:
+        size = len(entry["content"]) + 20  # header and separator
+        if budgeted and used + size > max_chars:
+            break
+        budgeted.append(entry if size <= max_chars else {**entry, "content": entry["content"][:max_chars - 20]})
+        used += size
+
+    return format_entries(budgeted)
@@ -0,0 +1,130 @@
+import os
+import sqlite3
+import hashlib
+import threading
+import pandas as pd
+from journal_index import fold
+from schema import compact_frame
+
+
+# Journal entries in SQLite, indexed by date. ISO dates ('2025-06-23') sort correctly
+# as text, so "latest n" and date ranges are index range scans: nothing is sorted or
+# loaded beyond the rows asked for. content_folded is the casefolded, accent-free
+# content, so contains() matches Greek and English regardless of case or tonos.
+COLUMNS = ["date", "week_id", "content"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    id INTEGER PRIMARY KEY,
+    date TEXT NOT NULL,
+    week_id INTEGER,
+    content TEXT NOT NULL,
+    content_folded TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    UNIQUE (date, content_hash)
+);
+CREATE INDEX IF NOT EXISTS entries_date ON entries (date);
+CREATE INDEX IF NOT EXISTS entries_week_id ON entries (week_id);
+"""
+
+
+class JournalStore:
+    """
+    Date-indexed journal store answering latest-n, date-range and contains queries.
+
+    Usage:
+        store = JournalStore(DATA_JOURNAL_DB)
+        store.add(parse_journal_text(DATA_JOURNAL_TXT_FILE))
+        recent = store.latest(10)
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def __len__(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def add(self, entries) -> int:
+        """
+        Insert entries (records from parse_journal_text, or a DataFrame with date, content
+        and optionally week_id). Entries already stored are skipped, so re-adding the whole
+        parsed journal only inserts the new ones.
+
+        Returns:
+            int: Number of entries inserted.
+        """
+        if isinstance(entries, pd.DataFrame):
+            entries = entries.to_dict("records")
+        rows = [
+            (
+                str(e["date"])[:10],
+                _int_or_none(e.get("week_id")),
+                e["content"],
+                fold(e["content"]),
+                hashlib.sha1(e["content"].encode("utf-8")).hexdigest(),
+            )
+            for e in entries
+        ]
+        with self._lock, self._conn:
+            before = self._conn.total_changes
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO entries (date, week_id, content, content_folded, content_hash) VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+            return self._conn.total_changes - before
+
+    def _query(self, where: str = "", params: tuple = (), order: str = "date, id", limit: int = None) -> pd.DataFrame:
+        sql = f"SELECT date, week_id, content FROM entries {where} ORDER BY {order}"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params = (*params, int(limit))
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return compact_frame(pd.DataFrame(rows, columns=COLUMNS), "journal")
+
+    def latest(self, n: int = 10) -> pd.DataFrame:
+        """The n most recent entries, newest first."""
+        return self._query(order="date DESC, id DESC", limit=n)
+
+    def between(self, start=None, end=None) -> pd.DataFrame:
+        """Entries with start <= date <= end (inclusive, either bound optional), oldest first."""
+        clauses, params = [], []
+        if start is not None:
+            clauses.append("date >= ?")
+            params.append(pd.Timestamp(start).strftime("%Y-%m-%d"))
+        if end is not None:
+            clauses.append("date <= ?")
+            params.append(pd.Timestamp(end).strftime("%Y-%m-%d"))
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        return self._query(where, tuple(params))
+
+    def week(self, week_id: int) -> pd.DataFrame:
+        """Entries of one week_id, oldest first."""
+        return self._query("WHERE week_id = ?", (int(week_id),))
+
+    def contains(self, text: str, limit: int = None) -> pd.DataFrame:
+        """Entries whose content contains text (ignoring case and accents), newest first."""
+        return self._query("WHERE instr(content_folded, ?) > 0", (fold(text),), order="date DESC, id DESC", limit=limit)
+
+    def all(self) -> pd.DataFrame:
+        """Every entry, oldest first, read in index order (no sort)."""
+        return self._query()
+
+
+def _int_or_none(value):
+    return None if value is None or pd.isna(value) else int(value)
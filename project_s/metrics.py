@@ -0,0 +1,340 @@
+import os
+import json
+import queue
+import atexit
+import threading
+import contextvars
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from datetime import datetime
+import pandas as pd
+
+
+# Instrumentation for graph nodes, LLM calls and message sends. Every call records
+# wall time, tokens (prompt / completion / cached), estimated cost, retries and
+# payload bytes, attributed to the run and node it happened in. Records are kept
+# in memory (bounded) and optionally streamed to a JSONL file by a writer thread;
+# running totals, kept apart from the bounded window, are what export_prometheus()
+# writes in Prometheus text format (node_exporter textfile collector).
+#
+# Record kinds
+NODE, LLM, MESSAGE = "node", "llm", "message"
+
+DEFAULT_MAX_RECORDS = 100_000
+METRICS_JSONL = os.environ.get("PROJECT_S_METRICS_JSONL")  # stream every record here if set
+
+# USD per 1M tokens: (input, cached input, output). Longest matching prefix of the model wins.
+MODEL_PRICES = {
+    "gpt-4o": (2.50, 1.25, 10.00),
+    "gpt-4o-mini": (0.15, 0.075, 0.60),
+}
+
+# Counted per (kind, name, node, status) since the recorder was created
+TOTAL_FIELDS = [
+    "wall_s", "retries", "prompt_tokens", "completion_tokens", "cached_tokens", "cost_usd",
+    "request_bytes", "response_bytes",
+]
+
+RECORD_FIELDS = [
+    "kind", "name", "run_id", "user_id", "node", "started_at", "wall_s", "status", "error",
+    "prompt_tokens", "completion_tokens", "cached_tokens", "cost_usd", "retries",
+    "request_bytes", "response_bytes",
+]
+
+_run_id = contextvars.ContextVar("project_s_run_id", default=None)
+_user_id = contextvars.ContextVar("project_s_user_id", default=None)
+_node = contextvars.ContextVar("project_s_node", default=None)
+
+
+@contextmanager
+def scope(run_id=None, user_id=None, node=None):
+    """Attribute the records made inside the block to run_id / user_id / node (None keeps the outer value)."""
+    tokens = [
+        (var, var.set(value))
+        for var, value in ((_run_id, run_id), (_user_id, user_id), (_node, node))
+        if value is not None
+    ]
+    try:
+        yield
+    finally:
+        for var, token in reversed(tokens):
+            var.reset(token)
+
+
+def propagate(fn, **scope_fields):
+    """
+    fn bound to the caller's metrics scope (narrowed by scope_fields), for work handed
+    to a thread pool: ThreadPoolExecutor does not carry context variables over.
+    """
+    context = contextvars.copy_context()
+
+    def _scoped(*args, **kwargs):
+        with scope(**scope_fields):
+            return fn(*args, **kwargs)
+
+    def _call(*args, **kwargs):
+        return context.copy().run(_scoped, *args, **kwargs)
+
+    return _call
+
+
+def estimate_cost(model: str, prompt_tokens: int, completion_tokens: int, cached_tokens: int = 0):
+    """Estimated USD cost of one call, or None for a model missing from MODEL_PRICES."""
+    matches = [name for name in MODEL_PRICES if model and model.startswith(name)]
+    if not matches:
+        return None
+    input_price, cached_price, output_price = MODEL_PRICES[max(matches, key=len)]
+    cached_tokens = cached_tokens or 0
+    cost = (
+        ((prompt_tokens or 0) - cached_tokens) * input_price
+        + cached_tokens * cached_price
+        + (completion_tokens or 0) * output_price
+    )
+    return round(cost / 1_000_000, 6)
+
+
+def usage_fields(response, model: str) -> dict:
+    """Token counts and estimated cost from a chat completion's usage block."""
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return {}
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached_tokens = getattr(details, "cached_tokens", None) or 0
+    model = getattr(response, "model", None) or model
+    return {
+        "prompt_tokens": usage.prompt_tokens,
+        "completion_tokens": usage.completion_tokens,
+        "cached_tokens": cached_tokens,
+        "cost_usd": estimate_cost(model, usage.prompt_tokens, usage.completion_tokens, cached_tokens),
+    }
+
+
+def payload_bytes(value) -> int:
+    """Size of value as a JSON request body (messages with base64 images included)."""
+    if value is None:
+        return 0
+    if isinstance(value, str):
+        return len(value.encode("utf-8"))
+    return len(json.dumps(value, ensure_ascii=False, default=str).encode("utf-8"))
+
+
+class MetricsRecorder:
+    """
+    Thread-safe store of call records.
+
+    Usage:
+        recorder = get_recorder()
+        final_state = build_graph().invoke(state)
+        recorder.summary()                      # one row per run and node
+        recorder.export_jsonl(DATA_METRICS_JSONL)
+        recorder.export_prometheus(DATA_METRICS_PROM)
+    """
+
+    def __init__(self, jsonl_path: str = METRICS_JSONL, max_records: int = DEFAULT_MAX_RECORDS):
+        self.jsonl_path = jsonl_path
+        self._records = deque(maxlen=max_records)
+        # (kind, name, node, status) → {"calls": n, field: sum, ...}; never evicted, so counters only grow
+        self._totals = defaultdict(lambda: dict.fromkeys(["calls", *TOTAL_FIELDS], 0))
+        self._lock = threading.Lock()
+        self._lines = None  # JSONL lines waiting for the writer thread
+        self._writer = None
+
+    def record(self, kind: str, name: str, wall_s: float, started_at: float = None, error: Exception = None, **fields) -> dict:
+        """Add one record; the current scope supplies run_id, user_id and node."""
+        record = dict.fromkeys(RECORD_FIELDS)
+        record.update(
+            kind=kind,
+            name=name,
+            run_id=_run_id.get(),
+            user_id=_user_id.get(),
+            node=_node.get(),
+            started_at=datetime.fromtimestamp(started_at).isoformat(timespec="milliseconds") if started_at else None,
+            wall_s=round(wall_s, 4),
+            status="error" if error is not None else "ok",
+            error=f"{type(error).__name__}: {error}" if error is not None else None,
+            retries=0,
+        )
+        record.update(fields)
+
+        with self._lock:
+            self._records.append(record)
+            totals = self._totals[(kind, name, record["node"] or "", record["status"])]
+            totals["calls"] += 1
+            for field in TOTAL_FIELDS:
+                totals[field] += record[field] or 0
+            if self.jsonl_path:
+                if self._writer is None:
+                    self._start_writer()
+                self._lines.put(json.dumps(record, ensure_ascii=False) + "\n")
+        return record
+
+    def _start_writer(self) -> None:
+        """Stream records to jsonl_path from a background thread through one buffered handle."""
+        if os.path.dirname(self.jsonl_path):
+            os.makedirs(os.path.dirname(self.jsonl_path), exist_ok=True)
+        self._lines = queue.Queue()
+        self._writer = threading.Thread(target=self._write_lines, args=(self.jsonl_path, self._lines), daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
+
+    @staticmethod
+    def _write_lines(path: str, lines: queue.Queue) -> None:
+        with open(path, "a", encoding="utf-8") as f:
+            done = False
+            while not done:
+                # Write whatever has queued up, then flush once; None stops the thread
+                batch = [lines.get()]
+                while True:
+                    try:
+                        batch.append(lines.get_nowait())
+                    except queue.Empty:
+                        break
+                done = None in batch
+                f.writelines(line for line in batch if line is not None)
+                f.flush()
+                for _ in batch:
+                    lines.task_done()
+
+    def flush(self) -> None:
+        """Block until every record so far is written to jsonl_path."""
+        if self._lines is not None:
+            self._lines.join()
+
+    def close(self) -> None:
+        """Write the pending records and stop the writer thread (a later record starts a new one)."""
+        with self._lock:
+            lines, writer = self._lines, self._writer
+            self._lines = self._writer = None
+        if writer is not None:
+            lines.put(None)
+            writer.join()
+            atexit.unregister(self.close)
+
+    def records(self, run_id: str = None) -> list:
+        with self._lock:
+            records = list(self._records)
+        return [r for r in records if r["run_id"] == run_id] if run_id is not None else records
+
+    def clear(self) -> None:
+        """Drop the kept records; the running totals behind export_prometheus are kept."""
+        with self._lock:
+            self._records.clear()
+
+    def frame(self, run_id: str = None) -> pd.DataFrame:
+        return pd.DataFrame(self.records(run_id), columns=RECORD_FIELDS)
+
+    def summary(self, run_id: str = None) -> pd.DataFrame:
+        """
+        Per-run table: one row per run and node, with the node's wall time and the
+        calls, tokens, cost, retries and bytes of the LLM / message calls made inside it.
+        """
+        df = self.frame(run_id)
+        columns = [
+            "run_id", "user_id", "node", "wall_s", "llm_calls", "messages", "errors", "retries",
+            "prompt_tokens", "completion_tokens", "cached_tokens", "cost_usd", "request_bytes", "response_bytes",
+        ]
+        if df.empty:
+            return pd.DataFrame(columns=columns)
+
+        df["node"] = df["node"].fillna("-")
+        df["run_id"] = df["run_id"].fillna("-")
+        keys = ["run_id", "node"]
+        calls = df[df["kind"] != NODE]
+        nodes = df[df["kind"] == NODE]
+
+        summary = nodes.groupby(keys).agg(user_id=("user_id", "first"), wall_s=("wall_s", "sum"))
+        totals = calls.groupby(keys).agg(
+            llm_calls=("kind", lambda kinds: int((kinds == LLM).sum())),
+            messages=("kind", lambda kinds: int((kinds == MESSAGE).sum())),
+            retries=("retries", "sum"),
+            prompt_tokens=("prompt_tokens", "sum"),
+            completion_tokens=("completion_tokens", "sum"),
+            cached_tokens=("cached_tokens", "sum"),
+            cost_usd=("cost_usd", "sum"),
+            request_bytes=("request_bytes", "sum"),
+            response_bytes=("response_bytes", "sum"),
+        )
+        errors = df.assign(error_count=df["status"] == "error").groupby(keys)["error_count"].sum().rename("errors")
+        summary = summary.join(totals, how="outer").join(errors, how="left").reset_index()
+
+        counts = ["llm_calls", "messages", "errors", "retries", "prompt_tokens", "completion_tokens",
+                  "cached_tokens", "request_bytes", "response_bytes"]
+        summary[counts] = summary[counts].fillna(0).astype("int64")
+        summary["cost_usd"] = summary["cost_usd"].fillna(0.0).round(4)
+        summary["wall_s"] = summary["wall_s"].round(3)
+        return summary[columns]
+
+    def export_jsonl(self, path: str, run_id: str = None) -> None:
+        """Write the records as JSON lines (replacing path)."""
+        records = self.records(run_id)
+        _atomic_write(path, "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records))
+
+    def export_prometheus(self, path: str = None) -> str:
+        """
+        The running totals in Prometheus text exposition format, written to path if given.
+
+        Counters are labelled by kind, name (node, model or transport), node and status,
+        and cover every record since the recorder was created, not only the kept ones.
+        """
+        with self._lock:
+            totals = {labels: dict(values) for labels, values in self._totals.items()}
+        lines = []
+
+        def _metric(metric, kind, help_text, column, kinds=None):
+            lines.append(f"# HELP project_s_{metric} {help_text}")
+            lines.append(f"# TYPE project_s_{metric} {kind}")
+            for (record_kind, name, node, status), values in sorted(totals.items(), key=lambda item: str(item[0])):
+                if kinds is not None and record_kind not in kinds:
+                    continue
+                labels = {"kind": record_kind, "name": name, "node": node, "status": status}
+                label_text = ",".join(f'{key}="{_escape(value_)}"' for key, value_ in labels.items())
+                lines.append(f"project_s_{metric}{{{label_text}}} {_format_value(values[column])}")
+
+        _metric("calls_total", "counter", "Graph node runs, LLM calls and message sends.", "calls")
+        _metric("wall_seconds_total", "counter", "Wall time spent, in seconds.", "wall_s")
+        # Per-call counters: node records carry only wall time
+        calls = (LLM, MESSAGE)
+        _metric("retries_total", "counter", "Retries before a call succeeded or gave up.", "retries", kinds=calls)
+        _metric("cost_usd_total", "counter", "Estimated LLM cost in USD.", "cost_usd", kinds=(LLM,))
+        for token_type in ("prompt", "completion", "cached"):
+            _metric(f"{token_type}_tokens_total", "counter", f"LLM {token_type} tokens.", f"{token_type}_tokens", kinds=(LLM,))
+        _metric("request_bytes_total", "counter", "Request payload bytes.", "request_bytes", kinds=calls)
+        _metric("response_bytes_total", "counter", "Response payload bytes.", "response_bytes", kinds=calls)
+
+        text = "\n".join(lines) + "\n"
+        if path:
+            _atomic_write(path, text)
+        return text
+
+
+def _format_value(value) -> str:
+    # Counters grow past the 6 significant digits of :g
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(round(value, 6))
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _atomic_write(path: str, text: str) -> None:
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+_recorder = MetricsRecorder()
+
+
+def get_recorder() -> MetricsRecorder:
+    """The process-wide recorder that nodes, chat_completion and transports report to."""
+    return _recorder
+
+
+def set_recorder(recorder: MetricsRecorder) -> None:
+    """Replace the process-wide recorder (e.g. one streaming to a different JSONL file)."""
+    global _recorder
+    _recorder = recorder
@@ -0,0 +1,232 @@
+import time
+import random
+import asyncio
+import weakref
+import threading
+import httpx
+import openai
+from metrics import LLM, get_recorder, payload_bytes, usage_fields
+
+
+# One pooled client per API key, shared by every module and thread.
+# The SDK's own retries are disabled; chat_completion retries with jittered
+# exponential backoff and trips a circuit breaker when the API keeps failing.
+# Every call is recorded (wall time, tokens, cost, retries, bytes; see metrics.py).
+MAX_CONNECTIONS = 20
+MAX_KEEPALIVE_CONNECTIONS = 10
+REQUEST_TIMEOUT_S = 120
+
+MAX_RETRIES = 5
+BASE_DELAY_S = 1.0
+MAX_DELAY_S = 30.0
+
+BREAKER_FAILURE_THRESHOLD = 5
+BREAKER_COOLDOWN_S = 60.0
+
+_clients = {}
+# event loop → {api_key: AsyncOpenAI}; weak on the loop, so a discarded loop does not pin its clients
+_async_clients = weakref.WeakKeyDictionary()
+_breakers = {}
+_lock = threading.Lock()
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling the API while the circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive retryable failures and rejects calls
+    for `cooldown_s`; then lets one trial call through (half-open) and closes on success.
+    """
+
+    def __init__(self, failure_threshold: int = BREAKER_FAILURE_THRESHOLD, cooldown_s: float = BREAKER_COOLDOWN_S):
+        self.failure_threshold = failure_threshold
+        self.cooldown_s = cooldown_s
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def before_call(self) -> None:
+        with self._lock:
+            if self._opened_at is None:
+                return
+            if time.monotonic() - self._opened_at < self.cooldown_s or self._trial_in_flight:
+                raise CircuitOpenError("OpenAI circuit breaker is open; skipping call.")
+            self._trial_in_flight = True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def release(self) -> None:
+        """End a call that says nothing about API health (e.g. a local error)."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+
+
+def _http_limits() -> httpx.Limits:
+    return httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS)
+
+
+def get_client(api_key: str) -> openai.OpenAI:
+    """Shared, connection-pooled client for api_key (thread-safe)."""
+    with _lock:
+        client = _clients.get(api_key)
+        if client is None:
+            client = openai.OpenAI(
+                api_key=api_key,
+                max_retries=0,
+                timeout=REQUEST_TIMEOUT_S,
+                http_client=httpx.Client(limits=_http_limits(), timeout=REQUEST_TIMEOUT_S),
+            )
+            _clients[api_key] = client
+        return client
+
+
+def get_async_client(api_key: str) -> openai.AsyncOpenAI:
+    """Shared async client for api_key, one per event loop (async connections are loop-bound)."""
+    loop = asyncio.get_running_loop()
+    with _lock:
+        clients = _async_clients.setdefault(loop, {})
+        client = clients.get(api_key)
+        if client is None:
+            client = openai.AsyncOpenAI(
+                api_key=api_key,
+                max_retries=0,
+                timeout=REQUEST_TIMEOUT_S,
+                http_client=httpx.AsyncClient(limits=_http_limits(), timeout=REQUEST_TIMEOUT_S),
+            )
+            clients[api_key] = client
+        return client
+
+
+async def close_async_clients() -> None:
+    """Close the running loop's async clients; call before the loop shuts down (run_batch_async does)."""
+    with _lock:
+        clients = _async_clients.pop(asyncio.get_running_loop(), {})
+    for client in clients.values():
+        await client.close()
+
+
+def get_breaker(api_key: str) -> CircuitBreaker:
+    with _lock:
+        breaker = _breakers.get(api_key)
+        if breaker is None:
+            breaker = _breakers[api_key] = CircuitBreaker()
+        return breaker
+
+
+def _is_retryable(error: Exception) -> bool:
+    if isinstance(error, (openai.APIConnectionError, openai.APITimeoutError, openai.RateLimitError)):
+        return True
+    return isinstance(error, openai.APIStatusError) and error.status_code >= 500
+
+
+def _record_non_retryable(breaker: CircuitBreaker, error: Exception) -> None:
+    if isinstance(error, openai.APIStatusError):
+        breaker.record_success()  # the API answered; the request itself was bad (e.g. 400)
+    else:
+        breaker.release()
+
+
+def _backoff_delay(attempt: int, error: Exception) -> float:
+    """Full-jitter exponential backoff, honouring Retry-After when the API sends one."""
+    response = getattr(error, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    if retry_after:
+        try:
+            return min(float(retry_after), MAX_DELAY_S)
+        except ValueError:
+            pass
+    return random.uniform(0, min(MAX_DELAY_S, BASE_DELAY_S * 2 ** attempt))
+
+
+def _record_call(kwargs: dict, started_at: float, started: float, attempt: int, response=None, error: Exception = None) -> None:
+    model = kwargs.get("model")
+    get_recorder().record(
+        LLM,
+        model,
+        time.perf_counter() - started,
+        started_at=started_at,
+        error=error,
+        retries=attempt,
+        request_bytes=payload_bytes(kwargs.get("messages")),
+        response_bytes=payload_bytes(
+            "".join(choice.message.content or "" for choice in response.choices) if response is not None else None
+        ),
+        **(usage_fields(response, model) if response is not None else {}),
+    )
+
+
+def chat_completion(api_key: str, max_retries: int = MAX_RETRIES, **kwargs):
+    """
+    client.chat.completions.create(**kwargs) on the shared client for api_key,
+    retrying 429/5xx/connection errors with backoff behind a circuit breaker.
+    """
+    client = get_client(api_key)
+    breaker = get_breaker(api_key)
+    started_at, started = time.time(), time.perf_counter()
+
+    for attempt in range(max_retries + 1):
+        try:
+            breaker.before_call()
+            response = client.chat.completions.create(**kwargs)
+        except CircuitOpenError as e:
+            _record_call(kwargs, started_at, started, attempt, error=e)
+            raise
+        except Exception as e:
+            if not _is_retryable(e):
+                _record_non_retryable(breaker, e)
+                _record_call(kwargs, started_at, started, attempt, error=e)
+                raise
+            breaker.record_failure()
+            if attempt == max_retries:
+                _record_call(kwargs, started_at, started, attempt, error=e)
+                raise
+            time.sleep(_backoff_delay(attempt, e))
+            continue
+
+        breaker.record_success()
+        _record_call(kwargs, started_at, started, attempt, response=response)
+        return response
+
+
+async def chat_completion_async(api_key: str, client: openai.AsyncOpenAI = None, max_retries: int = MAX_RETRIES, **kwargs):
+    """Async chat_completion; uses the shared async client for api_key unless client is given."""
+    client = client or get_async_client(api_key)
+    breaker = get_breaker(api_key)
+    started_at, started = time.time(), time.perf_counter()
+
+    for attempt in range(max_retries + 1):
+        try:
+            breaker.before_call()
+            response = await client.chat.completions.create(**kwargs)
+        except CircuitOpenError as e:
+            _record_call(kwargs, started_at, started, attempt, error=e)
+            raise
+        except Exception as e:
+            if not _is_retryable(e):
+                _record_non_retryable(breaker, e)
+                _record_call(kwargs, started_at, started, attempt, error=e)
+                raise
+            breaker.record_failure()
+            if attempt == max_retries:
+                _record_call(kwargs, started_at, started, attempt, error=e)
+                raise
+            await asyncio.sleep(_backoff_delay(attempt, e))
+            continue
+
+        breaker.record_success()
+        _record_call(kwargs, started_at, started, attempt, response=response)
+        return response
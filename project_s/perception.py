@@ -1,17 +1,19 @@
+import asyncio
 import pandas as pd
-from datetime import datetime
+from datetime import datetime, timedelta
 from graph_state import GraphState
+from week_key import DEFAULT_YEAR, week_ids_of, week_ids_from_labels
+from perception_screen_time import parse_duration_minutes
+from schema import compact_frame
+from data_handles import as_handle
 
 # --- Utilities ---
-def parse_week_range(week_str):
+def parse_week_range(week_str, year=DEFAULT_YEAR):
     """Convert 'Jun 23–29' to start and end datetime objects."""
     try:
         parts = week_str.replace("–", "-").split("-")
-        start = datetime.strptime(parts[0].strip(), "%b %d")
-        end_day = int(parts[1].strip())
-        year = 2025  # can make dynamic if needed
-        start = start.replace(year=year)
-        end = start.replace(day=end_day)
+        start = datetime.strptime(f"{parts[0].strip()} {year}", "%b %d %Y")
+        end = start + timedelta(days=6)  # end day may be in the next month ('Jun 30–6')
         return start, end
     except Exception as e:
         print(f"Error parsing week string '{week_str}': {e}")
@@ -20,10 +22,8 @@ def parse_week_range(week_str):
 
 def summarize_calendar(calendar_df, start, end):
     """Summarize calendar events for the given week."""
-    filtered = calendar_df[
-        (pd.to_datetime(calendar_df["start"]) >= start) &
-        (pd.to_datetime(calendar_df["start"]) <= end)
-    ]
+    starts = pd.to_datetime(calendar_df["start"])
+    filtered = calendar_df[(starts >= start) & (starts <= end)]
     if filtered.empty:
         return "No events scheduled."
 
@@ -36,64 +36,183 @@ def summarize_calendar(calendar_df, start, end):
     return summary
 
 
+def _counts_by_week(events: pd.DataFrame, column: str) -> dict:
+    """{week_id: {value: count}} with counts in descending order, like value_counts()."""
+    counts = events.groupby(["week_id", column], observed=True).size().reset_index(name="n")
+    counts = counts.sort_values(["week_id", "n"], ascending=[True, False], kind="stable")
+    return {
+        week: dict(zip(group[column].tolist(), group["n"].tolist()))
+        for week, group in counts.groupby("week_id", sort=False)
+    }
+
+
+def summarize_calendar_by_week(calendar_df: pd.DataFrame, week_ids=None) -> dict:
+    """
+    Summarize calendar events for many weeks in one pass.
+
+    Events are keyed by their integer week_id (see week_key), then totals and
+    distributions are computed with a single groupby per field.
+
+    Returns:
+        dict: week_id → summary dict; weeks without events are absent.
+    """
+    if calendar_df.empty:
+        return {}
+
+    events = pd.DataFrame({
+        "week_id": week_ids_of(calendar_df, date_column="start").values,
+        "duration_min": calendar_df["duration_min"].values,
+        "time_of_day": calendar_df["time_of_day"].values,
+        "type": calendar_df["type"].values,
+    })
+    if week_ids is not None:
+        events = events[events["week_id"].isin(pd.Series(week_ids).dropna())]
+    if events.empty:
+        return {}
+
+    totals = events.groupby("week_id").agg(
+        total_events=("week_id", "size"),
+        total_minutes=("duration_min", "sum"),
+    )
+    time_of_day = _counts_by_week(events, "time_of_day")
+    meeting_types = _counts_by_week(events, "type")
+
+    return {
+        week: {
+            "total_events": int(row.total_events),
+            "total_minutes": row.total_minutes,
+            "time_of_day_breakdown": time_of_day.get(week, {}),
+            "meeting_type_distribution": meeting_types.get(week, {}),
+        }
+        for week, row in totals.iterrows()
+    }
+
+
+def summarize_screen_time_by_week(screen_time_df: pd.DataFrame):
+    """
+    Per-week app records ranked by minutes, plus each week's total minutes.
+
+    Uses the integer 'minutes' column written at ingestion (parsed from 'time' for
+    older frames). The 'All Usage' summary row is ranked but left out of the total.
+
+    Returns:
+        tuple: ({week_id: [{app_name, time, minutes}, ...]}, {week_id: total_minutes})
+    """
+    minutes = screen_time_df["minutes"] if "minutes" in screen_time_df.columns else parse_duration_minutes(screen_time_df["time"])
+    screen_time = pd.DataFrame({
+        "week_id": week_ids_of(screen_time_df).values,
+        "app_name": screen_time_df["app_name"].values,
+        "time": screen_time_df["time"].values,
+        "minutes": minutes.fillna(0).astype("int64").values,
+    }).sort_values(["week_id", "minutes"], ascending=[True, False], kind="stable")
+
+    totals = screen_time[screen_time["app_name"] != "All Usage"].groupby("week_id")["minutes"].sum()
+    records = {
+        week: group[["app_name", "time", "minutes"]].to_dict(orient="records")
+        for week, group in screen_time.groupby("week_id", sort=False)
+    }
+    return records, {week: int(total) for week, total in totals.items()}
+
+
 # --- Main function ---
 def perception_node(
     weekly_notes_df: pd.DataFrame,
     screen_time_df: pd.DataFrame,
     calendar_df: pd.DataFrame
 ) -> pd.DataFrame:
+    """
+    Build one perception row per weekly note.
+
+    All three inputs are joined on the integer week_id written at ingestion (derived
+    from labels/dates for older frames). Screen time is grouped once and calendar
+    events are summarized in a single pass, so the cost is O(weeks + events).
+    """
+    week_ids = week_ids_of(weekly_notes_df)
+    unparsed = week_ids.isna()
+    if unparsed.any():
+        print(f"Error parsing week strings: {weekly_notes_df.loc[unparsed, 'week'].tolist()}")
+    notes = weekly_notes_df[~unparsed]
+    week_ids = week_ids[~unparsed]
+
+    screen_by_week, screen_minutes_by_week = summarize_screen_time_by_week(screen_time_df)
+    calendar_by_week = summarize_calendar_by_week(calendar_df, week_ids)
+
+    result_df = pd.DataFrame({
+        "week_id": week_ids.values,
+        "week": notes["week"].values,
+        "work_highlights": notes["work_highlights"].values,
+        "life_highlights": notes["life_highlights"].values,
+        "weekly_notes_raw": notes["raw_notes"].values,
+        "screen_time": [screen_by_week.get(week, []) for week in week_ids],
+        "screen_time_minutes": [screen_minutes_by_week.get(week, 0) for week in week_ids],
+        "calendar_summary": [calendar_by_week.get(week, "No events scheduled.") for week in week_ids],
+    })
+    return compact_frame(result_df, "perception")
+
+
+def resolve_target_week(weekly_notes_df: pd.DataFrame, target_week="latest") -> int:
+    """
+    Turn a target week into a week_id.
+
+    Accepts a week_id (202526), a week label ('Jun 23–29') or 'latest'/None for the
+    most recent week with notes. weekly_notes_df may also be a DatasetHandle.
+    """
+    if target_week is None or target_week == "latest":
+        week_ids = as_handle(weekly_notes_df, "weekly_notes").week_ids()
+        if week_ids.empty:
+            raise ValueError("weekly_notes_df has no parsable weeks.")
+        return int(week_ids.max())
+    if isinstance(target_week, str) and not target_week.isdigit():
+        week_id = week_ids_from_labels(pd.Series([target_week])).iloc[0]
+        if pd.isna(week_id):
+            raise ValueError(f"Could not parse target week '{target_week}'.")
+        return int(week_id)
+    return int(target_week)
+
+
+def perception_for_week(
+    weekly_notes_df: pd.DataFrame,
+    screen_time_df: pd.DataFrame,
+    calendar_df: pd.DataFrame,
+    target_week="latest",
+) -> dict:
+    """
+    Perception for a single week, as a dict.
 
-    weekly_contexts = []
-
-    for _, row in weekly_notes_df.iterrows():
-        week_str = row["week"]
-        start_date, end_date = parse_week_range(week_str)
-        if start_date is None:
-            continue
-
-        # Screen time for the week
-        screen_subset = screen_time_df[screen_time_df["week"] == week_str]
-        screen_data = screen_subset[["app_name", "time"]].to_dict(orient="records")
+    All three inputs are filtered to the target week_id before any aggregation, so
+    the cost per run does not grow with the length of the history. Each input may be
+    a DataFrame or a DatasetHandle; a Parquet-backed handle reads only that week.
+    """
+    weekly_notes = as_handle(weekly_notes_df, "weekly_notes")
+    week_id = resolve_target_week(weekly_notes, target_week)
 
-        # Calendar summary
-        calendar_summary = summarize_calendar(calendar_df, start_date, end_date)
+    notes = weekly_notes.week(week_id)
+    if notes.empty:
+        raise ValueError(f"No weekly notes for week {week_id}.")
+    screen_time = as_handle(screen_time_df, "screen_time").week(week_id)
+    calendar = as_handle(calendar_df, "calendar").week(week_id)
 
-        weekly_contexts.append({
-            "week": week_str,
-            "work_highlights": row["work_highlights"],
-            "life_highlights": row["life_highlights"],
-            "weekly_notes_raw": row["raw_notes"],
-            "screen_time": screen_data,
-            "calendar_summary": calendar_summary
-        })
+    perception_df = perception_node(notes.tail(1), screen_time, calendar)
+    return perception_df.to_dict(orient="records")[0]
 
-    result_df = pd.DataFrame(weekly_contexts)
-    return result_df
 
 def perception_node_from_state(state: GraphState) -> GraphState:
 
-    if state.weekly_notes_df is None:
-        raise ValueError("weekly_notes_df is missing from GraphState.")
-    if state.screen_time_df is None:
-        raise ValueError("screen_time_df is missing from GraphState.")
-    if state.calendar_df is None:
-        raise ValueError("calendar_df is missing from GraphState.")
-
-    weekly_notes_df = state.weekly_notes_df
-    screen_time_df = state.screen_time_df
-    calendar_df = state.calendar_df
+    if state.weekly_notes is None:
+        raise ValueError("weekly_notes is missing from GraphState.")
+    if state.screen_time is None:
+        raise ValueError("screen_time is missing from GraphState.")
+    if state.calendar is None:
+        raise ValueError("calendar is missing from GraphState.")
 
-    # perception = perception_node(weekly_notes_df, screen_time_df, calendar_df)
-    # After calling the real perception_node
-    perception_df = perception_node(weekly_notes_df, screen_time_df, calendar_df)
+    # Only the target week is loaded and aggregated; the rest of the history is never touched
+    state.perception = perception_for_week(
+        state.weekly_notes, state.screen_time, state.calendar, target_week=state.target_week
+    )
 
-    # Convert to dict if it's a DataFrame (e.g., via .to_dict())
-    if isinstance(perception_df, pd.DataFrame):
-        perception_dict = perception_df.to_dict(orient="records")[0]  # single row
-    else:
-        perception_dict = perception_df  # already a dict
+    return state
 
-    # Assign to state
-    state.perception = perception_dict
 
-    return state
+async def perception_node_from_state_async(state: GraphState) -> GraphState:
+    # Perception is CPU-bound pandas work; keep it off the event loop
+    return await asyncio.to_thread(perception_node_from_state, state)
@@ -1,52 +1,165 @@
+import re
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 from datetime import datetime
+from functools import partial
+from week_key import week_ids_from_dates
+from schema import arrow_schema, compact_frame
 
-def parse_and_clean_cal_data(data_cal: str) -> pd.DataFrame:
-    df_cal = pd.read_csv(data_cal)
-    return compress_calendar_df(df_cal)
+# Outlook CSV export: 'Start Date' = '6/23/2025', 'Start Time' = '9:00:00 AM'
+OUTLOOK_DATETIME_FORMAT = "%m/%d/%Y %I:%M:%S %p"
 
-def compress_calendar_df(df: pd.DataFrame) -> pd.DataFrame:
+OUTLOOK_COLUMNS = [
+    'Start Date', 'Start Time', 'End Date', 'End Time',
+    'Subject', 'Description', 'Private',
+]
+# Read as text whatever a chunk holds ('True'/'False', or all empty), so every chunk agrees
+OUTLOOK_DTYPES = {'Private': str}
+
+# Columns of the compact calendar frame, in order, with their Arrow types
+# (None: the compact dtype from schema.SCHEMAS['calendar'])
+CALENDAR_ARROW_COLUMNS = {
+    'start': pa.timestamp('us'),
+    'duration_min': None,
+    'time_of_day': None,
+    'subject': pa.string(),
+    'type': None,
+    'private': None,
+    'description': pa.string(),
+    'week_id': None,
+}
+
+# Meeting type keyword table: first matching row wins, anything else is a 'Meeting'.
+# Empty keywords are ignored (they would match every subject).
+MEETING_TYPE_KEYWORDS = [
+    ('OOO', ['ooo', 'out of office']),
+    ('1:1', ['1:1', 'one-on-one']),
+    ('Standup', ['standup']),
+    ('Review', ['review']),
+    ('Feedback', ['feedback']),
+]
+DEFAULT_MEETING_TYPE = 'Meeting'
+
+# (label, first hour, last hour exclusive); hours outside every range are 'Night'
+TIME_OF_DAY_RANGES = [
+    ('Morning', 5, 12),
+    ('Afternoon', 12, 17),
+    ('Evening', 17, 22),
+]
+
+
+def parse_and_clean_cal_data(
+    data_cal: str,
+    chunksize: int = None,
+    datetime_format: str = OUTLOOK_DATETIME_FORMAT,
+    keyword_table=None,
+) -> pd.DataFrame:
+    """
+    Read an Outlook calendar CSV export and return the compact calendar frame.
+
+    With chunksize set, the CSV is read and compressed chunk by chunk, so only the
+    compact columns of the whole file are ever held in memory at once. keyword_table
+    overrides MEETING_TYPE_KEYWORDS.
+    """
+    compress = partial(compress_calendar_df, datetime_format=datetime_format, keyword_table=keyword_table)
+    if chunksize is None:
+        return compress(pd.read_csv(data_cal, usecols=_outlook_usecols, dtype=OUTLOOK_DTYPES))
+
+    chunks = [
+        compress(chunk)
+        for chunk in pd.read_csv(data_cal, usecols=_outlook_usecols, dtype=OUTLOOK_DTYPES, chunksize=chunksize)
+    ]
+    df_cal = pd.concat(chunks, ignore_index=True).sort_values(by='start').reset_index(drop=True)
+    return compact_frame(df_cal, 'calendar')  # concat of differing categoricals falls back to object
+
+
+def stream_and_clean_cal_data(
+    data_cal: str,
+    output_path: str,
+    chunksize: int = 50_000,
+    datetime_format: str = OUTLOOK_DATETIME_FORMAT,
+    keyword_table=None,
+) -> int:
+    """
+    Stream a large calendar CSV into a compact Parquet file in bounded memory.
+
+    Each chunk is compressed and appended as its own row group, so memory stays
+    at one chunk regardless of file size. Rows are sorted within each chunk only.
+    The file schema is fixed up front (CALENDAR_ARROW_COLUMNS), so a chunk whose
+    columns happen to be empty or differently typed cannot change it.
+
+    Returns:
+        int: Number of rows written.
+    """
+    schema = arrow_schema('calendar', CALENDAR_ARROW_COLUMNS)
+    rows = 0
+    with pq.ParquetWriter(output_path, schema) as writer:
+        for chunk in pd.read_csv(data_cal, usecols=_outlook_usecols, dtype=OUTLOOK_DTYPES, chunksize=chunksize):
+            compact = compress_calendar_df(chunk, datetime_format=datetime_format, keyword_table=keyword_table)
+            table = pa.Table.from_pandas(compact, preserve_index=False)
+            writer.write_table(table.cast(schema))
+            rows += len(compact)
+
+    print(f"✅ Wrote {rows} calendar events to {output_path}")
+    return rows
+
+
+def _outlook_usecols(column: str) -> bool:
+    return column in OUTLOOK_COLUMNS
+
+
+def _parse_datetimes(dates: pd.Series, times: pd.Series, datetime_format: str) -> pd.Series:
+    combined = dates + ' ' + times
+    parsed = pd.to_datetime(combined, format=datetime_format, errors='coerce')
+
+    # Fall back to inference only for rows that do not match the explicit format
+    unmatched = parsed.isna() & combined.notna()
+    if unmatched.any():
+        parsed[unmatched] = pd.to_datetime(combined[unmatched], format='mixed', errors='coerce')
+    return parsed
+
+
+def classify_time_of_day(hours: pd.Series) -> np.ndarray:
+    """Vectorized hour → 'Morning' / 'Afternoon' / 'Evening' / 'Night'."""
+    conditions = [(hours >= first) & (hours < last) for _, first, last in TIME_OF_DAY_RANGES]
+    labels = [label for label, _, _ in TIME_OF_DAY_RANGES]
+    return np.select(conditions, labels, default='Night')
+
+
+def classify_meeting_type(subjects: pd.Series, keyword_table=None) -> np.ndarray:
+    """Vectorized subject → meeting type using an ordered (label, keywords) table."""
+    keyword_table = MEETING_TYPE_KEYWORDS if keyword_table is None else keyword_table
+    lowered = subjects.str.lower()
+    conditions = []
+    for _, keywords in keyword_table:
+        patterns = [re.escape(k.lower()) for k in keywords if k]
+        if patterns:
+            conditions.append(lowered.str.contains('|'.join(patterns), regex=True).to_numpy(dtype=bool))
+        else:
+            conditions.append(np.zeros(len(subjects), dtype=bool))
+    labels = [label for label, _ in keyword_table]
+    return np.select(conditions, labels, default=DEFAULT_MEETING_TYPE)
+
+
+def compress_calendar_df(df: pd.DataFrame, datetime_format: str = OUTLOOK_DATETIME_FORMAT, keyword_table=None) -> pd.DataFrame:
     # Combine Start Date and Start Time into datetime
-    df['start_datetime'] = pd.to_datetime(df['Start Date'] + ' ' + df['Start Time'])
-    df['end_datetime'] = pd.to_datetime(df['End Date'] + ' ' + df['End Time'])
+    df['start_datetime'] = _parse_datetimes(df['Start Date'], df['Start Time'], datetime_format)
+    df['end_datetime'] = _parse_datetimes(df['End Date'], df['End Time'], datetime_format)
 
     # Calculate duration in minutes
     df['duration_min'] = (df['end_datetime'] - df['start_datetime']).dt.total_seconds() // 60
 
     # Time of day
-    def get_time_of_day(hour):
-        if 5 <= hour < 12:
-            return 'Morning'
-        elif 12 <= hour < 17:
-            return 'Afternoon'
-        elif 17 <= hour < 22:
-            return 'Evening'
-        else:
-            return 'Night'
-
-    df['time_of_day'] = df['start_datetime'].dt.hour.apply(get_time_of_day)
+    df['time_of_day'] = classify_time_of_day(df['start_datetime'].dt.hour)
 
     # Simplify subject and truncate description
     df['subject'] = df['Subject'].astype(str).str.slice(0, 50)
     df['description'] = df['Description'].fillna('').astype(str).str.replace('\r\n', ' ').str.slice(0, 100)
 
-    # Type (guess based on category or keywords)
-    def classify_type(row):
-        subject = row['subject'].lower()
-        if 'ooo' in subject or 'out of office' in subject:
-            return 'OOO'
-        elif '1:1' in subject or 'one-on-one' in subject:
-            return '1:1'
-        elif 'standup' in subject:
-            return 'Standup'
-        elif 'review' in subject:
-            return 'Review'
-        elif 'feedback' in subject:
-            return 'Feedback'
-        else:
-            return 'Meeting'
-
-    df['type'] = df.apply(classify_type, axis=1)
+    # Type (guess based on keywords in the subject)
+    df['type'] = classify_meeting_type(df['subject'], keyword_table)
 
     # Keep relevant columns
     compact_df = df[[
@@ -58,7 +171,10 @@ def compress_calendar_df(df: pd.DataFrame) -> pd.DataFrame:
         'Sensitivity': 'sensitivity'
     })
 
+    # Canonical integer week key, used by perception to join with notes and screen time
+    compact_df['week_id'] = week_ids_from_dates(compact_df['start'])
+
     # Optional: sort by date
     compact_df = compact_df.sort_values(by='start').reset_index(drop=True)
 
-    return compact_df
+    return compact_frame(compact_df, 'calendar')
@@ -1,20 +1,29 @@
 import os
-import base64
-import openai
-from tqdm import tqdm
+from openai_client import chat_completion
+from vision_cache import VisionCache
+from image_prep import image_content, profile_fingerprint
+from schema import compact_frame
+from week_key import week_id_from_date
+from ingestion import run_vision_ingestion, run_incremental_ingestion, RateLimiter, DEFAULT_MAX_WORKERS
 import re
 import json
 from datetime import datetime
+from functools import lru_cache
 from babel.dates import parse_date
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 
-def load_image_base64(image_path: str) -> str:
-    with open(image_path, "rb") as img_file:
-        return base64.b64encode(img_file.read()).decode("utf-8")
+MODEL = "gpt-4o"
+PREP_PROFILE = "handwriting"  # see image_prep.PREP_PROFILES; None uploads the original image
 
-def parse_journal_image(image_path: str, openai_api_key: str) -> str:
-    base64_image = load_image_base64(image_path)
-    openai.api_key = openai_api_key
+
+def parse_journal_image(
+    image_path: str,
+    openai_api_key: str,
+    cache: VisionCache = None,
+    rate_limiter: RateLimiter = None,
+) -> str:
 
     prompt = """
         You are transcribing a handwritten Greek personal journal.
@@ -27,43 +36,106 @@ def parse_journal_image(image_path: str, openai_api_key: str) -> str:
         Preserve line breaks if meaningful. Do not add any explanation.
     """
 
-    response = openai.chat.completions.create(
-        model="gpt-4o",
+    cache_key = VisionCache.key(image_path, prompt, MODEL, profile_fingerprint(PREP_PROFILE)) if cache else None
+    if cache:
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+    image_part = image_content(image_path, PREP_PROFILE)
+
+    if rate_limiter:
+        rate_limiter.acquire()
+
+    response = chat_completion(
+        openai_api_key,
+        model=MODEL,
         messages=[
             {"role": "user", "content": [
                 {"type": "text", "text": prompt},
-                {"type": "image_url", "image_url": {
-                    "url": f"data:image/png;base64,{base64_image}"
-                }}
+                image_part
             ]}
         ],
         max_tokens=1500,
         temperature=0.3,
     )
 
-    return response.choices[0].message.content.strip()
+    transcript = response.choices[0].message.content.strip()
+    if cache:
+        cache.put(cache_key, transcript)
+    return transcript
 
 
-def parse_all_journal_images(folder_path: str, openai_api_key: str) -> str:
+def parse_all_journal_images(
+    folder_path: str,
+    openai_api_key: str,
+    max_workers: int = DEFAULT_MAX_WORKERS,
+    rate_limiter: RateLimiter = None,
+    cache: VisionCache = None,
+) -> str:
     all_texts = []
 
-    for filename in tqdm(sorted(os.listdir(folder_path))):
-        if filename.lower().endswith(".png"):
-            image_path = os.path.join(folder_path, filename)
-            try:
-                entry = parse_journal_image(image_path, openai_api_key)
-                all_texts.append(entry)
-            except Exception as e:
-                print(f"Error in {filename}: {e}")
+    results, _ = run_vision_ingestion(
+        folder_path,
+        lambda image_path, limiter: parse_journal_image(
+            image_path, openai_api_key, cache=cache, rate_limiter=limiter
+        ),
+        max_workers=max_workers,
+        rate_limiter=rate_limiter,
+        desc="journal",
+    )
+
+    for filename, entry, error in results:
+        if error is not None:
+            print(f"Error in {filename}: {error}")
+            continue
+        all_texts.append(entry)
+
+    if cache:
+        cache.report()
 
     return "\n\n".join(all_texts)
 
 
+def update_journal_store(
+    folder_path: str,
+    openai_api_key: str,
+    dataset_path: str,
+    manifest_path: str = None,
+    max_workers: int = DEFAULT_MAX_WORKERS,
+    rate_limiter: RateLimiter = None,
+    cache: VisionCache = None,
+) -> str:
+    """
+    Incremental variant of parse_all_journal_images.
+
+    Transcripts are kept per page in the Parquet dataset at dataset_path (columns
+    source_file, transcript; config's DATA_JOURNAL_TRANSCRIPTS_STORE), and only new,
+    changed or previously failed pages are transcribed.
+    Returns the full journal text in page order, as parse_all_journal_images does.
+    """
+    store = run_incremental_ingestion(
+        folder_path,
+        lambda image_path, limiter: parse_journal_image(
+            image_path, openai_api_key, cache=cache, rate_limiter=limiter
+        ),
+        lambda filename, transcript: pd.DataFrame([{"source_file": filename, "transcript": transcript}]),
+        dataset_path,
+        manifest_path=manifest_path,
+        max_workers=max_workers,
+        rate_limiter=rate_limiter,
+        desc="journal",
+    )
+
+    if cache:
+        cache.report()
+
+    if store.empty:
+        return ""
+    return "\n\n".join(store["transcript"].tolist())
+
+
 
-import re
-import json
-from datetime import datetime
-from babel.dates import parse_date
 # Greek month name map (normalized form → month number)
 GREEK_MONTHS = {
     'Ιανουαρίου': 1,
@@ -80,8 +152,14 @@ GREEK_MONTHS = {
     'Δεκεμβρίου': 12,
 }
 
+# Precompiled header and date patterns, shared by every header of a (large) journal
+HEADER_PATTERN = re.compile(r"^===\s*(.*?)\s*===\s*(.*)$")
+GREEK_DATE_PATTERN = re.compile(r'(\d{1,2})\s+([Α-Ωα-ωΐΰάέίόύήώ]+)')
+ENGLISH_DATE_PATTERN = re.compile(r'(\d{1,2})\s+([A-Za-z]+)')
+NUMERIC_DATE_PATTERN = re.compile(r'(\d{1,2})/(\d{1,2})/(\d{2,4})')
+
 def parse_date_greek(raw_date: str, default_year=2025):
-    match = re.match(r'(\d{1,2})\s+([Α-Ωα-ωΐΰάέίόύήώ]+)', raw_date)
+    match = GREEK_DATE_PATTERN.match(raw_date)
     if not match:
         raise ValueError(f"Unrecognized date format: '{raw_date}'")
 
@@ -98,7 +176,7 @@ def parse_date_flexible(raw_date: str, default_year=2025):
     raw_date = raw_date.strip()
 
     # Try Greek format first
-    match = re.match(r'(\d{1,2})\s+([Α-Ωα-ωΐΰάέίόύήώ]+)', raw_date)
+    match = GREEK_DATE_PATTERN.match(raw_date)
     if match:
         day = int(match.group(1))
         month_name = match.group(2).capitalize()
@@ -107,7 +185,7 @@ def parse_date_flexible(raw_date: str, default_year=2025):
             return datetime(default_year, month, day)
 
     # Try English format: '5 May'
-    match = re.match(r'(\d{1,2})\s+([A-Za-z]+)', raw_date)
+    match = ENGLISH_DATE_PATTERN.match(raw_date)
     if match:
         try:
             return datetime.strptime(f"{raw_date} {default_year}", "%d %B %Y")
@@ -115,7 +193,7 @@ def parse_date_flexible(raw_date: str, default_year=2025):
             pass
 
     # Try numeric format: 24/2/95 → assume it's DD/MM/YY
-    match = re.match(r'(\d{1,2})/(\d{1,2})/(\d{2,4})', raw_date)
+    match = NUMERIC_DATE_PATTERN.match(raw_date)
     if match:
         day, month, year = map(int, match.groups())
         year = 2000 + year if year < 100 else year
@@ -123,34 +201,119 @@ def parse_date_flexible(raw_date: str, default_year=2025):
 
     raise ValueError(f"Unrecognized date format: '{raw_date}'")
 
-def parse_journal_text(file_path: str, default_year=2025):
-    with open(file_path, "r", encoding="utf-8") as f:
-        text = f.read()
+@lru_cache(maxsize=4096)
+def _parse_header_date(raw_date: str, default_year=2025):
+    # Journals repeat the same few hundred headers; parse each one once
+    parsed_date = parse_date_flexible(raw_date, default_year)
+    return parsed_date.strftime("%Y-%m-%d"), week_id_from_date(parsed_date)
+
+def iter_journal_entries(lines, default_year=2025):
+    """
+    Yield journal entries ('=== date ===' header lines followed by content) one at a time.
+
+    Reads lines lazily, so memory holds a single entry however large the journal is.
+    Text before the first header is ignored; an unparseable header is reported and its
+    entry skipped.
 
-    # Match === 6 Ιανουαρίου === followed by content
-    pattern = r"===\s*(.*?)\s*===\s*([\s\S]*?)(?=\n===|$)"
-    matches = re.findall(pattern, text)
+    Args:
+        lines: An iterable of lines (an open file, or text.splitlines()).
+        default_year (int): Year for headers without one ('6 Ιανουαρίου').
 
-    results = []
+    Yields:
+        dict: {"date": 'YYYY-MM-DD', "week_id": int, "content": str}
+    """
+    raw_date, content = None, None
 
-    for raw_date, content in matches:
+    def _entry():
         try:
-            parsed_date = parse_date_flexible(raw_date, default_year)
-            iso_date = parsed_date.strftime("%Y-%m-%d")
-            results.append({
-                "date": iso_date,
-                "content": content.strip()
-            })
+            iso_date, week_id = _parse_header_date(raw_date, default_year)
         except Exception as e:
             print(f"❌ Error parsing '{raw_date}': {e}")
+            return None
+        return {"date": iso_date, "week_id": week_id, "content": "\n".join(content).strip()}
+
+    for line in lines:
+        line = line.rstrip("\r\n")
+        if line.startswith("==="):
+            if content is not None:
+                entry = _entry()
+                if entry is not None:
+                    yield entry
+            header = HEADER_PATTERN.match(line)
+            # A '===' line that is not a full header ends the entry without starting one
+            raw_date, content = (header.group(1), [header.group(2)]) if header else (None, None)
+        elif content is not None:
+            content.append(line)
+
+    if content is not None:
+        entry = _entry()
+        if entry is not None:
+            yield entry
 
-    return results
+def parse_journal_text(file_path: str, default_year=2025):
+    with open(file_path, "r", encoding="utf-8") as f:
+        return list(iter_journal_entries(f, default_year))
+
+def parse_journal_entries(text: str, default_year=2025):
+    """Parse journal text ('=== date ===' headers followed by content) into entry records."""
+    return list(iter_journal_entries(text.splitlines(), default_year))
 
 def save_to_json(data, output_path="journal_entries.json"):
     with open(output_path, "w", encoding="utf-8") as f:
         json.dump(data, f, ensure_ascii=False, indent=2)
     print(f"✅ Saved {len(data)} entries to {output_path}")
 
+def stream_journal_to_json(file_path: str, output_path="journal_entries.json", default_year=2025) -> int:
+    """
+    Parse a journal text file straight into a JSON array file, one entry at a time.
+
+    Same output as save_to_json(parse_journal_text(file_path)), in constant memory.
+
+    Returns:
+        int: Number of entries written.
+    """
+    count = 0
+    tmp_path = f"{output_path}.tmp"
+    with open(file_path, "r", encoding="utf-8") as src, open(tmp_path, "w", encoding="utf-8") as out:
+        out.write("[")
+        for entry in iter_journal_entries(src, default_year):
+            out.write(",\n" if count else "\n")
+            out.write(json.dumps(entry, ensure_ascii=False, indent=2))
+            count += 1
+        out.write("\n]" if count else "]")
+    os.replace(tmp_path, output_path)
+    print(f"✅ Saved {count} entries to {output_path}")
+    return count
+
+def stream_journal_to_parquet(file_path: str, output_path: str, batch_size: int = 10_000, default_year=2025) -> int:
+    """
+    Parse a journal text file into a Parquet file, batch_size entries per row group.
+
+    Like stream_journal_to_json, writes to a temporary file and moves it into place,
+    so output_path is never left half-written.
+
+    Returns:
+        int: Number of entries written.
+    """
+    schema = pa.schema([("date", pa.string()), ("week_id", pa.int32()), ("content", pa.string())])
+    count = 0
+    batch = []
+    tmp_path = f"{output_path}.tmp"
+    with open(file_path, "r", encoding="utf-8") as src, pq.ParquetWriter(tmp_path, schema) as writer:
+        for entry in iter_journal_entries(src, default_year):
+            batch.append(entry)
+            if len(batch) >= batch_size:
+                writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+                count += len(batch)
+                batch = []
+        if batch:
+            writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+            count += len(batch)
+    os.replace(tmp_path, output_path)
+
+    print(f"✅ Wrote {count} journal entries to {output_path}")
+    return count
+
 
 
 def read_json_to_dataframe(file_path):
@@ -168,7 +331,7 @@ def read_json_to_dataframe(file_path):
 
     # If the JSON is a list of records, convert directly to DataFrame
     if isinstance(data, list):
-        df = pd.DataFrame(data)
+        df = compact_frame(pd.DataFrame(data), "journal")
     # If the JSON is a dictionary, you might need to adjust this
     elif isinstance(data, dict):
         df = pd.json_normalize(data)
@@ -1,25 +1,24 @@
 
 
 import os
-import openai
-import base64
 import pandas as pd
 from io import StringIO
-from tqdm import tqdm
 from datetime import datetime, timedelta
 import re
+from functools import partial
+from openai_client import chat_completion
+from vision_cache import VisionCache
+from image_prep import image_content, estimate_prepared_tokens, profile_fingerprint
+from schema import compact_frame
+from week_key import DEFAULT_YEAR, WEEK_ID_DTYPE, date_from_filename, week_id_from_date, week_label
+from ingestion import run_vision_ingestion, run_incremental_ingestion, RateLimiter, DEFAULT_MAX_WORKERS
+from vision_batch import parse_image_batch, run_batched_vision_ingestion
 
-def load_image_base64(image_path):
-    with open(image_path, "rb") as image_file:
-        return base64.b64encode(image_file.read()).decode("utf-8")
+MODEL = "gpt-4o"
+PREP_PROFILE = "screenshot"  # see image_prep.PREP_PROFILES; None uploads the original image
 
 
-def parse_screentime_image(image_path: str, openai_api_key: str) -> str:
-    base64_image = load_image_base64(image_path)
-
-    openai.api_key = openai_api_key
-
-    prompt = """
+SCREENTIME_PROMPT = """
             You are a data extractor for a digital wellness agent.
             The user has uploaded a screenshot of their iPhone Screen Time weekly report.
 
@@ -35,46 +34,134 @@ def parse_screentime_image(image_path: str, openai_api_key: str) -> str:
             - Output the CSV data as plain text only — no Markdown, no backticks, no formatting, no explanations.
             """
 
-    response = openai.chat.completions.create(
-        model="gpt-4o",
+# Batched mode: several screenshots per request, answered as one JSON object
+SCREENTIME_BATCH_PROMPT = """
+            You are a data extractor for a digital wellness agent.
+            The user has uploaded several screenshots of their iPhone Screen Time weekly reports,
+            each preceded by its filename ("Image: week_06_23.png").
+
+            For each screenshot, extract CSV data with the header line:
+            week, app_name, time
+
+            Rules:
+            - Use the week shown at the top of the image (e.g. 'Jun 23–30') as the 'week' for all of its rows.
+            - For each app listed under 'Show Apps', extract its name and time.
+            - Ignore usage categories like 'Productivity & Finance' or 'Social'.
+
+            Return only a JSON object, without markdown or commentary, mapping every filename to the
+            CSV text of its screenshot (header line included, rows separated by newlines), e.g.
+            {"week_06_23.png": "week,app_name,time\nJun 23–29,Safari,2h 5m\n..."}
+            """
+BATCH_OUTPUT_TOKENS_PER_IMAGE = 600
+
+
+def parse_screentime_image(
+    image_path: str,
+    openai_api_key: str,
+    cache: VisionCache = None,
+    rate_limiter: RateLimiter = None,
+) -> str:
+
+    prompt = SCREENTIME_PROMPT
+
+    cache_key = VisionCache.key(image_path, prompt, MODEL, profile_fingerprint(PREP_PROFILE)) if cache else None
+    if cache:
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+    image_part = image_content(image_path, PREP_PROFILE)
+
+    if rate_limiter:
+        rate_limiter.acquire()
+
+    response = chat_completion(
+        openai_api_key,
+        model=MODEL,
         messages=[
             {"role": "user", "content": [
                 {"type": "text", "text": prompt},
-                {"type": "image_url", "image_url": {
-                    "url": f"data:image/png;base64,{base64_image}"
-                }}
+                image_part
             ]}
         ],
         max_tokens=1500,
     )
 
-    return response.choices[0].message.content.strip()
+    csv_output = response.choices[0].message.content.strip()
+    if cache:
+        cache.put(cache_key, csv_output)
+    return csv_output
 
 
-def clean_csv_output(raw_output: str) -> str:
-    lines = raw_output.strip().splitlines()
-    return "\n".join(line for line in lines if not line.strip().startswith("```"))
+def parse_screentime_batch(
+    image_paths: list,
+    openai_api_key: str,
+    cache: VisionCache = None,
+    rate_limiter: RateLimiter = None,
+) -> dict:
+    """
+    Batched parse_screentime_image: one request for several screenshots.
+
+    Returns:
+        dict: image_path → (csv_output, error); screenshots the batched answer misses
+        are parsed one by one.
+    """
+    return parse_image_batch(
+        image_paths,
+        openai_api_key,
+        SCREENTIME_BATCH_PROMPT,
+        single_fn=lambda image_path: parse_screentime_image(
+            image_path, openai_api_key, cache=cache, rate_limiter=rate_limiter
+        ),
+        finish=_batched_csv,
+        cache=cache,
+        cache_key_fn=lambda image_path: VisionCache.key(image_path, SCREENTIME_PROMPT, MODEL, profile_fingerprint(PREP_PROFILE)),
+        rate_limiter=rate_limiter,
+        model=MODEL,
+        profile=PREP_PROFILE,
+        output_tokens_per_image=BATCH_OUTPUT_TOKENS_PER_IMAGE,
+    )
+
+
+def _batched_csv(image_path: str, csv_output) -> str:
+    # Reject anything the per-file pipeline could not turn into rows
+    if not isinstance(csv_output, str):
+        raise ValueError("expected CSV text")
+    csv_output = csv_output.strip()
+    screentime_csv_to_df(csv_output, os.path.basename(image_path))
+    return csv_output
+
 
+def _screentime_ingestion(openai_api_key: str, cache: VisionCache = None, batch_size: int = None) -> tuple:
+    """(runner, parse_fn) for run_vision_ingestion, or the batched engine when batch_size is set."""
+    if not batch_size:
+        return run_vision_ingestion, lambda image_path, limiter: parse_screentime_image(
+            image_path, openai_api_key, cache=cache, rate_limiter=limiter
+        )
 
-def update_week_column_from_source_file(df: pd.DataFrame) -> pd.DataFrame:
-    def extract_week_from_filename(filename):
-        # Extract the date part from the filename using regex
-        match = re.search(r'week_(\d{2})_(\d{2})', filename)
-        if not match:
-            return None
-        month_num, day = match.groups()
-        month_num = int(month_num)
-        day = int(day)
+    runner = partial(
+        run_batched_vision_ingestion,
+        tokens_fn=lambda image_path: estimate_prepared_tokens(image_path, PREP_PROFILE) + BATCH_OUTPUT_TOKENS_PER_IMAGE,
+        max_images=batch_size,
+    )
+    return runner, lambda image_paths, limiter: parse_screentime_batch(
+        image_paths, openai_api_key, cache=cache, rate_limiter=limiter
+    )
 
-        # Use a default year (this could be improved if year is relevant)
-        year = 2025
-        start_date = datetime(year, month_num, day)
-        end_date = start_date + timedelta(days=6)
 
-        # Format like 'Jun 23–30'
-        return f"{start_date.strftime('%b')} {start_date.day}–{end_date.day}"
+def clean_csv_output(raw_output: str) -> str:
+    lines = raw_output.strip().splitlines()
+    return "\n".join(line for line in lines if not line.strip().startswith("```"))
+
 
-    df['week'] = df['source_file'].apply(extract_week_from_filename)
+def update_week_column_from_source_file(df: pd.DataFrame, default_year: int = DEFAULT_YEAR) -> pd.DataFrame:
+    # The week comes from the filename (week_06_23.png or week_2024_06_23.png),
+    # not from GPT's reading of the screenshot header
+    starts = df['source_file'].map(lambda filename: date_from_filename(filename, default_year))
+    df['week'] = starts.map(lambda start: week_label(start) if start else None)
+    df['week_id'] = pd.array(
+        [week_id_from_date(start) if start else None for start in starts], dtype=WEEK_ID_DTYPE
+    )
     return df
 
 
@@ -84,30 +171,124 @@ def update_week_column_from_source_file(df: pd.DataFrame) -> pd.DataFrame:
 # csv_output = parse_screentime_image(image_path, OPENAI_API_KEY)
 # print(csv_output)
 
-def parse_all_screentime_images(folder_path: str, openai_api_key: str) -> pd.DataFrame:
+# iOS Screen Time durations: '1h 30m', '45m', '2h', '30s', '< 1m', '1 hr 5 min', '1:30'
+DURATION_PATTERN = (
+    r"^(?:(?P<h>\d+)\s*h(?:rs?|ours?)?)?\s*"
+    r"(?:(?P<m>\d+)\s*m(?:ins?|inutes?)?)?\s*"
+    r"(?:(?P<s>\d+)\s*s(?:ecs?|econds?)?)?$"
+)
+CLOCK_PATTERN = r"^(?P<h>\d+):(?P<m>\d{2})(?::(?P<s>\d{2}))?$"
+
+
+def parse_duration_minutes(times: pd.Series) -> pd.Series:
+    """Vectorized duration text → whole minutes (nullable Int32); NA where the text does not parse."""
+    cleaned = times.astype("string").str.lower().str.replace("<", "", regex=False).str.strip()
+
+    parts = cleaned.str.extract(DURATION_PATTERN)
+    clock = cleaned.str.extract(CLOCK_PATTERN)
+    parts = parts.fillna(clock)  # the two patterns never both match
+    parts = parts.apply(pd.to_numeric)
+
+    parsed = parts.notna().any(axis=1)
+    parts = parts.fillna(0)
+    minutes = parts["h"] * 60 + parts["m"] + (parts["s"] >= 30)
+    return minutes.where(parsed).astype("Int32")
+
+
+def screentime_csv_to_df(csv_output: str, filename: str) -> pd.DataFrame:
+    df = pd.read_csv(StringIO(csv_output))
+
+    # Drop duplicate header rows if GPT outputs a header as a row
+    if df.columns.tolist() == df.iloc[0].tolist():
+        df = df[1:]
+
+    df.columns = ["week", "app_name", "time"]  # force correct columns
+    df["minutes"] = parse_duration_minutes(df["time"])
+    df["source_file"] = filename
+    return df
+
+
+def parse_all_screentime_images(
+    folder_path: str,
+    openai_api_key: str,
+    max_workers: int = DEFAULT_MAX_WORKERS,
+    rate_limiter: RateLimiter = None,
+    cache: VisionCache = None,
+    batch_size: int = None,
+) -> pd.DataFrame:
+    """
+    Parse every Screen Time screenshot in folder_path into one frame.
+
+    With batch_size set, up to batch_size screenshots share a request (fewer when
+    their estimated tokens would exceed the per-request budget).
+    """
     all_rows = []
 
-    for filename in tqdm(sorted(os.listdir(folder_path))):
-        if filename.lower().endswith(".png"):
-            image_path = os.path.join(folder_path, filename)
-            try:
-                csv_output = parse_screentime_image(image_path, openai_api_key)
-                df = pd.read_csv(StringIO(csv_output))
+    runner, parse_fn = _screentime_ingestion(openai_api_key, cache, batch_size)
+    results, _ = runner(
+        folder_path,
+        parse_fn,
+        max_workers=max_workers,
+        rate_limiter=rate_limiter,
+        desc="screen time",
+    )
 
-                # Drop duplicate header rows if GPT outputs a header as a row
-                if df.columns.tolist() == df.iloc[0].tolist():
-                    df = df[1:]
+    for filename, csv_output, error in results:
+        if error is not None:
+            print(f"Error processing {filename}: {error}")
+            continue
+        try:
+            all_rows.append(screentime_csv_to_df(csv_output, filename))
+        except Exception as e:
+            print(f"Error processing {filename}: {e}")
 
-                df.columns = ["week", "app_name", "time"]  # force correct columns
-                df["source_file"] = filename
-                all_rows.append(df)
-            except Exception as e:
-                print(f"Error processing {filename}: {e}")
+    if cache:
+        cache.report()
 
     if all_rows:
         df_raw = pd.concat(all_rows, ignore_index=True)
         # fix also the date
-        return update_week_column_from_source_file(df_raw)
+        return compact_frame(update_week_column_from_source_file(df_raw), "screen_time")
 
     else:
-        return pd.DataFrame(columns=["week", "app_name", "time", "source_file"])
+        return pd.DataFrame(columns=["week", "app_name", "time", "minutes", "source_file", "week_id"])
+
+
+def update_screentime_store(
+    folder_path: str,
+    openai_api_key: str,
+    dataset_path: str,
+    manifest_path: str = None,
+    max_workers: int = DEFAULT_MAX_WORKERS,
+    rate_limiter: RateLimiter = None,
+    cache: VisionCache = None,
+    batch_size: int = None,
+) -> pd.DataFrame:
+    """
+    Incremental variant of parse_all_screentime_images.
+
+    Only new, changed or previously failed screenshots are sent to the model; their rows
+    are added to the Parquet dataset at dataset_path (config's DATA_*_STORE, read by
+    load_user_state), checkpointed after every file.
+    """
+    runner, parse_fn = _screentime_ingestion(openai_api_key, cache, batch_size)
+    store = run_incremental_ingestion(
+        folder_path,
+        parse_fn,
+        lambda filename, csv_output: update_week_column_from_source_file(
+            screentime_csv_to_df(csv_output, filename)
+        ),
+        dataset_path,
+        manifest_path=manifest_path,
+        max_workers=max_workers,
+        rate_limiter=rate_limiter,
+        desc="screen time",
+        runner=runner,
+    )
+
+    if cache:
+        cache.report()
+
+    if store.empty:
+        return pd.DataFrame(columns=["week", "app_name", "time", "minutes", "source_file", "week_id"])
+    return compact_frame(store, "screen_time")
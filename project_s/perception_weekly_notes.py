@@ -1,43 +1,30 @@
 import os
-import openai
-import base64
 import pandas as pd
 import json
 from datetime import datetime, timedelta
 import re
 import textwrap
-from tqdm import tqdm
+from functools import partial
+from openai_client import chat_completion
+from vision_cache import VisionCache
+from image_prep import image_content, estimate_prepared_tokens, profile_fingerprint
+from schema import compact_frame
+from week_key import DEFAULT_YEAR, WEEK_ID_DTYPE, date_from_filename, week_id_from_filename, week_label
+from ingestion import run_vision_ingestion, run_incremental_ingestion, RateLimiter, DEFAULT_MAX_WORKERS
+from vision_batch import parse_image_batch, run_batched_vision_ingestion
 
+MODEL = "gpt-4o"
+PREP_PROFILE = "handwriting"  # see image_prep.PREP_PROFILES; None uploads the original image
 
-def load_image_base64(image_path: str) -> str:
-    with open(image_path, "rb") as img_file:
-        return base64.b64encode(img_file.read()).decode("utf-8")
-
-def extract_week_range_from_filename(filename: str, default_year=2025) -> str:
-    match = re.search(r'week_(\d{2})_(\d{2})', filename)
-    if not match:
-        return "Unknown"
-    month, day = map(int, match.groups())
-    start_date = datetime(default_year, month, day)
-    end_date = start_date + timedelta(days=6)
-    return f"{start_date.strftime('%b')} {start_date.day}–{end_date.day}"
-
-def parse_weekly_reflection_image(image_path: str, openai_api_key: str) -> pd.DataFrame:
-    base64_image = load_image_base64(image_path)
-    filename = os.path.basename(image_path)
-    week_range = extract_week_range_from_filename(filename)
-
-    client = openai.OpenAI(api_key=openai_api_key)
-
-    prompt = f"""
+WEEKLY_REFLECTION_PROMPT = """
     You are reading a handwritten weekly reflection journal (in Greek and English).
     Extract structured content in the following JSON format:
 
-    {{
+    {
         "work_highlights": "...",
         "life_highlights": "...",
         "raw_notes": "..."
-    }}
+    }
 
     - "work_highlights": summary of achievements or reflections about work.
     - "life_highlights": reflections about personal or emotional life.
@@ -49,17 +36,143 @@ def parse_weekly_reflection_image(image_path: str, openai_api_key: str) -> pd.Da
     Return **only** valid JSON without markdown or commentary.
     """
 
+# Batched mode: several notes per request, answered as one JSON object
+WEEKLY_REFLECTION_BATCH_PROMPT = """
+    You are reading handwritten weekly reflection journals (in Greek and English).
+    Several notes follow, each preceded by its filename ("Image: week_06_23.png").
+
+    For each note, extract:
+    - "work_highlights": summary of achievements or reflections about work.
+    - "life_highlights": reflections about personal or emotional life.
+    - "raw_notes": full cleaned transcript of the handwritten note.
+    - The journal may contain Greek and English mixed — often in the same sentence.
+  Greek is used for emotional or personal reflection, while English is often used for technical or work-related terms (e.g., "demo", "stream", "company triathlon").
+  Do not translate — keep the original expression.
+
+    Return **only** a valid JSON object, without markdown or commentary, mapping every filename
+    to the extracted fields of that note, e.g.
+    {"week_06_23.png": {"work_highlights": "...", "life_highlights": "...", "raw_notes": "..."}}
+    """
+BATCH_OUTPUT_TOKENS_PER_IMAGE = 1200
+
+
+def extract_week_range_from_filename(filename: str, default_year=DEFAULT_YEAR) -> str:
+    start_date = date_from_filename(filename, default_year)
+    if start_date is None:
+        return "Unknown"
+    return week_label(start_date)
+
+def parse_weekly_reflection_image(
+    image_path: str,
+    openai_api_key: str,
+    cache: VisionCache = None,
+    rate_limiter: RateLimiter = None,
+) -> pd.DataFrame:
+    filename = os.path.basename(image_path)
+
+    prompt = WEEKLY_REFLECTION_PROMPT
+
+    cache_key = VisionCache.key(image_path, prompt, MODEL, profile_fingerprint(PREP_PROFILE)) if cache else None
+    structured = cache.get(cache_key) if cache else None
+
+    if structured is None:
+        structured, parsed = _extract_weekly_reflection(image_path, prompt, openai_api_key, filename, rate_limiter)
+        # Only cache clean JSON, so a bad answer is retried on the next run
+        if cache and parsed:
+            cache.put(cache_key, structured)
+
+    return _reflection_frame(filename, structured)
+
+
+def _reflection_frame(filename: str, structured: dict) -> pd.DataFrame:
+    return pd.DataFrame([{
+        "week": extract_week_range_from_filename(filename),
+        "week_id": week_id_from_filename(filename),
+        "work_highlights": structured.get("work_highlights"),
+        "life_highlights": structured.get("life_highlights"),
+        "raw_notes": structured.get("raw_notes"),
+        "source_file": filename
+    }]).astype({"week_id": WEEK_ID_DTYPE})
+
+
+def parse_weekly_reflection_batch(
+    image_paths: list,
+    openai_api_key: str,
+    cache: VisionCache = None,
+    rate_limiter: RateLimiter = None,
+) -> dict:
+    """
+    Batched parse_weekly_reflection_image: one request for several notes.
+
+    Returns:
+        dict: image_path → (DataFrame, error); notes the batched answer misses are
+        parsed one by one.
+    """
+    return parse_image_batch(
+        image_paths,
+        openai_api_key,
+        WEEKLY_REFLECTION_BATCH_PROMPT,
+        single_fn=lambda image_path: parse_weekly_reflection_image(
+            image_path, openai_api_key, cache=cache, rate_limiter=rate_limiter
+        ),
+        finish=_batched_reflection,
+        cache=cache,
+        cache_key_fn=lambda image_path: VisionCache.key(image_path, WEEKLY_REFLECTION_PROMPT, MODEL, profile_fingerprint(PREP_PROFILE)),
+        rate_limiter=rate_limiter,
+        model=MODEL,
+        profile=PREP_PROFILE,
+        output_tokens_per_image=BATCH_OUTPUT_TOKENS_PER_IMAGE,
+        temperature=0.3,
+    )
+
+
+def _batched_reflection(image_path: str, structured) -> pd.DataFrame:
+    if not isinstance(structured, dict) or not any(
+        structured.get(k) is not None for k in ("work_highlights", "life_highlights")
+    ):
+        raise ValueError("expected work_highlights / life_highlights / raw_notes")
+    return _reflection_frame(os.path.basename(image_path), structured)
+
+
+def _weekly_notes_ingestion(openai_api_key: str, cache: VisionCache = None, batch_size: int = None) -> tuple:
+    """(runner, parse_fn) for run_vision_ingestion, or the batched engine when batch_size is set."""
+    if not batch_size:
+        return run_vision_ingestion, lambda image_path, limiter: parse_weekly_reflection_image(
+            image_path, openai_api_key, cache=cache, rate_limiter=limiter
+        )
+
+    runner = partial(
+        run_batched_vision_ingestion,
+        tokens_fn=lambda image_path: estimate_prepared_tokens(image_path, PREP_PROFILE) + BATCH_OUTPUT_TOKENS_PER_IMAGE,
+        max_images=batch_size,
+    )
+    return runner, lambda image_paths, limiter: parse_weekly_reflection_batch(
+        image_paths, openai_api_key, cache=cache, rate_limiter=limiter
+    )
+
+
+def _extract_weekly_reflection(
+    image_path: str,
+    prompt: str,
+    openai_api_key: str,
+    filename: str,
+    rate_limiter: RateLimiter = None,
+) -> tuple:
+    image_part = image_content(image_path, PREP_PROFILE)
+
+    if rate_limiter:
+        rate_limiter.acquire()
+
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o",
+        response = chat_completion(
+            openai_api_key,
+            model=MODEL,
             messages=[
                 {
                     "role": "user",
                     "content": [
                         {"type": "text", "text": prompt},
-                        {"type": "image_url", "image_url": {
-                            "url": f"data:image/png;base64,{base64_image}"
-                        }},
+                        image_part,
                     ]
                 }
             ],
@@ -76,7 +189,7 @@ def parse_weekly_reflection_image(image_path: str, openai_api_key: str) -> pd.Da
             raw_output = re.sub(r"```(?:json)?", "", raw_output)
             raw_output = raw_output.strip("` \n")
         structured = json.loads(raw_output)
-
+        parsed = True
 
     except Exception as e:
         print(f"❌ Error parsing {filename}: {e}")
@@ -85,29 +198,91 @@ def parse_weekly_reflection_image(image_path: str, openai_api_key: str) -> pd.Da
             "life_highlights": None,
             "raw_notes": raw_output if 'raw_output' in locals() else None
         }
+        parsed = False
 
-    return pd.DataFrame([{
-        "week": week_range,
-        "work_highlights": structured.get("work_highlights"),
-        "life_highlights": structured.get("life_highlights"),
-        "raw_notes": structured.get("raw_notes"),
-        "source_file": filename
-    }])
+    return structured, parsed
 
 
-def parse_all_weekly_reflections(folder_path: str, openai_api_key: str) -> pd.DataFrame:
+def parse_all_weekly_reflections(
+    folder_path: str,
+    openai_api_key: str,
+    max_workers: int = DEFAULT_MAX_WORKERS,
+    rate_limiter: RateLimiter = None,
+    cache: VisionCache = None,
+    batch_size: int = None,
+) -> pd.DataFrame:
+    """
+    Parse every weekly reflection note in folder_path into one frame.
+
+    With batch_size set, up to batch_size notes share a request (fewer when their
+    estimated tokens would exceed the per-request budget).
+    """
     all_dfs = []
 
-    for filename in tqdm(sorted(os.listdir(folder_path))):
-        if filename.lower().endswith(".png"):
-            image_path = os.path.join(folder_path, filename)
-            try:
-                df = parse_weekly_reflection_image(image_path, openai_api_key)
-                all_dfs.append(df)
-            except Exception as e:
-                print(f"❌ Failed to process {filename}: {e}")
+    runner, parse_fn = _weekly_notes_ingestion(openai_api_key, cache, batch_size)
+    results, _ = runner(
+        folder_path,
+        parse_fn,
+        max_workers=max_workers,
+        rate_limiter=rate_limiter,
+        desc="weekly notes",
+    )
+
+    for filename, df, error in results:
+        if error is not None:
+            print(f"❌ Failed to process {filename}: {error}")
+            continue
+        all_dfs.append(df)
+
+    if cache:
+        cache.report()
 
     if all_dfs:
-        return pd.concat(all_dfs, ignore_index=True)
+        return compact_frame(pd.concat(all_dfs, ignore_index=True), "weekly_notes")
     else:
-        return pd.DataFrame(columns=["week", "work_highlights", "life_highlights", "raw_notes", "source_file"])
+        return pd.DataFrame(columns=["week", "week_id", "work_highlights", "life_highlights", "raw_notes", "source_file"])
+
+
+def _require_parsed_reflection(df: pd.DataFrame) -> pd.DataFrame:
+    # parse_weekly_reflection_image swallows JSON errors; surface them so the manifest retries the file
+    if df[["work_highlights", "life_highlights"]].isna().all(axis=None):
+        raise ValueError("model output could not be parsed as JSON")
+    return df
+
+
+def update_weekly_notes_store(
+    folder_path: str,
+    openai_api_key: str,
+    dataset_path: str,
+    manifest_path: str = None,
+    max_workers: int = DEFAULT_MAX_WORKERS,
+    rate_limiter: RateLimiter = None,
+    cache: VisionCache = None,
+    batch_size: int = None,
+) -> pd.DataFrame:
+    """
+    Incremental variant of parse_all_weekly_reflections.
+
+    Only new, changed or previously failed notes are sent to the model; their rows
+    are added to the Parquet dataset at dataset_path (config's DATA_*_STORE, read by
+    load_user_state), checkpointed after every file.
+    """
+    runner, parse_fn = _weekly_notes_ingestion(openai_api_key, cache, batch_size)
+    store = run_incremental_ingestion(
+        folder_path,
+        parse_fn,
+        lambda filename, df: _require_parsed_reflection(df),
+        dataset_path,
+        manifest_path=manifest_path,
+        max_workers=max_workers,
+        rate_limiter=rate_limiter,
+        desc="weekly notes",
+        runner=runner,
+    )
+
+    if cache:
+        cache.report()
+
+    if store.empty:
+        return pd.DataFrame(columns=["week", "week_id", "work_highlights", "life_highlights", "raw_notes", "source_file"])
+    return compact_frame(store, "weekly_notes")
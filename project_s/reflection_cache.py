@@ -0,0 +1,35 @@
+import json
+import hashlib
+from vision_cache import VisionCache
+
+
+DEFAULT_MAX_BYTES = 20 * 1024 * 1024  # 20 MB, reflections are a few KB each
+DEFAULT_TTL_S = 7 * 24 * 3600  # a week: the next week brings new inputs anyway
+
+
+class ReflectionCache(VisionCache):
+    """
+    On-disk cache for socratic reflections.
+
+    Entries are keyed by a fingerprint of the journal text, the weekly perception
+    text, the prompt version and the sampling parameters, so replaying an unchanged
+    week (a re-triggered cron run, a notebook re-run) returns the stored reflection
+    without calling the LLM. Same storage and LRU eviction as VisionCache, plus a TTL;
+    build keys with reflection_key (VisionCache.key hashes an image file instead).
+    """
+
+    label = "Reflection cache"
+
+    def __init__(self, cache_dir: str, max_bytes: int = DEFAULT_MAX_BYTES, ttl_s: float = DEFAULT_TTL_S):
+        super().__init__(cache_dir, max_bytes=max_bytes, ttl_s=ttl_s)
+
+    @staticmethod
+    def reflection_key(journal_text: str, weekly_perception_text: str, prompt_version: str, params: dict) -> str:
+        fingerprint = {
+            "journal_text": journal_text or "",
+            "weekly_perception_text": weekly_perception_text or "",
+            "prompt_version": prompt_version,
+            "params": params,
+        }
+        payload = json.dumps(fingerprint, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
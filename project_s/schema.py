@@ -0,0 +1,106 @@
+import pandas as pd
+import pyarrow as pa
+from week_key import WEEK_ID_DTYPE
+
+
+# Compact dtypes per perception frame. Repeated labels become categoricals,
+# counts and durations become the smallest nullable int that fits
+# (Int16 holds a full week of minutes, Int32 covers multi-day calendar events).
+# Columns not listed keep their dtype.
+SCHEMAS = {
+    "screen_time": {
+        "week": "category",
+        "app_name": "category",
+        "time": "category",
+        "minutes": "Int16",
+        "source_file": "category",
+        "week_id": WEEK_ID_DTYPE,
+    },
+    "calendar": {
+        "duration_min": "Int32",
+        "time_of_day": "category",
+        "type": "category",
+        "private": "category",
+        "week_id": WEEK_ID_DTYPE,
+    },
+    "weekly_notes": {
+        "week": "category",
+        "source_file": "category",
+        "week_id": WEEK_ID_DTYPE,
+    },
+    "journal": {
+        "week_id": WEEK_ID_DTYPE,
+    },
+    "perception": {
+        "week": "category",
+        "week_id": WEEK_ID_DTYPE,
+        "screen_time_minutes": "Int32",
+    },
+}
+
+# Arrow type of each compact dtype, for writers that fix their schema before the first row
+ARROW_TYPES = {
+    "category": pa.dictionary(pa.int32(), pa.string()),
+    "Int16": pa.int16(),
+    "Int32": pa.int32(),
+}
+
+
+def compact_frame(df: pd.DataFrame, kind: str) -> pd.DataFrame:
+    """Cast the columns of df listed in SCHEMAS[kind] to their compact dtype."""
+    casts = {}
+    for column, dtype in SCHEMAS[kind].items():
+        if column not in df.columns or str(df[column].dtype) == dtype:
+            continue
+        values = df[column]
+        if dtype.startswith("Int") and pd.api.types.is_float_dtype(values):
+            values = values.round()
+        casts[column] = values.astype(dtype)
+
+    if not casts:
+        return df
+    return df.assign(**casts)
+
+
+def arrow_schema(kind: str, columns: dict) -> pa.Schema:
+    """
+    Arrow schema of a compact frame, independent of the data.
+
+    Args:
+        kind (str): Frame kind in SCHEMAS; its columns take the Arrow type of their compact dtype.
+        columns (dict): column → Arrow type, in output order; None for columns listed in SCHEMAS[kind].
+    """
+    return pa.schema([
+        (column, ARROW_TYPES[SCHEMAS[kind][column]] if column in SCHEMAS[kind] else arrow_type)
+        for column, arrow_type in columns.items()
+    ])
+
+
+def frame_memory(df: pd.DataFrame) -> int:
+    """Resident bytes of df, including the Python strings behind object columns."""
+    return int(df.memory_usage(deep=True, index=True).sum())
+
+
+def memory_report(frames: dict) -> pd.DataFrame:
+    """
+    Compact each frame and report its memory before and after.
+
+    Args:
+        frames (dict): kind → DataFrame, with kinds from SCHEMAS.
+
+    Returns:
+        pd.DataFrame: One row per frame with rows, bytes_before, bytes_after and ratio.
+    """
+    rows = []
+    for kind, df in frames.items():
+        before = frame_memory(df)
+        after = frame_memory(compact_frame(df, kind))
+        rows.append({
+            "frame": kind,
+            "rows": len(df),
+            "bytes_before": before,
+            "bytes_after": after,
+            "ratio": round(after / before, 3) if before else 1.0,
+        })
+        print(f"📦 {kind}: {before / 1024:.0f} KB → {after / 1024:.0f} KB ({len(df)} rows)")
+    return pd.DataFrame(rows)
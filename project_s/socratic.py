@@ -1,10 +1,18 @@
 import openai
 import json
+import asyncio
 from typing import Dict
 import openai
 from graph_state import GraphState  # your state model
+from openai_client import chat_completion, chat_completion_async
+from reflection_cache import ReflectionCache
+from journal_index import select_journal_context
 
 
+# Bump whenever the deep socratic prompt text changes, so cached reflections
+# produced by the old prompt are not reused
+PROMPT_VERSION = "deep-socratic-v1"
+
 
 # prompt = f"""
 #         You are a Socratic reflection engine with poetic depth and intuitive insight.
@@ -40,14 +48,8 @@ from graph_state import GraphState  # your state model
 
 
 
-def deep_socratic_node(state: Dict, openai_key: str) -> Dict:
-    openai.api_key = openai_key
-
-    journal_text = state["journal_text"]
-    weekly_perception_text = state["weekly_perception_text"]
-
-
-
+def build_deep_socratic_request(journal_text: str, weekly_perception_text: str) -> Dict:
+    """Chat completion arguments for the deep socratic reflection, shared by the sync and async nodes."""
     prompt = f"""
 You are a Socratic reflection engine that speaks with depth, irony, and clarity.
 
@@ -88,8 +90,7 @@ WEEKLY SNAPSHOT:
 Now generate your grounded reflection and Socratic questions.
 """
 
-
-    response = openai.chat.completions.create(
+    return dict(
         model="gpt-4o",
         messages=[
             {"role": "system", "content": "You are a Socratic reflection engine."},
@@ -102,42 +103,152 @@ Now generate your grounded reflection and Socratic questions.
         max_tokens=800
     )
 
+
+def reflection_cache_key(request: Dict, journal_text: str, weekly_perception_text: str) -> str:
+    """Fingerprint of the reflection inputs, prompt version and sampling parameters."""
+    params = {k: v for k, v in request.items() if k != "messages"}
+    return ReflectionCache.reflection_key(journal_text, weekly_perception_text, PROMPT_VERSION, params)
+
+
+def deep_socratic_node(state: Dict, openai_key: str, cache: ReflectionCache = None, reuse: bool = True) -> Dict:
+    """
+    Generate the deep socratic reflection for a journal and weekly snapshot.
+
+    With a cache, an unchanged journal/snapshot returns the stored reflection without
+    calling the LLM; reuse=False forces a new reflection (which then replaces the cached one).
+    The result's "key" fingerprints the inputs (reflection_cache_key), cache or not.
+    """
+    request = build_deep_socratic_request(state["journal_text"], state["weekly_perception_text"])
+
+    key = reflection_cache_key(request, state["journal_text"], state["weekly_perception_text"])
+    if cache is not None:
+        cached = cache.get(key) if reuse else None
+        if cached is not None:
+            return {"observation": cached, "cached": True, "key": key}
+
+    response = chat_completion(openai_key, **request)
+
     content = response.choices[0].message.content.strip()
 
     # state["socratic_observation"] = content
     # return state
 
+    if cache is not None:
+        cache.put(key, content)
+
     return {
-        "observation": content
+        "observation": content,
+        "cached": False,
+        "key": key,
     }
 
 
+_reflection_caches = {}
+
+
+def reflection_cache_for(state: GraphState):
+    """The ReflectionCache configured on state (one per folder per process), or None."""
+    if not state.reflection_cache_dir:
+        return None
+    cache = _reflection_caches.get(state.reflection_cache_dir)
+    if cache is None:
+        cache = _reflection_caches.setdefault(state.reflection_cache_dir, ReflectionCache(state.reflection_cache_dir))
+    return cache
+
+
+def journal_context_for(state: GraphState) -> str:
+    """The journal entries to send for this week: top-k retrieved, or all if journal_top_k is None."""
+    if state.journal_top_k is None:
+        return state.journal_text
+    week_id = (state.perception or {}).get("week_id")
+    query = state.weekly_perception_text or json.dumps(state.perception or {}, ensure_ascii=False, default=str)
+    return select_journal_context(
+        state.journal_text,
+        query,
+        k=state.journal_top_k,
+        week_id=int(week_id) if week_id is not None else None,
+        user_id=state.user_id,
+    )
+
 
 def socratic_node_from_state(state: GraphState) -> GraphState:
     # Extract required inputs from state
-    journal_text = state.journal_text
-    weekly_notes_df = state.weekly_notes_df
-    screen_time_df = state.screen_time_df
-    calendar_df = state.calendar_df
     openai_key = state.openai_key
 
 
 
     # Call your original function
     raw_input = {
-        "journal_text": state.journal_text,
+        "journal_text": journal_context_for(state),
         "weekly_perception_text": state.weekly_perception_text,
         }
-    result = deep_socratic_node(raw_input, openai_key=openai_key)
+    result = deep_socratic_node(
+        raw_input,
+        openai_key=openai_key,
+        cache=reflection_cache_for(state),
+        reuse=state.reuse_reflection,
+    )
     #result = deep_socratic_node(state, openai_key=openai_key)
 
     # Store result in state
     state.socratic_observation = result.get("observation")
+    state.reflection_key = result.get("key")
     #state.reflective_question = result.get("question")
 
     return state
 
 
+async def deep_socratic_node_async(
+    state: Dict,
+    openai_key: str,
+    client: openai.AsyncOpenAI = None,
+    cache: ReflectionCache = None,
+    reuse: bool = True,
+) -> Dict:
+    """
+    Async deep_socratic_node: the key is passed to the client per call, no global state.
+
+    Uses the shared pooled async client for the key unless a client is given.
+    Cache lookups are small local file reads and stay on the event loop.
+    """
+    request = build_deep_socratic_request(state["journal_text"], state["weekly_perception_text"])
+
+    key = reflection_cache_key(request, state["journal_text"], state["weekly_perception_text"])
+    if cache is not None:
+        cached = cache.get(key) if reuse else None
+        if cached is not None:
+            return {"observation": cached, "cached": True, "key": key}
+
+    response = await chat_completion_async(openai_key, client=client, **request)
+    content = response.choices[0].message.content.strip()
+
+    if cache is not None:
+        cache.put(key, content)
+
+    return {
+        "observation": content,
+        "cached": False,
+        "key": key,
+    }
+
+
+async def socratic_node_from_state_async(state: GraphState) -> GraphState:
+    raw_input = {
+        "journal_text": await asyncio.to_thread(journal_context_for, state),
+        "weekly_perception_text": state.weekly_perception_text,
+    }
+    result = await deep_socratic_node_async(
+        raw_input,
+        openai_key=state.openai_key,
+        cache=reflection_cache_for(state),
+        reuse=state.reuse_reflection,
+    )
+
+    state.socratic_observation = result.get("observation")
+    state.reflection_key = result.get("key")
+    return state
+
+
 
 
 
@@ -194,11 +305,7 @@ def extract_concrete_contradictions(state: dict, themes: dict) -> List[str]:
     screen_time = state.get("screen_time", [])
     if screen_time:
         try:
-            top_app = sorted(
-                screen_time,
-                key=lambda x: _time_to_minutes(x["time"]),
-                reverse=True
-            )[0]
+            top_app = _top_app(screen_time)
             for theme, description in themes.items():
                 if any(word in theme.lower() for word in ["solitude", "presence", "authenticity", "focus", "peace"]):
                     contradictions.append(f"Theme: {theme} → App Usage: {top_app['app_name']} ({top_app['time']})")
@@ -240,6 +347,20 @@ def _time_to_minutes(t: str) -> int:
     return h * 60 + m
 
 
+def _app_minutes(app: dict) -> int:
+    """Minutes for one screen time record; perception provides them, older records only have 'time'."""
+    minutes = app.get("minutes")
+    return minutes if minutes is not None else _time_to_minutes(app["time"])
+
+
+def _top_app(screen_time: list):
+    """Most used app of the week, ignoring the 'All Usage' summary row."""
+    apps = [app for app in screen_time if app["app_name"] not in ["All Usage"]]
+    if not apps:
+        return None
+    return max(apps, key=_app_minutes)
+
+
 def extract_behavioral_clues(state: dict) -> str:
     """
     Extracts concrete screen/calendar clues to enrich the socratic prompt.
@@ -249,13 +370,8 @@ def extract_behavioral_clues(state: dict) -> str:
 
     # 1. Top app usage
     if isinstance(state.get("screen_time"), list) and len(state["screen_time"]) > 0:
-        sorted_apps = sorted(
-            state["screen_time"],
-            key=lambda x: int(x["time"].replace("h", "").replace("m", "").replace(" ", "").replace(":", "")),
-            reverse=True
-        )
-        top_app = sorted_apps[0]
-        if top_app["app_name"] not in ["All Usage"]:
+        top_app = _top_app(state["screen_time"])
+        if top_app is not None:
             clues.append(f"Top used app: {top_app['app_name']} ({top_app['time']})")
 
     # 2. Calendar meeting load
@@ -274,8 +390,6 @@ def extract_behavioral_clues(state: dict) -> str:
 
 
 def socratic_node(state: dict, openai_key: str) -> dict:
-    openai.api_key = openai_key
-
     interpretation = state["interpretation"]
     signals = extract_behavioral_clues(state)
 
@@ -291,7 +405,8 @@ def socratic_node(state: dict, openai_key: str) -> dict:
 
     prompt = PROMPT
 
-    response = openai.chat.completions.create(
+    response = chat_completion(
+        openai_key,
         model="gpt-4o",
         messages=[
             {"role": "system", "content": "You are a Socratic AI coach that reveals truths through contradiction and concrete observation."},
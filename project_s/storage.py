@@ -0,0 +1,138 @@
+import os
+import json
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from week_key import WEEK_ID_DTYPE
+
+
+# Columnar store for the perception datasets (screen time, calendar, journal,
+# weekly notes, weekly perception). Each dataset is a folder of Parquet files
+# partitioned by week_id (week_id=202526/...), so reading one week only opens
+# that week's files, and only the requested columns are decoded.
+PARTITION_COLUMN = "week_id"
+JSON_COLUMNS_KEY = b"project_s.json_columns"
+
+
+def _nested_columns(df: pd.DataFrame) -> list:
+    """Object columns holding dicts/lists (e.g. perception's screen_time and calendar_summary)."""
+    nested = []
+    for column in df.columns:
+        if df[column].dtype == object:
+            sample = df[column].dropna()
+            if not sample.empty and sample.map(lambda v: isinstance(v, (dict, list))).any():
+                nested.append(column)
+    return nested
+
+
+def _to_table(df: pd.DataFrame) -> pa.Table:
+    """df as an Arrow table, with dict/list columns as JSON text (listed in the schema metadata)."""
+    df = df.copy()
+    json_columns = _nested_columns(df)
+    for column in json_columns:
+        df[column] = df[column].map(
+            lambda v: json.dumps(v, ensure_ascii=False, default=str) if v is not None else None
+        )
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    return table.replace_schema_metadata({
+        **(table.schema.metadata or {}),
+        JSON_COLUMNS_KEY: json.dumps(json_columns).encode("utf-8"),
+    })
+
+
+def save_dataset(df: pd.DataFrame, root: str, partition_on: str = PARTITION_COLUMN) -> None:
+    """
+    Write df as a Parquet dataset partitioned by week_id.
+
+    Partitions present in df replace the ones already on disk; other weeks are kept,
+    so saving one new week does not rewrite the history. Dict/list columns are stored
+    as JSON text and decoded again by load_dataset.
+    """
+    os.makedirs(root, exist_ok=True)
+    pq.write_to_dataset(
+        _to_table(df),
+        root,
+        partition_cols=[partition_on] if partition_on in df.columns else None,
+        existing_data_behavior="delete_matching",
+    )
+
+
+def save_dataset_file(df: pd.DataFrame, root: str, name: str) -> None:
+    """
+    Write df as the file root/<name>.parquet of an unpartitioned dataset.
+
+    Only that file is replaced (atomically); the dataset's other files are kept, so a
+    dataset can be grown one file at a time. An empty df removes the file.
+    """
+    os.makedirs(root, exist_ok=True)
+    path = os.path.join(root, f"{name}.parquet")
+    if df.empty:
+        if os.path.exists(path):
+            os.remove(path)
+        return
+
+    tmp_path = os.path.join(root, f".{name}.parquet.tmp")  # dot-prefixed: skipped by readers
+    pq.write_table(_to_table(df), tmp_path)
+    os.replace(tmp_path, path)
+
+
+def load_dataset(
+    root: str,
+    columns: list = None,
+    week_ids: list = None,
+    date_column: str = None,
+    start=None,
+    end=None,
+    memory_map: bool = True,
+) -> pd.DataFrame:
+    """
+    Read a dataset written by save_dataset.
+
+    Args:
+        root (str): Dataset folder.
+        columns (list): Columns to read; all if None.
+        week_ids (list): Only read these week partitions.
+        date_column (str): Column that start/end filter on (e.g. 'start' for the calendar).
+        start, end: Inclusive date bounds, pushed down to Parquet row-group statistics.
+        memory_map (bool): Memory-map the files instead of reading them into buffers.
+
+    Returns:
+        pd.DataFrame: The selected slice, with week_id as a nullable integer column.
+    """
+    filters = []
+    if week_ids is not None:
+        filters.append((PARTITION_COLUMN, "in", [int(w) for w in week_ids]))
+    if date_column is not None and start is not None:
+        filters.append((date_column, ">=", pd.Timestamp(start)))
+    if date_column is not None and end is not None:
+        filters.append((date_column, "<=", pd.Timestamp(end)))
+
+    table = pq.read_table(
+        root,
+        columns=columns,
+        filters=filters or None,
+        memory_map=memory_map,
+        partitioning=ds.partitioning(pa.schema([(PARTITION_COLUMN, pa.int32())]), flavor="hive"),
+    )
+
+    df = table.to_pandas()
+    if PARTITION_COLUMN in df.columns:
+        df[PARTITION_COLUMN] = df[PARTITION_COLUMN].astype(WEEK_ID_DTYPE)
+
+    json_columns = _stored_json_columns(root)
+    for column in json_columns:
+        if column in df.columns:
+            df[column] = df[column].map(lambda v: json.loads(v) if isinstance(v, str) else v)
+
+    return df
+
+
+def _stored_json_columns(root: str) -> list:
+    for dirpath, _, filenames in os.walk(root):
+        for filename in filenames:
+            if filename.endswith(".parquet"):
+                metadata = pq.read_schema(os.path.join(dirpath, filename)).metadata or {}
+                return json.loads(metadata.get(JSON_COLUMNS_KEY, b"[]"))
+    return []
@@ -0,0 +1,118 @@
+import os
+import sys
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+
+# project_s modules import each other by bare name (as in the notebooks)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from graph_state import GraphState  # noqa: E402
+
+
+WEEK_ID = 202526
+ROWS = 500
+
+
+@pytest.fixture
+def frames():
+    """Weekly notes, screen time and calendar frames for one week."""
+    weekly_notes = pd.DataFrame({
+        "week": ["Jun 23–29"],
+        "work_highlights": ["shipped the release"],
+        "life_highlights": ["long walk"],
+        "raw_notes": ["tired but content"],
+        "source_file": ["week_06_23.png"],
+        "week_id": [WEEK_ID],
+    })
+    screen_time = pd.DataFrame({
+        "week": ["Jun 23–29"] * ROWS,
+        "app_name": [f"app{i % 25}" for i in range(ROWS)],
+        "time": ["1h"] * ROWS,
+        "minutes": [60] * ROWS,
+        "source_file": ["week_06_23.png"] * ROWS,
+        "week_id": [WEEK_ID] * ROWS,
+    })
+    calendar = pd.DataFrame({
+        "title": [f"meeting {i}" for i in range(ROWS)],
+        "start": pd.date_range("2025-06-23", periods=ROWS, freq="15min"),
+        "duration_min": [30] * ROWS,
+        "time_of_day": ["morning"] * ROWS,
+        "type": ["work"] * ROWS,
+        "private": ["no"] * ROWS,
+        "week_id": [WEEK_ID] * ROWS,
+    })
+    return weekly_notes, screen_time, calendar
+
+
+@pytest.fixture
+def llm(monkeypatch):
+    """Replace the reflection LLM call; every call words its answer differently, like the real model."""
+    import socratic
+
+    calls = []
+
+    def _chat_completion(*args, **kwargs):
+        calls.append(kwargs)
+        content = f"You seem busy. What matters? (take {len(calls)})"
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))], usage=None)
+
+    async def _chat_completion_async(*args, **kwargs):
+        return _chat_completion(*args, **kwargs)
+
+    monkeypatch.setattr(socratic, "chat_completion", _chat_completion)
+    monkeypatch.setattr(socratic, "chat_completion_async", _chat_completion_async)
+    return calls
+
+
+@pytest.fixture
+def make_state(frames, tmp_path):
+    """GraphState for user u1 whose whispers go to a JSONL sink under tmp_path."""
+    weekly_notes, screen_time, calendar = frames
+
+    def _make_state(**fields):
+        values = dict(
+            journal_text="=== Jun 24, 2025 ===\nA long day, but a good one.",
+            weekly_notes_df=weekly_notes,
+            screen_time_df=screen_time,
+            calendar_df=calendar,
+            user_id="u1",
+            openai_key="sk-test",
+            twilio_sid="ACtest",
+            twilio_token="token",
+            twilio_from="whatsapp:+10000000000",
+            twilio_to="whatsapp:+10000000001",
+            whisper_transport="jsonl",
+            whisper_transport_options={"path": str(tmp_path / "sink.jsonl")},
+        )
+        values.update(fields)
+        return GraphState(**values)
+
+    return _make_state
+
+
+BAD_NUMBER = "whatsapp:+10000000666"
+
+
+@pytest.fixture
+def rejecting_transport(monkeypatch):
+    """Whispers to BAD_NUMBER get Twilio's 400 (invalid 'To'); the rest go to the state's transport."""
+    import whisper
+    from transports import Transport
+    from twilio.base.exceptions import TwilioRestException
+
+    transport_for = whisper.transport_for
+
+    class _Rejecting(Transport):
+        name = "rejecting"
+
+        def __init__(self, inner):
+            self.inner = inner
+
+        def _send(self, body, from_number, to_number, account_sid, auth_token):
+            if to_number == BAD_NUMBER:
+                raise TwilioRestException(400, "Messages.json", "The 'To' number is not a valid phone number.", 21211, "POST")
+            return self.inner._send(body, from_number, to_number, account_sid, auth_token)
+
+    monkeypatch.setattr(whisper, "transport_for", lambda state: _Rejecting(transport_for(state)))
@@ -0,0 +1,115 @@
+import pandas as pd
+import pytest
+
+from checkpoint import Checkpointer, DONE, FAILED, START, frame_from_bytes, frame_to_bytes
+from conftest import BAD_NUMBER
+from graph import build_graph, resume
+from schema import compact_frame
+from whisper_outbox import WhisperDeliveryError
+
+
+@pytest.fixture
+def checkpointer(tmp_path):
+    checkpointer = Checkpointer(str(tmp_path / "checkpoints.sqlite"))
+    yield checkpointer
+    checkpointer.close()
+
+
+def test_frame_dtype_round_trip(frames):
+    _, screen_time, calendar = frames
+    for df in (compact_frame(screen_time, "screen_time"), compact_frame(calendar, "calendar")):
+        fmt, data = frame_to_bytes(df)
+        restored = frame_from_bytes(fmt, data)
+
+        assert fmt == "parquet"
+        pd.testing.assert_frame_equal(restored, df)
+        assert restored.dtypes.to_dict() == df.dtypes.to_dict()
+
+
+def test_object_columns_fall_back_to_pickle():
+    df = pd.DataFrame({"mixed": [1, "two", {"three": 3}]})
+    fmt, data = frame_to_bytes(df)
+
+    assert fmt == "pickle"
+    pd.testing.assert_frame_equal(frame_from_bytes(fmt, data), df)
+
+
+def test_checkpoint_round_trip(checkpointer, make_state):
+    state = make_state(run_id="u1-run", perception={"week_id": 202526})
+    checkpointer.save(state, "perceive")
+
+    restored, node = checkpointer.load("u1-run")
+
+    assert node == "perceive"
+    assert restored.perception == state.perception
+    assert restored.user_id == "u1"
+    pd.testing.assert_frame_equal(restored.screen_time_df, state.screen_time_df)
+    pd.testing.assert_frame_equal(restored.calendar_df, state.calendar_df)
+    # Secrets are never written; they come back only when passed to load()
+    assert restored.openai_key is None and restored.twilio_token is None
+    assert checkpointer.load("u1-run", openai_key="sk-test")[0].openai_key == "sk-test"
+
+
+def test_frames_are_stored_once_per_run(checkpointer, make_state):
+    state = make_state(run_id="u1-run")
+    checkpointer.save(state, START)
+    checkpointer.save(state, "perceive")
+
+    assert checkpointer._conn.execute("SELECT COUNT(*) FROM frames").fetchone()[0] == 3
+
+
+def test_resume_after_failed_whisper(checkpointer, llm, make_state, tmp_path):
+    # No recipient: whisper fails after perception and the reflection succeeded
+    state = make_state(run_id="u1-run", twilio_to=None)
+    with pytest.raises(ValueError):
+        build_graph(checkpointer=checkpointer).invoke(state)
+
+    (run,) = checkpointer.runs()
+    assert (run["status"], run["last_node"], run["failed_node"]) == (FAILED, "reflect", "whisper")
+
+    final = resume("u1-run", checkpointer, twilio_token="token", twilio_to="whatsapp:+10000000001")
+
+    # Resumed at whisper: the reflection was not paid for again
+    assert len(llm) == 1
+    assert final.whisper_status["status"] == "sent"
+    assert (tmp_path / "sink.jsonl").exists()
+    assert checkpointer.runs()[0]["status"] == DONE
+
+    # A finished run resumes to its final state without running anything
+    assert resume("u1-run", checkpointer).whisper_status == final.whisper_status
+    assert len(llm) == 1
+
+
+def test_resumed_whisper_is_not_sent_twice(checkpointer, llm, make_state, tmp_path):
+    # The whisper was delivered but its checkpoint was lost (crash right after the send)
+    state = make_state(run_id="u1-run", whisper_outbox_path=str(tmp_path / "outbox.sqlite"))
+    build_graph(checkpointer=checkpointer).invoke(state)
+    state, _ = checkpointer.load("u1-run")
+    state.run_id = "u1-retry"
+    checkpointer.save(state, "reflect")
+
+    final = resume("u1-retry", checkpointer, twilio_token="token")
+
+    assert final.whisper_status["outbox_status"] == "sent"
+    assert len((tmp_path / "sink.jsonl").read_text(encoding="utf-8").splitlines()) == 1
+
+
+def test_rejected_whisper_fails_the_run_and_resumes(checkpointer, llm, make_state, rejecting_transport, tmp_path):
+    state = make_state(run_id="u1-run", whisper_outbox_path=str(tmp_path / "outbox.sqlite"), twilio_to=BAD_NUMBER)
+    with pytest.raises(WhisperDeliveryError):
+        build_graph(checkpointer=checkpointer).invoke(state)
+
+    (run,) = checkpointer.runs()
+    assert (run["status"], run["failed_node"]) == (FAILED, "whisper")
+
+    final = resume("u1-run", checkpointer, twilio_token="token", twilio_to="whatsapp:+10000000001")
+
+    assert final.whisper_status["outbox_status"] == "sent"
+    assert final.whisper_status["to"] == "whatsapp:+10000000001"
+    assert checkpointer.runs()[0]["status"] == DONE
+    assert len(llm) == 1
+
+
+def test_state_repr_hides_secrets(make_state):
+    text = repr(make_state())
+    assert "sk-test" not in text and "twilio_token" not in text
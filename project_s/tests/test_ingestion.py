@@ -0,0 +1,82 @@
+import os
+
+import pandas as pd
+
+from ingestion import migrate_pickle_store, run_incremental_ingestion
+from storage import load_dataset
+
+WEEKS = {"a.png": 202526, "b.png": 202527}
+
+
+def _read(image_path, limiter):
+    with open(image_path, encoding="utf-8") as f:
+        return f.read()
+
+
+def _rows(filename, text):
+    return pd.DataFrame({
+        "source_file": filename,
+        "line": text.splitlines(),
+        "week_id": pd.array([WEEKS[filename]] * len(text.splitlines()), dtype="Int32"),
+    })
+
+
+def _ingest(folder, dataset, to_frame=_rows):
+    return run_incremental_ingestion(str(folder), _read, to_frame, str(dataset))
+
+
+def _partition_files(dataset, week_id):
+    folder = dataset / f"week_id={week_id}"
+    return {name: os.stat(folder / name).st_mtime_ns for name in os.listdir(folder)}
+
+
+def test_changed_file_rewrites_only_its_week(tmp_path):
+    folder, dataset = tmp_path / "images", tmp_path / "store" / "screen_time"
+    folder.mkdir()
+    (folder / "a.png").write_text("a1\na2", encoding="utf-8")
+    (folder / "b.png").write_text("b1", encoding="utf-8")
+
+    assert len(_ingest(folder, dataset)) == 3
+    week_b = _partition_files(dataset, 202527)
+
+    (folder / "a.png").write_text("a3", encoding="utf-8")
+    store = _ingest(folder, dataset)
+
+    assert list(store["line"]) == ["a3", "b1"]
+    assert _partition_files(dataset, 202527) == week_b
+    assert sorted(load_dataset(str(dataset))["line"]) == ["a3", "b1"]
+    assert os.path.exists(f"{dataset}.manifest.json")
+    assert list(_ingest(folder, dataset)["line"]) == ["a3", "b1"]  # nothing pending, read back from the store
+
+
+def test_store_without_week_id_keeps_one_file_per_source(tmp_path):
+    folder, dataset = tmp_path / "images", tmp_path / "store" / "journal_transcripts"
+    folder.mkdir()
+    (folder / "a.png").write_text("page a", encoding="utf-8")
+    (folder / "b.png").write_text("page b", encoding="utf-8")
+    transcript = lambda filename, text: pd.DataFrame([{"source_file": filename, "transcript": text}])
+
+    _ingest(folder, dataset, transcript)
+    (folder / "b.png").write_text("page b, again", encoding="utf-8")
+    store = _ingest(folder, dataset, transcript)
+
+    assert list(store["transcript"]) == ["page a", "page b, again"]
+    assert len(os.listdir(dataset)) == 2
+
+
+def test_migrate_pickle_store(tmp_path):
+    folder, dataset = tmp_path / "images", tmp_path / "store" / "screen_time"
+    folder.mkdir()
+    (folder / "a.png").write_text("a1", encoding="utf-8")
+    pickle_path = str(tmp_path / "screen_time.pickle")
+    run_incremental_ingestion(str(folder), _read, _rows, str(tmp_path / "old"),
+                              manifest_path=f"{pickle_path}.manifest.json")
+    _rows("a.png", "a1").to_pickle(pickle_path)
+
+    assert migrate_pickle_store(pickle_path, str(dataset))
+    assert not migrate_pickle_store(pickle_path, str(dataset))
+
+    calls = []
+    store = run_incremental_ingestion(str(folder), lambda path, limiter: calls.append(path), _rows, str(dataset))
+    assert calls == []
+    assert list(store["line"]) == ["a1"]
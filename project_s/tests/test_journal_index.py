@@ -0,0 +1,44 @@
+import journal_index
+from journal_index import JournalIndex, fold, index_for_text, select_journal_context, tokenize
+
+ENTRIES = [
+    {"date": "2025-06-23", "week_id": 202526, "content": "Ένιωσα μοναξιά μετά το demo."},
+    {"date": "2025-06-24", "week_id": 202526, "content": "Long run by the sea, felt calm."},
+    {"date": "2025-06-30", "week_id": 202527, "content": "Café with Ana, talked about the résumé."},
+]
+
+
+def test_fold_strips_accents_and_case():
+    assert fold("Μοναξιά") == "μοναξια"
+    assert fold("ΈΝΙΩΣΑ") == "ενιωσα"
+    assert fold("Résumé") == "resume"
+    assert tokenize("Η Μοναξιά, και το CAFÉ!") == ["μοναξια", "cafe"]
+
+
+def test_search_matches_regardless_of_accents():
+    index = JournalIndex(ENTRIES)
+    assert [e["date"] for _, e in index.search("μοναξια")] == ["2025-06-23"]
+    assert [e["date"] for _, e in index.search("ΜΟΝΑΞΙΆ")] == ["2025-06-23"]
+    assert [e["date"] for _, e in index.search("cafe resume")] == ["2025-06-30"]
+    assert index.search("nothing here") == []
+
+
+def test_search_ranks_more_matching_entries_first():
+    index = JournalIndex(ENTRIES + [{"date": "2025-07-01", "week_id": 202527, "content": "Run, run, run."}])
+    assert [e["date"] for _, e in index.search("run")] == ["2025-07-01", "2025-06-24"]
+
+
+def test_week_entries_come_first_within_budget():
+    text = "=== 23/6/25 ===\nΈνιωσα μοναξιά.\n=== 24/6/25 ===\nLong run, felt calm.\n=== 30/6/25 ===\nCafé with Ana."
+    assert select_journal_context(text, "calm", k=1, week_id=202527) == "=== 2025-06-30 ===\nCafé with Ana."
+    assert select_journal_context(text, "calm", k=1) == "=== 2025-06-24 ===\nLong run, felt calm."
+    assert len(select_journal_context(text, "μοναξια calm cafe", max_chars=10)) <= 40
+
+
+def test_user_keeps_one_cached_index(monkeypatch):
+    monkeypatch.setattr(journal_index, "_indexes", journal_index.OrderedDict())
+    first = index_for_text("=== 23/6/25 ===\nfirst", user_id="u1")
+    assert index_for_text("=== 23/6/25 ===\nfirst", user_id="u1") is first
+    second = index_for_text("=== 23/6/25 ===\nsecond", user_id="u1")
+    assert second is not first
+    assert list(journal_index._indexes) == ["u1"]
@@ -0,0 +1,49 @@
+from datetime import datetime
+
+import pytest
+
+from journal_store import JournalStore
+
+ENTRIES = [
+    {"date": "2025-06-22", "week_id": 202525, "content": "Sunday, quiet."},
+    {"date": "2025-06-23", "week_id": 202526, "content": "Ένιωσα μοναξιά μετά το demo."},
+    {"date": "2025-06-25", "week_id": 202526, "content": "Long run."},
+    {"date": "2025-06-29", "week_id": 202526, "content": "Sunday again."},
+    {"date": "2025-06-30", "week_id": 202527, "content": "New week."},
+]
+
+
+@pytest.fixture
+def store(tmp_path):
+    with JournalStore(str(tmp_path / "journal.sqlite")) as store:
+        store.add(ENTRIES)
+        yield store
+
+
+def test_between_is_inclusive_and_ordered(store):
+    assert list(store.between("2025-06-23", "2025-06-29")["date"]) == ["2025-06-23", "2025-06-25", "2025-06-29"]
+    assert list(store.between(datetime(2025, 6, 29, 18, 30))["date"]) == ["2025-06-29", "2025-06-30"]
+    assert list(store.between(end="2025-06-22")["date"]) == ["2025-06-22"]
+    assert len(store.between()) == len(ENTRIES)
+    assert store.between("2025-07-01").empty
+
+
+def test_week_and_latest(store):
+    week = store.week(202526)
+    assert list(week["date"]) == ["2025-06-23", "2025-06-25", "2025-06-29"]
+    assert str(week["week_id"].dtype) == "Int32"
+    assert store.week(202401).empty
+    assert list(store.latest(2)["date"]) == ["2025-06-30", "2025-06-29"]
+
+
+def test_range_scans_use_the_indexes(store):
+    def plan(sql, *params):
+        return " ".join(row[-1] for row in store._conn.execute(f"EXPLAIN QUERY PLAN {sql}", params))
+
+    assert "entries_date" in plan("SELECT * FROM entries WHERE date >= ? AND date <= ? ORDER BY date, id", "2025-06-23", "2025-06-29")
+    assert "entries_week_id" in plan("SELECT * FROM entries WHERE week_id = ? ORDER BY date, id", 202526)
+
+
+def test_add_skips_stored_entries_and_contains_folds_accents(store):
+    assert store.add(ENTRIES + [{"date": "2025-07-01", "week_id": 202527, "content": "ΜΟΝΑΞΙΑ again"}]) == 1
+    assert list(store.contains("μοναξια")["date"]) == ["2025-07-01", "2025-06-23"]
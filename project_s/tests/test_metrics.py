@@ -0,0 +1,43 @@
+import json
+
+from metrics import LLM, NODE, MetricsRecorder
+
+
+def _counter(text: str, metric: str) -> float:
+    return sum(
+        float(line.rsplit(" ", 1)[1])
+        for line in text.splitlines()
+        if line.startswith(f"project_s_{metric}{{")
+    )
+
+
+def test_prometheus_counters_survive_eviction():
+    recorder = MetricsRecorder(jsonl_path=None, max_records=2)
+    for _ in range(5):
+        recorder.record(LLM, "gpt-4o", 0.5, prompt_tokens=100, completion_tokens=10, cost_usd=0.001)
+    before = recorder.export_prometheus()
+    recorder.record(NODE, "reflect", 1.0)
+    recorder.clear()
+    after = recorder.export_prometheus()
+
+    assert len(recorder.records()) == 0
+    assert _counter(before, "calls_total") == 5
+    assert _counter(after, "calls_total") == 6
+    assert _counter(after, "prompt_tokens_total") == 500
+    assert _counter(after, "cost_usd_total") == 0.005
+
+
+def test_jsonl_stream(tmp_path):
+    path = tmp_path / "metrics" / "calls.jsonl"
+    recorder = MetricsRecorder(jsonl_path=str(path))
+    for i in range(100):
+        recorder.record(LLM, "gpt-4o", 0.1, prompt_tokens=i)
+    recorder.flush()
+
+    records = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+    assert [r["prompt_tokens"] for r in records] == list(range(100))
+
+    recorder.close()
+    recorder.record(NODE, "whisper", 0.2)
+    recorder.close()
+    assert len(path.read_text(encoding="utf-8").splitlines()) == 101
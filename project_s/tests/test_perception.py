@@ -0,0 +1,70 @@
+from datetime import datetime
+
+import pandas as pd
+
+from perception import perception_node
+
+
+# The per-week loop perception_node replaced (minus its Sunday cut-off at midnight)
+def _loop_perception(weekly_notes_df, screen_time_df, calendar_df):
+    rows = []
+    for _, row in weekly_notes_df.iterrows():
+        start = datetime.strptime(row["week"].split("–")[0] + " 2025", "%b %d %Y")
+        end = start + pd.Timedelta(days=7)
+        screen = screen_time_df[screen_time_df["week"] == row["week"]]
+        events = calendar_df[(calendar_df["start"] >= start) & (calendar_df["start"] < end)]
+        calendar = "No events scheduled." if events.empty else {
+            "total_events": len(events),
+            "total_minutes": events["duration_min"].sum(),
+            "time_of_day_breakdown": events["time_of_day"].value_counts().to_dict(),
+            "meeting_type_distribution": events["type"].value_counts().to_dict(),
+        }
+        rows.append({
+            "week": row["week"],
+            "work_highlights": row["work_highlights"],
+            "life_highlights": row["life_highlights"],
+            "weekly_notes_raw": row["raw_notes"],
+            "screen_time": screen[["app_name", "time"]].to_dict(orient="records"),
+            "calendar_summary": calendar,
+        })
+    return rows
+
+
+def _inputs():
+    weeks = ["Jun 9–15", "Jun 16–22", "Jun 23–29"]
+    notes = pd.DataFrame({
+        "week": weeks,
+        "work_highlights": ["demo", "review", "launch"],
+        "life_highlights": ["run", "sea", "family"],
+        "raw_notes": ["n1", "n2", "n3"],
+    })
+    screen_time = pd.DataFrame({
+        "week": ["Jun 9–15", "Jun 9–15", "Jun 23–29"],
+        "app_name": ["Safari", "Slack", "Mail"],
+        "time": ["1h 5m", "20m", "45m"],
+    })
+    starts = pd.to_datetime([
+        "2025-06-09 09:00", "2025-06-10 14:00", "2025-06-14 19:00", "2025-06-15 22:30",
+        "2025-06-23 09:30", "2025-06-23 10:00", "2025-06-29 08:00", "2025-07-01 09:00",
+    ])
+    calendar = pd.DataFrame({
+        "start": starts,
+        "duration_min": [30.0, 60.0, 90.0, 45.0, 15.0, 30.0, 60.0, 30.0],
+        "time_of_day": ["Morning", "Afternoon", "Evening", "Night", "Morning", "Morning", "Morning", "Morning"],
+        "type": ["Standup", "Review", "Meeting", "Meeting", "Standup", "1:1", "Meeting", "Standup"],
+    })
+    return notes, screen_time, calendar
+
+
+def test_vectorized_perception_matches_the_loop():
+    notes, screen_time, calendar = _inputs()
+    expected = _loop_perception(notes, screen_time, calendar)
+    actual = perception_node(notes, screen_time, calendar).to_dict(orient="records")
+
+    assert len(actual) == len(expected)
+    for got, want in zip(actual, expected):
+        for field in ("week", "work_highlights", "life_highlights", "weekly_notes_raw", "calendar_summary"):
+            assert got[field] == want[field], field
+        # apps may be re-ranked (by minutes) and carry extra fields; the same apps and times remain
+        apps = sorted((app["app_name"], app["time"]) for app in got["screen_time"])
+        assert apps == sorted((app["app_name"], app["time"]) for app in want["screen_time"])
@@ -0,0 +1,93 @@
+import pandas as pd
+import pyarrow.parquet as pq
+
+from perception_cal import (
+    classify_meeting_type,
+    classify_time_of_day,
+    parse_and_clean_cal_data,
+    stream_and_clean_cal_data,
+)
+
+SUBJECTS = [
+    "OOO - vacation", "Out of office", "1:1 with Maria", "One-on-One sync", "Daily Standup",
+    "Design review", "Feedback session", "Planning", "ooo standup review", "", "nan",
+]
+
+
+# The row-by-row rules compress_calendar_df used before it was vectorized
+def _time_of_day(hour):
+    if 5 <= hour < 12:
+        return 'Morning'
+    elif 12 <= hour < 17:
+        return 'Afternoon'
+    elif 17 <= hour < 22:
+        return 'Evening'
+    return 'Night'
+
+
+def _meeting_type(subject):
+    subject = subject.lower()
+    if 'ooo' in subject or 'out of office' in subject:
+        return 'OOO'
+    elif '1:1' in subject or 'one-on-one' in subject:
+        return '1:1'
+    elif 'standup' in subject:
+        return 'Standup'
+    elif 'review' in subject:
+        return 'Review'
+    elif 'feedback' in subject:
+        return 'Feedback'
+    return 'Meeting'
+
+
+def test_vectorized_classification_matches_row_rules():
+    hours = pd.Series(range(24))
+    assert list(classify_time_of_day(hours)) == [_time_of_day(h) for h in range(24)]
+    assert list(classify_meeting_type(pd.Series(SUBJECTS))) == [_meeting_type(s) for s in SUBJECTS]
+
+
+def test_empty_keywords_match_nothing():
+    table = [('Focus', ['', 'focus']), ('Blank', [''])]
+    types = classify_meeting_type(pd.Series(["Focus time", "Planning"]), table)
+    assert list(types) == ['Focus', 'Meeting']
+
+
+def _write_csv(path, rows):
+    pd.DataFrame(rows, columns=[
+        'Start Date', 'Start Time', 'End Date', 'End Time', 'Subject', 'Description', 'Private',
+    ]).to_csv(path, index=False)
+
+
+def test_keyword_table_reaches_the_parsers(tmp_path):
+    csv = tmp_path / "calendar.csv"
+    _write_csv(csv, [
+        ['6/23/2025', '9:00:00 AM', '6/23/2025', '9:30:00 AM', 'Focus block', None, 'False'],
+        ['6/24/2025', '2:00:00 PM', '6/24/2025', '3:00:00 PM', 'Design review', None, 'False'],
+    ])
+    table = [('Focus', ['focus'])]
+
+    parsed = parse_and_clean_cal_data(str(csv), keyword_table=table)
+    assert list(parsed['type']) == ['Focus', 'Meeting']
+
+    stream_and_clean_cal_data(str(csv), str(tmp_path / "calendar.parquet"), keyword_table=table)
+    assert list(pd.read_parquet(tmp_path / "calendar.parquet")['type']) == ['Focus', 'Meeting']
+
+
+def test_streamed_schema_does_not_depend_on_the_first_chunk(tmp_path):
+    csv = tmp_path / "calendar.csv"
+    _write_csv(csv, [
+        # first chunk: no description, no Private flag
+        ['6/23/2025', '9:00:00 AM', '6/23/2025', '9:30:00 AM', 'Standup', None, None],
+        ['6/30/2025', '9:00:00 AM', '6/30/2025', '10:00:00 AM', '1:1', 'Quarterly goals', 'True'],
+    ])
+    output = tmp_path / "calendar.parquet"
+
+    assert stream_and_clean_cal_data(str(csv), str(output), chunksize=1) == 2
+
+    schema = pq.read_schema(output)
+    assert str(schema.field('description').type) == 'string'
+    assert str(schema.field('private').type) == 'dictionary<values=string, indices=int32, ordered=0>'
+    assert pq.ParquetFile(output).metadata.num_row_groups == 2
+    df = pd.read_parquet(output)
+    assert list(df['description']) == ['', 'Quarterly goals']
+    assert list(df['duration_min']) == [30, 60]
@@ -0,0 +1,43 @@
+import os
+
+import pandas as pd
+import pytest
+
+import perception_journal
+from perception_journal import stream_journal_to_parquet
+
+JOURNAL = """=== 23 Ιουνίου 2025 ===
+Demo day.
+=== 24/6/25 ===
+Long run.
+"""
+
+
+def test_stream_journal_to_parquet(tmp_path):
+    source = tmp_path / "journal.txt"
+    source.write_text(JOURNAL, encoding="utf-8")
+    output = tmp_path / "journal.parquet"
+
+    assert stream_journal_to_parquet(str(source), str(output)) == 2
+
+    df = pd.read_parquet(output)
+    assert list(df["date"]) == ["2025-06-23", "2025-06-24"]
+    assert list(df["week_id"]) == [202526, 202526]
+    assert not (tmp_path / "journal.parquet.tmp").exists()
+
+
+def test_failed_stream_keeps_the_previous_parquet(tmp_path, monkeypatch):
+    source = tmp_path / "journal.txt"
+    source.write_text(JOURNAL, encoding="utf-8")
+    output = tmp_path / "journal.parquet"
+    stream_journal_to_parquet(str(source), str(output))
+
+    def _broken(lines, default_year=2025):
+        yield {"date": "2025-06-30", "week_id": 202527, "content": "half"}
+        raise OSError("disk went away")
+
+    monkeypatch.setattr(perception_journal, "iter_journal_entries", _broken)
+    with pytest.raises(OSError):
+        stream_journal_to_parquet(str(source), str(output), batch_size=1)
+
+    assert list(pd.read_parquet(output)["date"]) == ["2025-06-23", "2025-06-24"]
@@ -0,0 +1,54 @@
+from ingestion import RateLimiter
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+def _limiter(**limits):
+    clock = FakeClock()
+    return RateLimiter(clock=clock, sleep=clock.sleep, **limits), clock
+
+
+def test_rpm_waits_for_the_oldest_request_to_leave_the_window():
+    limiter, clock = _limiter(rpm=2, tpm=10**9)
+    limiter.acquire(1)
+    clock.now += 10
+    limiter.acquire(1)
+    assert clock.slept == []
+
+    limiter.acquire(1)
+    assert clock.slept == [50]  # the first request leaves the window at t+60
+    assert clock.now == 1060
+
+
+def test_tpm_waits_until_the_tokens_fit():
+    limiter, clock = _limiter(rpm=100, tpm=1000)
+    limiter.acquire(600)
+    clock.now += 30
+    limiter.acquire(400)
+    assert clock.slept == []
+
+    limiter.acquire(100)
+    assert clock.slept == [30]
+    limiter.acquire(500)  # 400 + 100 + 500 fits exactly
+    assert clock.slept == [30]
+    limiter.acquire(1)
+    assert clock.slept == [30, 30]  # waits for the 400-token request to leave the window
+
+
+def test_oversized_request_runs_alone():
+    limiter, clock = _limiter(rpm=100, tpm=1000)
+    limiter.acquire(5000)
+    assert clock.slept == []
+    limiter.acquire(1)
+    assert clock.slept == [60]
@@ -0,0 +1,41 @@
+import pandas as pd
+import pytest
+
+from perception import summarize_screen_time_by_week
+from perception_screen_time import parse_duration_minutes
+
+
+@pytest.mark.parametrize("text, minutes", [
+    ("1h 30m", 90),
+    ("45m", 45),
+    ("2h", 120),
+    ("10h", 600),
+    ("1h 5m", 65),
+    ("30s", 1),
+    ("29s", 0),
+    ("< 1m", 1),
+    ("1 hr 5 min", 65),
+    ("2 hours 3 minutes", 123),
+    ("1:30", 90),
+    ("0:45:30", 46),
+    (" 3H 2M ", 182),
+])
+def test_parse_duration_minutes(text, minutes):
+    assert parse_duration_minutes(pd.Series([text])).iloc[0] == minutes
+
+
+def test_unparseable_duration_is_na():
+    parsed = parse_duration_minutes(pd.Series(["soon", "", None]))
+    assert parsed.isna().all()
+    assert str(parsed.dtype) == "Int32"
+
+
+def test_apps_rank_by_minutes_not_text():
+    screen_time = pd.DataFrame({
+        "week_id": [202526] * 3,
+        "app_name": ["Safari", "Slack", "Mail"],
+        "time": ["1h 5m", "10h", "59m"],
+    })
+    by_week, totals = summarize_screen_time_by_week(screen_time)
+    assert [app["app_name"] for app in by_week[202526]] == ["Slack", "Safari", "Mail"]
+    assert totals[202526] == 600 + 65 + 59
@@ -0,0 +1,63 @@
+import asyncio
+
+import httpx
+import pytest
+from twilio.base.exceptions import TwilioRestException
+
+from transports import JsonlSinkTransport, LocalTwilioTransport, TwilioTransport
+from whisper_outbox import _is_retryable
+
+
+def _send_async(status: int, payload: dict):
+    def _handler(request):
+        return httpx.Response(status, json=payload)
+
+    async def _send():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(_handler)) as client:
+            return await TwilioTransport().send_async("hi", "+1", "+2", "ACtest", "token", http_client=client)
+
+    return asyncio.run(_send())
+
+
+def test_async_twilio_429_is_a_retryable_twilio_error():
+    with pytest.raises(TwilioRestException) as failure:
+        _send_async(429, {"code": 20429, "message": "Too Many Requests", "status": 429})
+
+    assert failure.value.status == 429
+    assert failure.value.code == 20429
+    assert _is_retryable(failure.value)
+
+
+def test_async_twilio_400_is_a_final_twilio_error():
+    with pytest.raises(TwilioRestException) as failure:
+        _send_async(400, {"code": 21211, "message": "The 'To' number is not a valid phone number.", "status": 400})
+
+    assert failure.value.status == 400
+    assert failure.value.code == 21211
+    assert not _is_retryable(failure.value)
+
+
+def test_async_twilio_success():
+    result = _send_async(201, {"sid": "SM123", "status": "queued", "to": "+2"})
+
+    assert result == {"status": "queued", "sid": "SM123", "to": "+2"}
+
+
+def test_local_transport_matches_twilio_errors():
+    transport = LocalTwilioTransport(latency_s=0, jitter_s=0, failure_rate=1.0)
+
+    with pytest.raises(TwilioRestException) as failure:
+        transport.send("hi", "+1", "+2")
+    assert failure.value.status == 429
+
+    with pytest.raises(TwilioRestException) as failure:
+        asyncio.run(transport.send_async("hi", "+1", "+2"))
+    assert failure.value.status == 429
+
+
+def test_jsonl_sink_appends_one_line_per_message(tmp_path):
+    transport = JsonlSinkTransport(str(tmp_path / "sink.jsonl"))
+    for i in range(3):
+        assert transport.send(f"message {i}", "+1", "+2")["status"] == "sent"
+
+    assert len((tmp_path / "sink.jsonl").read_text(encoding="utf-8").splitlines()) == 3
@@ -0,0 +1,69 @@
+import json
+import os
+import time
+
+from vision_cache import VisionCache
+
+
+def _last_used(cache, key, seconds_ago):
+    then = time.time() - seconds_ago
+    os.utime(cache._path(key), (then, then))
+
+
+def test_key_covers_image_prompt_and_model(tmp_path):
+    image = tmp_path / "week_06_23.png"
+    image.write_bytes(b"png")
+    key = VisionCache.key(str(image), "prompt", "gpt-4o")
+    assert key == VisionCache.key(str(image), "prompt", "gpt-4o")
+    assert len({
+        key,
+        VisionCache.key(str(image), "other prompt", "gpt-4o"),
+        VisionCache.key(str(image), "prompt", "gpt-4o-mini"),
+    }) == 3
+    image.write_bytes(b"png, edited")
+    assert VisionCache.key(str(image), "prompt", "gpt-4o") != key
+
+
+def test_key_covers_the_prep_profile(tmp_path):
+    image = tmp_path / "week_06_23.png"
+    image.write_bytes(b"png")
+    keys = {VisionCache.key(str(image), "prompt", "gpt-4o", prep) for prep in (None, "screenshot", "handwriting")}
+    assert len(keys) == 3
+
+
+def test_least_recently_used_entry_is_evicted(tmp_path):
+    cache = VisionCache(str(tmp_path / "cache"))
+    cache.put("a", "x" * 100)
+    size = os.path.getsize(cache._path("a"))
+    cache.max_bytes = 3 * size + size // 2  # three entries; sizes vary by a byte or two
+    cache.put("b", "x" * 100)
+    cache.put("c", "x" * 100)
+    for seconds_ago, key in ((30, "a"), (20, "b"), (10, "c")):
+        _last_used(cache, key, seconds_ago)
+
+    assert cache.get("a") == "x" * 100  # now the most recently used
+    cache.put("d", "x" * 100)
+
+    assert cache.get("b") is None
+    assert [cache.get(key) is not None for key in ("a", "c", "d")] == [True, True, True]
+    assert cache.stats()["entries"] == 3
+
+
+def test_expired_entries_miss_and_are_removed(tmp_path):
+    cache = VisionCache(str(tmp_path / "cache"), ttl_s=60)
+    cache.put("old", "csv")
+    cache.put("new", "csv")
+    path = cache._path("old")
+    with open(path, encoding="utf-8") as f:
+        entry = json.load(f)
+    entry["created"] -= 120
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(entry, f)
+    _last_used(cache, "old", 120)
+
+    assert cache.get("old") is None
+    assert cache.get("new") == "csv"
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    cache.put("newer", "csv")
+    assert not os.path.exists(path)
@@ -0,0 +1,34 @@
+from datetime import date
+
+import pandas as pd
+import pytest
+
+from week_key import week_id_from_date, week_id_from_filename, week_ids_from_dates, week_start
+
+BOUNDARIES = [
+    (date(2024, 12, 29), 202452),  # Sunday
+    (date(2024, 12, 30), 202501),  # Monday of ISO week 1 of 2025
+    (date(2025, 1, 1), 202501),
+    (date(2020, 12, 31), 202053),  # 2020 has 53 ISO weeks
+    (date(2021, 1, 3), 202053),
+    (date(2021, 1, 4), 202101),
+    (date(2026, 12, 31), 202653),
+    (date(2027, 1, 1), 202653),
+]
+
+
+@pytest.mark.parametrize("day, week_id", BOUNDARIES)
+def test_week_id_at_year_boundaries(day, week_id):
+    assert week_id_from_date(day) == week_id
+    assert week_start(week_id) <= day < week_start(week_id) + pd.Timedelta(days=7)
+
+
+def test_vectorized_week_ids_match():
+    days = pd.Series([pd.Timestamp(day) for day, _ in BOUNDARIES] + [pd.NaT])
+    assert week_ids_from_dates(days).tolist() == [week_id for _, week_id in BOUNDARIES] + [pd.NA]
+
+
+def test_week_id_from_filename_with_year():
+    assert week_id_from_filename("week_2024_12_30.png") == 202501
+    assert week_id_from_filename("week_12_29.png", default_year=2024) == 202452
+    assert week_id_from_filename("notes.png") is None
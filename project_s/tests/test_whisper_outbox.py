@@ -0,0 +1,111 @@
+import json
+
+import pytest
+from twilio.base.exceptions import TwilioRestException
+
+from conftest import BAD_NUMBER
+from graph import build_graph
+from metrics import MESSAGE, MetricsRecorder, set_recorder
+from transports import Transport
+from whisper_outbox import FAILED, Outbox, SENT, WhisperDeliveryError, deliver, idempotency_key
+
+
+def _sent(tmp_path):
+    sink = tmp_path / "sink.jsonl"
+    if not sink.exists():
+        return []
+    return [json.loads(line) for line in sink.read_text(encoding="utf-8").splitlines()]
+
+
+def test_two_full_runs_send_one_whisper(tmp_path, llm, make_state):
+    outbox_path = str(tmp_path / "outbox.sqlite")
+    graph = build_graph()
+
+    first = graph.invoke(make_state(whisper_outbox_path=outbox_path))
+    second = graph.invoke(make_state(whisper_outbox_path=outbox_path))
+
+    # Two reflections, worded differently, but the same inputs: one message
+    assert len(llm) == 2
+    assert first["socratic_observation"] != second["socratic_observation"]
+    assert len(_sent(tmp_path)) == 1
+    assert first["whisper_status"]["idempotency_key"] == second["whisper_status"]["idempotency_key"]
+    assert second["whisper_status"]["outbox_status"] == SENT
+
+
+def test_changed_inputs_send_again(tmp_path, llm, make_state):
+    outbox_path = str(tmp_path / "outbox.sqlite")
+    graph = build_graph()
+
+    graph.invoke(make_state(whisper_outbox_path=outbox_path))
+    graph.invoke(make_state(whisper_outbox_path=outbox_path, journal_text="=== Jun 25, 2025 ===\nSomething new."))
+
+    assert len(_sent(tmp_path)) == 2
+
+
+def test_failed_whisper_raises_and_is_retried_with_corrected_number(tmp_path, llm, make_state, rejecting_transport):
+    outbox_path = str(tmp_path / "outbox.sqlite")
+    graph = build_graph()
+
+    with pytest.raises(WhisperDeliveryError) as failure:
+        graph.invoke(make_state(whisper_outbox_path=outbox_path, twilio_to=BAD_NUMBER))
+    assert failure.value.status == FAILED
+    assert "not a valid phone number" in failure.value.error
+
+    final = graph.invoke(make_state(whisper_outbox_path=outbox_path))
+
+    (sent,) = _sent(tmp_path)
+    assert sent["to"] == "whatsapp:+10000000001"
+    assert final["whisper_status"]["outbox_status"] == SENT
+
+
+def test_enqueue_is_idempotent(tmp_path):
+    outbox = Outbox(str(tmp_path / "outbox.sqlite"))
+    args = ("u1", 202526)
+    numbers = dict(account_sid="ACtest", from_number="+1", to_number="+2")
+
+    first = outbox.enqueue(*args, "first wording", content_key="inputs", **numbers)
+    second = outbox.enqueue(*args, "second wording", content_key="inputs", **numbers)
+
+    assert first["idempotency_key"] == second["idempotency_key"] == idempotency_key(*args, "inputs")
+    assert second["body"] == "first wording"
+    assert outbox.counts() == {"pending": 1}
+    outbox.close()
+
+
+def test_enqueue_rearms_failed_message(tmp_path):
+    outbox = Outbox(str(tmp_path / "outbox.sqlite"))
+    first = outbox.enqueue("u1", 202526, "hello", account_sid="ACtest", from_number="+1", to_number="+999", content_key="inputs")
+    outbox.mark_failed(first["idempotency_key"], 5, "TwilioRestException: invalid 'To'")
+
+    again = outbox.enqueue("u1", 202526, "hello", account_sid="ACtest", from_number="+1", to_number="+2", content_key="inputs")
+
+    assert (again["status"], again["attempts"], again["to_number"]) == ("pending", 0, "+2")
+    outbox.mark_sent(again["idempotency_key"], 1, "SM1", "queued")
+    assert outbox.enqueue("u1", 202526, "hello", account_sid="ACtest", from_number="+1", to_number="+3", content_key="inputs")["to_number"] == "+2"
+    outbox.close()
+
+
+def test_deliver_records_retries(tmp_path):
+    class _Flaky(Transport):
+        name = "flaky"
+        calls = 0
+
+        def _send(self, body, from_number, to_number, account_sid, auth_token):
+            self.calls += 1
+            if self.calls == 1:
+                raise TwilioRestException(429, "https://api.twilio.com", "Too Many Requests", 20429)
+            return {"status": "queued", "sid": "SM1", "to": to_number}
+
+    outbox = Outbox(str(tmp_path / "outbox.sqlite"))
+    message = outbox.enqueue("u1", 202526, "hello", account_sid="ACtest", from_number="+1", to_number="+2")
+    recorder = MetricsRecorder(jsonl_path=None)
+    set_recorder(recorder)
+    try:
+        deliver(outbox, {"ACtest": "token"}, keys=[message["idempotency_key"]], wait=True, transport=_Flaky())
+    finally:
+        set_recorder(MetricsRecorder())
+
+    sends = [r for r in recorder.records() if r["kind"] == MESSAGE]
+    assert [(r["status"], r["retries"]) for r in sends] == [("error", 0), ("ok", 1)]
+    assert outbox.get(message["idempotency_key"])["status"] == SENT
+    outbox.close()
@@ -0,0 +1,269 @@
+import os
+import json
+import time
+import uuid
+import random
+import asyncio
+import weakref
+import threading
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+import httpx
+from twilio.rest import Client
+from twilio.http.http_client import TwilioHttpClient
+from twilio.base.exceptions import TwilioRestException
+from metrics import MESSAGE, get_recorder
+
+
+# Message transports behind send_reflective_message and the whisper outbox.
+#   "twilio"  the real Twilio API (WhatsApp / SMS)
+#   "jsonl"   append each message to a local JSONL file, nothing leaves the machine
+#   "local"   an in-process stand-in for Twilio's Messages REST API (same request,
+#             response and error shapes, configurable latency and 429 rate), for
+#             load-testing the send path without sending anything
+# Selected per run with GraphState.whisper_transport, or process-wide with the
+# PROJECT_S_WHISPER_TRANSPORT environment variable.
+TWILIO_MESSAGES_URL = "https://api.twilio.com/2010-04-01/Accounts/{account_sid}/Messages.json"
+TWILIO_TIMEOUT_S = 30
+DEFAULT_TRANSPORT = os.environ.get("PROJECT_S_WHISPER_TRANSPORT", "twilio")
+
+_twilio_clients = {}
+_transports = {}
+_lock = threading.Lock()
+
+
+def get_twilio_client(account_sid: str, auth_token: str) -> Client:
+    """Shared Twilio client per account, on a pooled (keep-alive) HTTP session; thread-safe."""
+    with _lock:
+        client = _twilio_clients.get((account_sid, auth_token))
+        if client is None:
+            client = Client(
+                account_sid,
+                auth_token,
+                http_client=TwilioHttpClient(pool_connections=True, timeout=TWILIO_TIMEOUT_S),
+            )
+            _twilio_clients[(account_sid, auth_token)] = client
+        return client
+
+
+def _twilio_result(response: httpx.Response, to_number: str) -> dict:
+    """A Messages API response as {"status", "sid", "to"}; errors raise TwilioRestException, like the SDK."""
+    try:
+        payload = response.json()
+    except ValueError:
+        payload = {}
+    if response.status_code >= 400:
+        raise TwilioRestException(
+            response.status_code, str(response.url), payload.get("message", response.reason_phrase), payload.get("code"), "POST"
+        )
+    return {"status": payload.get("status"), "sid": payload.get("sid"), "to": to_number}
+
+
+class Transport(ABC):
+    """
+    Sends one message; returns {"status", "sid", "to"}.
+
+    Failures raise TwilioRestException (status 429/5xx are retryable, see
+    whisper_outbox) or a connection error, whatever the transport. Subclasses
+    implement _send (and optionally _send_async); every send is recorded in metrics,
+    with retries=1 when the caller marks it as a retry (whisper_outbox.deliver does), so
+    summing retries over message records counts the retries.
+    """
+
+    name = None
+
+    def send(self, body: str, from_number: str, to_number: str, account_sid: str = None, auth_token: str = None, retry: bool = False) -> dict:
+        started_at, started = time.time(), time.perf_counter()
+        try:
+            result = self._send(body, from_number, to_number, account_sid, auth_token)
+        except Exception as e:
+            self._record(body, started_at, started, retry, error=e)
+            raise
+        self._record(body, started_at, started, retry, result=result)
+        return result
+
+    async def send_async(self, body: str, from_number: str, to_number: str, account_sid: str = None, auth_token: str = None, retry: bool = False, **kwargs) -> dict:
+        started_at, started = time.time(), time.perf_counter()
+        try:
+            result = await self._send_async(body, from_number, to_number, account_sid, auth_token, **kwargs)
+        except Exception as e:
+            self._record(body, started_at, started, retry, error=e)
+            raise
+        self._record(body, started_at, started, retry, result=result)
+        return result
+
+    @abstractmethod
+    def _send(self, body, from_number, to_number, account_sid, auth_token) -> dict:
+        """Send one message; return {"status", "sid", "to"}."""
+
+    async def _send_async(self, body, from_number, to_number, account_sid, auth_token) -> dict:
+        return await asyncio.to_thread(self._send, body, from_number, to_number, account_sid, auth_token)
+
+    def _record(self, body: str, started_at: float, started: float, retry: bool, result: dict = None, error: Exception = None) -> None:
+        get_recorder().record(
+            MESSAGE,
+            self.name,
+            time.perf_counter() - started,
+            started_at=started_at,
+            error=error,
+            retries=int(retry),
+            request_bytes=len(body.encode("utf-8")),
+            response_bytes=len(json.dumps(result).encode("utf-8")) if result is not None else None,
+        )
+
+
+class TwilioTransport(Transport):
+    """The Twilio API: the pooled SDK client for sync sends, its REST endpoint over httpx for async ones."""
+
+    name = "twilio"
+
+    def _send(self, body, from_number, to_number, account_sid, auth_token):
+        response = get_twilio_client(account_sid, auth_token).messages.create(
+            body=body, from_=from_number, to=to_number
+        )
+        return {"status": response.status, "sid": response.sid, "to": to_number}
+
+    async def _send_async(self, body, from_number, to_number, account_sid, auth_token, http_client: httpx.AsyncClient = None):
+        if http_client is None:
+            async with httpx.AsyncClient(timeout=TWILIO_TIMEOUT_S) as http_client:
+                return await self._send_async(body, from_number, to_number, account_sid, auth_token, http_client)
+
+        response = await http_client.post(
+            TWILIO_MESSAGES_URL.format(account_sid=account_sid),
+            data={"Body": body, "From": from_number, "To": to_number},
+            auth=(account_sid, auth_token),
+        )
+        return _twilio_result(response, to_number)
+
+
+class JsonlSinkTransport(Transport):
+    """Appends every message as one JSON line to path; thread-safe, never fails."""
+
+    name = "jsonl"
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    def _send(self, body, from_number, to_number, account_sid, auth_token):
+        sid = f"SK{uuid.uuid4().hex}"
+        record = {
+            "sid": sid,
+            "from": from_number,
+            "to": to_number,
+            "body": body,
+            "sent_at": datetime.now(timezone.utc).isoformat(),
+        }
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line)
+        return {"status": "sent", "sid": sid, "to": to_number}
+
+
+class LocalTwilioTransport(Transport):
+    """
+    In-process stand-in for Twilio's Messages API.
+
+    Requests go through httpx exactly as they would to api.twilio.com (form body, basic
+    auth), but are answered by a local handler that waits latency_s (± jitter), rejects
+    a failure_rate share with 429 and missing To/From/Body with 400, and otherwise
+    returns Twilio's 201 JSON. Errors surface as TwilioRestException, like the SDK's.
+    """
+
+    name = "local"
+
+    def __init__(self, latency_s: float = 0.05, jitter_s: float = 0.02, failure_rate: float = 0.0):
+        self.latency_s = latency_s
+        self.jitter_s = jitter_s
+        self.failure_rate = failure_rate
+        self._client = httpx.Client(transport=httpx.MockTransport(self._handle))
+        # httpx async clients are bound to their event loop: one per loop, weak on the loop
+        self._async_clients = weakref.WeakKeyDictionary()
+
+    def _delay(self) -> float:
+        return max(self.latency_s + random.uniform(-self.jitter_s, self.jitter_s), 0.0)
+
+    def _respond(self, request: httpx.Request) -> httpx.Response:
+        form = dict(httpx.QueryParams(request.content.decode("utf-8")))
+        if random.random() < self.failure_rate:
+            return httpx.Response(429, json={"code": 20429, "message": "Too Many Requests", "status": 429})
+        if not all(form.get(field) for field in ("To", "From", "Body")):
+            return httpx.Response(400, json={"code": 21604, "message": "A required parameter is missing", "status": 400})
+        return httpx.Response(201, json={
+            "sid": f"SM{uuid.uuid4().hex}",
+            "status": "queued",
+            "to": form["To"],
+            "from": form["From"],
+            "body": form["Body"],
+            "date_created": datetime.now(timezone.utc).strftime("%a, %d %b %Y %H:%M:%S +0000"),
+        })
+
+    def _handle(self, request: httpx.Request) -> httpx.Response:
+        time.sleep(self._delay())
+        return self._respond(request)
+
+    async def _handle_async(self, request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(self._delay())
+        return self._respond(request)
+
+    def _request(self, body, from_number, to_number, account_sid):
+        return {
+            "url": TWILIO_MESSAGES_URL.format(account_sid=account_sid or "AClocal"),
+            "data": {"Body": body, "From": from_number, "To": to_number},
+        }
+
+    def _send(self, body, from_number, to_number, account_sid, auth_token):
+        response = self._client.post(**self._request(body, from_number, to_number, account_sid))
+        return _twilio_result(response, to_number)
+
+    async def _send_async(self, body, from_number, to_number, account_sid, auth_token):
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            client = self._async_clients[loop] = httpx.AsyncClient(transport=httpx.MockTransport(self._handle_async))
+        response = await client.post(**self._request(body, from_number, to_number, account_sid))
+        return _twilio_result(response, to_number)
+
+    async def aclose(self) -> None:
+        """Close the running loop's async client."""
+        client = self._async_clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.aclose()
+
+
+TRANSPORTS = {
+    TwilioTransport.name: TwilioTransport,
+    JsonlSinkTransport.name: JsonlSinkTransport,
+    LocalTwilioTransport.name: LocalTwilioTransport,
+}
+
+
+def get_transport(name: str = None, **options) -> Transport:
+    """
+    Shared transport instance for name (DEFAULT_TRANSPORT if None) and options.
+
+    Options are the transport's constructor arguments, e.g.
+    get_transport("jsonl", path="../data/whispers.jsonl") or
+    get_transport("local", latency_s=0.2, failure_rate=0.05).
+    """
+    name = name or DEFAULT_TRANSPORT
+    if name not in TRANSPORTS:
+        raise ValueError(f"Unknown whisper transport '{name}' (expected one of {', '.join(TRANSPORTS)}).")
+
+    key = (name, tuple(sorted(options.items())))
+    with _lock:
+        transport = _transports.get(key)
+        if transport is None:
+            transport = _transports[key] = TRANSPORTS[name](**options)
+        return transport
+
+
+async def close_transports() -> None:
+    """Close the shared transports' async clients for the running loop; call before it shuts down (run_batch_async does)."""
+    with _lock:
+        transports = list(_transports.values())
+    for transport in transports:
+        if isinstance(transport, LocalTwilioTransport):
+            await transport.aclose()
@@ -0,0 +1,217 @@
+import os
+import re
+import json
+from ingestion import RateLimiter, list_images, run_work_units, DEFAULT_MAX_WORKERS, DEFAULT_TPM
+from openai_client import chat_completion
+from image_prep import prepare_image
+
+
+# Batched vision ingestion: several images share one chat completion, and the model
+# answers with a JSON object keyed by filename. Batches are packed greedily from
+# each image's estimated token cost so a request stays under max_tokens; images
+# the batched answer does not cover (or a batch that fails) fall back to one request each.
+DEFAULT_MAX_BATCH_IMAGES = 8
+DEFAULT_BATCH_TOKENS = DEFAULT_TPM * 2 // 3  # leave room in the per-minute budget
+BATCH_PROMPT_TOKENS = 500
+
+
+def plan_batches(filenames: list, tokens_fn, max_images: int = DEFAULT_MAX_BATCH_IMAGES, max_tokens: int = DEFAULT_BATCH_TOKENS) -> list:
+    """
+    Split filenames (in order) into batches of at most max_images images and max_tokens tokens.
+
+    Args:
+        filenames (list): Filenames to batch.
+        tokens_fn (callable): tokens_fn(filename) -> estimated tokens the image adds to a
+            request (image input plus its share of the answer).
+        max_images (int): Images per request.
+        max_tokens (int): Token budget per request, including BATCH_PROMPT_TOKENS.
+
+    Returns:
+        list: Lists of filenames; an image over budget on its own gets a batch of one.
+    """
+    batches, batch, used = [], [], BATCH_PROMPT_TOKENS
+    for filename in filenames:
+        tokens = tokens_fn(filename)
+        if batch and (len(batch) >= max_images or used + tokens > max_tokens):
+            batches.append(batch)
+            batch, used = [], BATCH_PROMPT_TOKENS
+        batch.append(filename)
+        used += tokens
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def batch_messages(prompt: str, filenames: list, image_parts: list) -> list:
+    """One user message: the prompt, then each image preceded by its filename."""
+    content = [{"type": "text", "text": prompt}]
+    for filename, image_part in zip(filenames, image_parts):
+        content.append({"type": "text", "text": f"Image: {filename}"})
+        content.append(image_part)
+    return [{"role": "user", "content": content}]
+
+
+def split_batch_output(raw_output: str, filenames: list) -> dict:
+    """
+    Parse a batched answer into filename → value, for the filenames it answers.
+
+    Raises:
+        ValueError: The answer is not a JSON object.
+    """
+    raw_output = raw_output.strip()
+    if raw_output.startswith("```"):
+        raw_output = re.sub(r"```(?:json)?", "", raw_output).strip("` \n")
+    parsed = json.loads(raw_output)
+    if not isinstance(parsed, dict):
+        raise ValueError("batched answer is not a JSON object")
+    return {f: parsed[f] for f in filenames if parsed.get(f) is not None}
+
+
+def parse_image_batch(
+    image_paths: list,
+    openai_api_key: str,
+    batch_prompt: str,
+    single_fn,
+    finish,
+    cache=None,
+    cache_key_fn=None,
+    rate_limiter: RateLimiter = None,
+    model: str = "gpt-4o",
+    profile: str = None,
+    output_tokens_per_image: int = 1000,
+    **request_kwargs,
+) -> dict:
+    """
+    Parse several images with one chat completion.
+
+    Cached images are answered from the cache; the rest are sent together with
+    batch_prompt, which must ask for a JSON object mapping each filename to its value.
+    Images the batched answer does not cover (or whose value finish rejects) are
+    retried one by one with single_fn.
+
+    Args:
+        image_paths (list): Images of the batch.
+        batch_prompt (str): Prompt for the whole batch.
+        single_fn (callable): single_fn(image_path) -> output, the per-image parser.
+        finish (callable): finish(image_path, value) -> output for a cached or batched
+            value; raise to reject the value.
+        cache (VisionCache): Per-image cache shared with single_fn.
+        cache_key_fn (callable): cache_key_fn(image_path) -> the key single_fn uses.
+        profile (str): image_prep profile for the uploads.
+        output_tokens_per_image (int): Answer budget per image (max_tokens scales with the batch).
+        **request_kwargs: Extra chat completion arguments (e.g. temperature).
+
+    Returns:
+        dict: image_path → (output, error).
+    """
+    outcomes = {}
+    pending = []
+    for image_path in image_paths:
+        cached = cache.get(cache_key_fn(image_path)) if cache else None
+        if cached is not None:
+            try:
+                outcomes[image_path] = (finish(image_path, cached), None)
+                continue
+            except Exception:
+                pass
+        pending.append(image_path)
+
+    answers = {}
+    if len(pending) > 1:
+        filenames = [os.path.basename(p) for p in pending]
+        try:
+            prepared = [prepare_image(p, profile) for p in pending]
+            image_parts = [
+                {"type": "image_url", "image_url": {"url": item["url"], "detail": item["detail"]}}
+                for item in prepared
+            ]
+            max_tokens = output_tokens_per_image * len(pending)
+            if rate_limiter:
+                rate_limiter.acquire(
+                    BATCH_PROMPT_TOKENS + max_tokens + sum(item["tokens_after"] or 0 for item in prepared)
+                )
+            response = chat_completion(
+                openai_api_key,
+                model=model,
+                messages=batch_messages(batch_prompt, filenames, image_parts),
+                max_tokens=max_tokens,
+                response_format={"type": "json_object"},
+                **request_kwargs,
+            )
+            answers = split_batch_output(response.choices[0].message.content, filenames)
+        except Exception as e:
+            print(f"⚠️ Batch of {len(pending)} images failed ({e}); retrying one by one")
+
+    for image_path in pending:
+        value = answers.get(os.path.basename(image_path))
+        if value is not None:
+            try:
+                output = finish(image_path, value)
+            except Exception:
+                pass
+            else:
+                if cache:
+                    cache.put(cache_key_fn(image_path), value)
+                outcomes[image_path] = (output, None)
+                continue
+
+        try:
+            outcomes[image_path] = (single_fn(image_path), None)
+        except Exception as e:
+            outcomes[image_path] = (None, e)
+
+    return outcomes
+
+
+def run_batched_vision_ingestion(
+    folder_path: str,
+    batch_fn,
+    filenames: list = None,
+    max_workers: int = DEFAULT_MAX_WORKERS,
+    rate_limiter: RateLimiter = None,
+    desc: str = None,
+    on_result=None,
+    tokens_fn=None,
+    max_images: int = DEFAULT_MAX_BATCH_IMAGES,
+    max_tokens: int = DEFAULT_BATCH_TOKENS,
+):
+    """
+    Batched counterpart of ingestion.run_vision_ingestion, with the same return value.
+
+    batch_fn(image_paths, rate_limiter) handles one batch and returns
+    {image_path: (output, error)}; like parse_fn it acquires the limiter itself.
+    Batches run concurrently on max_workers threads. With the first six arguments it
+    can be passed as `runner` to ingestion.run_incremental_ingestion.
+
+    Args:
+        tokens_fn (callable): tokens_fn(image_path) -> estimated tokens per image;
+            without it, batches are only capped at max_images.
+        max_images (int): Images per request.
+        max_tokens (int): Token budget per request.
+    """
+    if filenames is None:
+        filenames = list_images(folder_path)
+    filenames = sorted(filenames)
+    rate_limiter = rate_limiter or RateLimiter()
+
+    batches = plan_batches(
+        filenames,
+        (lambda f: tokens_fn(os.path.join(folder_path, f))) if tokens_fn else (lambda f: 0),
+        max_images=max_images,
+        max_tokens=max_tokens,
+    )
+
+    results, stats = run_work_units(
+        folder_path,
+        batches,
+        lambda image_paths: batch_fn(image_paths, rate_limiter),
+        max_workers=max_workers,
+        desc=desc,
+        on_result=on_result,
+    )
+    stats["batches"] = len(batches)
+    print(
+        f"⚡ {stats['files']} images in {stats['batches']} requests, {stats['elapsed_s']}s "
+        f"({stats['images_per_min']} images/min, {stats['failed']} failed)"
+    )
+    return results, stats
@@ -0,0 +1,133 @@
+import os
+import json
+import time
+import hashlib
+import threading
+
+
+DEFAULT_MAX_BYTES = 200 * 1024 * 1024  # 200 MB
+
+
+class VisionCache:
+    """
+    On-disk cache for vision-LLM extraction results.
+
+    Entries are keyed by a hash of the image bytes, the prompt text, the model and the
+    preprocessing profile, so an unchanged screenshot re-parsed with the same prompt
+    never hits the network.
+    Each entry is one small JSON file; the least recently used entries are evicted
+    once the folder grows past max_bytes. With ttl_s set, entries older than ttl_s
+    seconds count as misses and are removed on the next eviction pass.
+    """
+
+    label = "Vision cache"
+
+    def __init__(self, cache_dir: str, max_bytes: int = DEFAULT_MAX_BYTES, ttl_s: float = None):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.ttl_s = ttl_s
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def key(image_path: str, prompt: str, model: str, prep: str = None) -> str:
+        """prep: how the image is preprocessed before upload (image_prep.profile_fingerprint)."""
+        digest = hashlib.sha256()
+        with open(image_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        digest.update(b"\0" + prompt.encode("utf-8"))
+        digest.update(b"\0" + model.encode("utf-8"))
+        if prep is not None:
+            digest.update(b"\0" + prep.encode("utf-8"))
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key: str):
+        """Return the cached value for key, or None on a miss."""
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+            value = entry["value"]
+        except (OSError, ValueError, KeyError):
+            entry = None
+
+        if entry is None or self._expired(entry.get("created", 0)):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        # Touch so eviction treats this entry as recently used
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        with self._lock:
+            self.hits += 1
+        return value
+
+    def put(self, key: str, value) -> None:
+        """Store a JSON-serializable value (CSV text, dict or transcript)."""
+        path = self._path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"value": value, "created": time.time()}, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        self._evict()
+
+    def _expired(self, created: float) -> bool:
+        return self.ttl_s is not None and time.time() - created > self.ttl_s
+
+    def _evict(self) -> None:
+        with self._lock:
+            entries = []
+            total = 0
+            for entry in os.scandir(self.cache_dir):
+                if entry.name.endswith(".json"):
+                    stat = entry.stat()
+                    # mtime is never older than "created", so this only drops entries get() rejects
+                    if self._expired(stat.st_mtime):
+                        try:
+                            os.remove(entry.path)
+                        except OSError:
+                            pass
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+                    total += stat.st_size
+
+            if total <= self.max_bytes:
+                return
+
+            for _, size, path in sorted(entries):
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
+                if total <= self.max_bytes:
+                    break
+
+    def stats(self) -> dict:
+        entries = [e for e in os.scandir(self.cache_dir) if e.name.endswith(".json")]
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "entries": len(entries),
+            "bytes": sum(e.stat().st_size for e in entries),
+        }
+
+    def report(self) -> dict:
+        stats = self.stats()
+        print(
+            f"🗄️ {self.label}: {stats['hits']} hits, {stats['misses']} misses "
+            f"({stats['hit_rate']:.0%} hit rate), {stats['entries']} entries, "
+            f"{stats['bytes'] / 1024:.0f} KB"
+        )
+        return stats
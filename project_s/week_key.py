@@ -0,0 +1,69 @@
+import re
+from datetime import date, timedelta
+import pandas as pd
+
+
+# Canonical week identifier: ISO year * 100 + ISO week, e.g. 202526 for Jun 23–29 2025.
+# Weeks run Monday–Sunday. Every perception_* module writes it as an integer
+# 'week_id' column at ingestion, and perception joins on it instead of labels.
+DEFAULT_YEAR = 2025
+WEEK_ID_DTYPE = "Int32"
+
+# week_06_23.png, or week_2024_06_23.png for multi-year histories
+FILENAME_PATTERN = re.compile(r"week_(?:(\d{4})_)?(\d{2})_(\d{2})")
+
+
+def week_id_from_date(d) -> int:
+    year, week, _ = d.isocalendar()
+    return year * 100 + week
+
+
+def week_ids_from_dates(dates: pd.Series) -> pd.Series:
+    """Vectorized date/datetime Series → nullable integer week ids."""
+    iso = pd.to_datetime(dates).dt.isocalendar()
+    return (iso["year"] * 100 + iso["week"]).astype(WEEK_ID_DTYPE)
+
+
+def week_start(week_id: int) -> date:
+    """Monday of the given week."""
+    return date.fromisocalendar(int(week_id) // 100, int(week_id) % 100, 1)
+
+
+def week_label(start: date) -> str:
+    """Human label used in prompts and notebooks, e.g. 'Jun 23–29'."""
+    end = start + timedelta(days=6)
+    return f"{start.strftime('%b')} {start.day}–{end.day}"
+
+
+def date_from_filename(filename: str, default_year: int = DEFAULT_YEAR):
+    """'week_06_23.png' → date(default_year, 6, 23); 'week_2024_06_23.png' → date(2024, 6, 23)."""
+    match = FILENAME_PATTERN.search(filename)
+    if not match:
+        return None
+    year, month, day = match.groups()
+    return date(int(year) if year else default_year, int(month), int(day))
+
+
+def week_id_from_filename(filename: str, default_year: int = DEFAULT_YEAR):
+    start = date_from_filename(filename, default_year)
+    return week_id_from_date(start) if start else None
+
+
+def week_ids_from_labels(week_labels: pd.Series, year: int = DEFAULT_YEAR) -> pd.Series:
+    """
+    Fallback for frames ingested before week_id existed: 'Jun 23–29' → 202526.
+
+    Labels carry no year, so this only works for single-year histories.
+    """
+    start_part = week_labels.astype(str).str.replace("–", "-").str.split("-").str[0].str.strip()
+    starts = pd.to_datetime(start_part + f" {year}", format="%b %d %Y", errors="coerce")
+    return week_ids_from_dates(starts)
+
+
+def week_ids_of(df: pd.DataFrame, date_column: str = None, year: int = DEFAULT_YEAR) -> pd.Series:
+    """The frame's week_id column, or one derived from its dates or week labels."""
+    if "week_id" in df.columns:
+        return df["week_id"].astype(WEEK_ID_DTYPE)
+    if date_column is not None:
+        return week_ids_from_dates(df[date_column])
+    return week_ids_from_labels(df["week"], year)
@@ -1,9 +1,15 @@
 # project_s/whisper.py
 
-from twilio.rest import Client
+import asyncio
+import httpx
 from graph_state import GraphState
+from transports import Transport, TwilioTransport, get_transport, get_twilio_client  # noqa: F401
 
 
+def transport_for(state: dict) -> Transport:
+    """The transport named by state["whisper_transport"] (config default if unset)."""
+    return get_transport(state.get("whisper_transport"), **(state.get("whisper_transport_options") or {}))
+
 
 def send_reflective_message(
     message: str,
@@ -11,10 +17,11 @@ def send_reflective_message(
     auth_token: str,
     from_number: str,
     to_number: str = None,
-    recipient: str = None
+    recipient: str = None,
+    transport: Transport = None,
 ) -> dict:
     """
-    Sends a message using Twilio to a given recipient.
+    Sends a message using Twilio (or another transport) to a given recipient.
 
     Args:
         message (str): The reflective insight or question to send.
@@ -23,27 +30,22 @@ def send_reflective_message(
         from_number (str): Your Twilio-registered sending number.
         to_number (str): Primary recipient number (e.g. WhatsApp: 'whatsapp:+123456789').
         recipient (str): Optional override recipient (alias for to_number).
+        transport (Transport): Where the message goes; transports.DEFAULT_TRANSPORT if None.
 
     Returns:
         dict: Contains status and metadata.
     """
-    client = Client(account_sid, auth_token)
-
     final_to_number = recipient or to_number
     if not final_to_number:
         raise ValueError("You must provide a recipient phone number.")
 
-    response = client.messages.create(
-        body=message,
-        from_=from_number,
-        to=final_to_number
-    )
+    transport = transport or get_transport()
+    return transport.send(message, from_number, final_to_number, account_sid, auth_token)
 
-    return {
-        "status": response.status,
-        "sid": response.sid,
-        "to": final_to_number
-    }
+
+def format_whisper_message(observation: str) -> str:
+    # message = f"🌿 Reflective Insight:\n{observation}\n\n❓Question:\n{question}"
+    return f"🌿 Reflective Insight:\n{observation}\n"
 
 
 def whisper_node(state: dict) -> dict:
@@ -53,16 +55,19 @@ def whisper_node(state: dict) -> dict:
         raise ValueError("socratic_observation empty.")
 
 
-    # Build message body
-    # message = f"🌿 Reflective Insight:\n{observation}\n\n❓Question:\n{question}"
-    message = f"🌿 Reflective Insight:\n{observation}\n"
+    message = format_whisper_message(observation)
+
+    if state.get("whisper_outbox_path"):
+        state["whisper_status"] = whisper_via_outbox(state, message)
+        return state
 
     response = send_reflective_message(
         message=message,
         account_sid=state["twilio_sid"],
         auth_token=state["twilio_token"],
         from_number=state["twilio_from"],
-        to_number=state["twilio_to"]
+        to_number=state["twilio_to"],
+        transport=transport_for(state),
     )
 
     state["whisper_status"] = {
@@ -75,21 +80,157 @@ def whisper_node(state: dict) -> dict:
     return state
 
 
+def whisper_via_outbox(state: dict, message: str) -> dict:
+    """
+    Enqueue the message in the durable outbox and, unless whisper_defer is set, deliver it.
 
+    A message already in the outbox for the same user, week and reflection inputs
+    (state["reflection_key"], or the text when there is none) is not sent again; its
+    stored status and SID are returned instead. A previously failed one is retried.
 
-def whisper_node_from_state(state: GraphState) -> GraphState:
-    # Convert GraphState → raw dict
-    raw_state = {
+    Raises:
+        WhisperDeliveryError: The message was not sent (delivery failed, or it is still
+            in flight elsewhere), so the node fails and the run can be resumed.
+    """
+    from whisper_outbox import get_outbox, deliver, PENDING, SENT, WhisperDeliveryError
+
+    if not state.get("twilio_to"):
+        raise ValueError("You must provide a recipient phone number.")
+
+    outbox = get_outbox(state["whisper_outbox_path"])
+    stored = outbox.enqueue(
+        state.get("user_id"),
+        state.get("week_id"),
+        message,
+        account_sid=state["twilio_sid"],
+        from_number=state["twilio_from"],
+        to_number=state["twilio_to"],
+        content_key=state.get("reflection_key"),
+    )
+    key = stored["idempotency_key"]
+
+    if stored["status"] == PENDING and not state.get("whisper_defer"):
+        deliver(
+            outbox,
+            {state["twilio_sid"]: state["twilio_token"]},
+            keys=[key],
+            max_workers=1,
+            transport=transport_for(state),
+        )
+        stored = outbox.get(key)
+
+    if stored["status"] != SENT and not (stored["status"] == PENDING and state.get("whisper_defer")):
+        raise WhisperDeliveryError(stored)
+
+    return {
+        "status": stored["twilio_status"] or stored["status"],
+        "sid": stored["sid"],
+        "to": stored["to_number"],
+        "preview": message[:60],
+        "outbox_status": stored["status"],
+        "idempotency_key": key,
+    }
+
+
+
+
+def _week_id(perception: dict):
+    week_id = (perception or {}).get("week_id")
+    return None if week_id is None else int(week_id)
+
+
+def _raw_whisper_state(state: GraphState) -> dict:
+    return {
         "socratic_observation": state.socratic_observation,
         "twilio_to": state.twilio_to,
         "twilio_from": state.twilio_from,
         "twilio_sid": state.twilio_sid,
         "twilio_token": state.twilio_token,
+        "user_id": state.user_id,
+        "week_id": _week_id(state.perception),
+        "reflection_key": state.reflection_key,
+        "whisper_outbox_path": state.whisper_outbox_path,
+        "whisper_defer": state.whisper_defer,
+        "whisper_transport": state.whisper_transport,
+        "whisper_transport_options": state.whisper_transport_options,
     }
 
+
+def whisper_node_from_state(state: GraphState) -> GraphState:
+    # Convert GraphState → raw dict
+    raw_state = _raw_whisper_state(state)
+
     # Run core node
     result = whisper_node(raw_state)
 
     # Map back to GraphState
     state.whisper_status = result.get("whisper_status")
     return state
+
+
+# --- Async variants ---
+async def send_reflective_message_async(
+    message: str,
+    account_sid: str,
+    auth_token: str,
+    from_number: str,
+    to_number: str = None,
+    recipient: str = None,
+    http_client: httpx.AsyncClient = None,
+    transport: Transport = None,
+) -> dict:
+    """
+    Async send_reflective_message; with the Twilio transport, calls Twilio's Messages REST API directly.
+
+    Credentials are passed per request. Pass a shared httpx.AsyncClient to reuse
+    its connection pool across many Twilio sends.
+    """
+    final_to_number = recipient or to_number
+    if not final_to_number:
+        raise ValueError("You must provide a recipient phone number.")
+
+    transport = transport or get_transport()
+    if isinstance(transport, TwilioTransport):
+        return await transport.send_async(
+            message, from_number, final_to_number, account_sid, auth_token, http_client=http_client
+        )
+    return await transport.send_async(message, from_number, final_to_number, account_sid, auth_token)
+
+
+async def whisper_node_async(state: dict) -> dict:
+    observation = (state.get("socratic_observation") or "").strip()
+    if not observation:
+        raise ValueError("socratic_observation empty.")
+
+    message = format_whisper_message(observation)
+
+    if state.get("whisper_outbox_path"):
+        # Outbox bookkeeping is SQLite and the shared Twilio client: run it off the loop
+        state["whisper_status"] = await asyncio.to_thread(whisper_via_outbox, state, message)
+        return state
+
+    response = await send_reflective_message_async(
+        message=message,
+        account_sid=state["twilio_sid"],
+        auth_token=state["twilio_token"],
+        from_number=state["twilio_from"],
+        to_number=state["twilio_to"],
+        transport=transport_for(state),
+    )
+
+    state["whisper_status"] = {
+        "status": response["status"],
+        "sid": response["sid"],
+        "to": response["to"],
+        "preview": message[:60]
+    }
+    return state
+
+
+async def whisper_node_from_state_async(state: GraphState) -> GraphState:
+    raw_state = _raw_whisper_state(state)
+
+    result = await whisper_node_async(raw_state)
+
+    state.whisper_status = result.get("whisper_status")
+    return state
@@ -0,0 +1,430 @@
+import os
+import time
+import random
+import sqlite3
+import hashlib
+import tempfile
+import threading
+import statistics
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+import requests
+import httpx
+from twilio.base.exceptions import TwilioRestException
+from ingestion import RateLimiter
+from transports import Transport, get_transport
+from metrics import propagate
+
+
+# Durable outbox for whispers. whisper_node enqueues each message under an
+# idempotency key (user, week, content hash), so re-running the graph for a week
+# that was already delivered does not message the user again. deliver() sends
+# pending messages concurrently through a transport (the shared Twilio client by
+# default, see transports.py), under a send rate
+# limit, retrying transient failures with backoff; status and SID are stored per message.
+DEFAULT_SEND_WORKERS = 4
+DEFAULT_SENDS_PER_MIN = 60  # Twilio's default of ~1 message/second per sender
+MAX_ATTEMPTS = 5
+BASE_DELAY_S = 2.0
+MAX_DELAY_S = 120.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    idempotency_key TEXT PRIMARY KEY,
+    user_id TEXT,
+    week_id INTEGER,
+    account_sid TEXT NOT NULL,
+    from_number TEXT NOT NULL,
+    to_number TEXT NOT NULL,
+    body TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL DEFAULT 0,
+    sid TEXT,
+    twilio_status TEXT,
+    error TEXT,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS messages_due ON messages (status, next_attempt_at);
+"""
+
+# Message statuses: pending → sending → sent, or back to pending (retry) / failed.
+# A message left in 'sending' by a crash may or may not have reached Twilio; it is
+# never resent automatically (at most once), see Outbox.stuck().
+PENDING, SENDING, SENT, FAILED = "pending", "sending", "sent", "failed"
+
+
+class WhisperDeliveryError(RuntimeError):
+    """A whisper that was not sent: its delivery failed, or it is still pending or in flight."""
+
+    def __init__(self, message: dict):
+        self.message = message
+        self.status = message["status"]
+        self.error = message["error"]
+        super().__init__(f"Whisper to {message['to_number']} not sent ({self.status}): {self.error}")
+
+
+def idempotency_key(user_id, week_id, content: str) -> str:
+    """
+    Key of one whisper: the same user, week and content is only ever sent once.
+
+    content should be stable across re-runs: the reflection's input fingerprint
+    (socratic.reflection_cache_key), not the LLM's wording, which changes every call.
+    """
+    content_hash = hashlib.sha256(content.encode("utf-8")).hexdigest()
+    return hashlib.sha256(f"{user_id}\0{week_id}\0{content_hash}".encode("utf-8")).hexdigest()
+
+
+def _now() -> str:
+    return datetime.now().isoformat(timespec="seconds")
+
+
+class Outbox:
+    """
+    SQLite-backed whisper outbox.
+
+    Usage:
+        outbox = Outbox(DATA_WHISPER_OUTBOX)
+        outbox.enqueue(user_id, week_id, body, account_sid, from_number, to_number)
+        deliver(outbox, {account_sid: auth_token})
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.executescript(SCHEMA)
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def enqueue(
+        self,
+        user_id,
+        week_id,
+        body: str,
+        account_sid: str,
+        from_number: str,
+        to_number: str,
+        content_key: str = None,
+    ) -> dict:
+        """
+        Add a message unless its idempotency key is already in the outbox.
+
+        The key is built from content_key (e.g. the reflection's input fingerprint) when
+        given, otherwise from the body. A message that already failed is put back to
+        pending with the recipient, sender and body given here (e.g. a corrected number)
+        and a fresh retry budget; pending, in-flight and sent messages are left as they are.
+
+        Returns:
+            dict: The stored message; for a duplicate, the existing one (with its status and SID).
+        """
+        key = idempotency_key(user_id, week_id, content_key or body)
+        now = _now()
+        with self._lock, self._conn:
+            self._conn.execute(
+                """
+                INSERT OR IGNORE INTO messages
+                    (idempotency_key, user_id, week_id, account_sid, from_number, to_number,
+                     body, status, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (key, None if user_id is None else str(user_id), week_id, account_sid,
+                 from_number, to_number, body, PENDING, now, now),
+            )
+            self._conn.execute(
+                """
+                UPDATE messages SET
+                    status = ?, attempts = 0, next_attempt_at = 0, account_sid = ?,
+                    from_number = ?, to_number = ?, body = ?, updated_at = ?
+                WHERE idempotency_key = ? AND status = ?
+                """,
+                (PENDING, account_sid, from_number, to_number, body, now, key, FAILED),
+            )
+        return self.get(key)
+
+    def get(self, key: str) -> dict:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM messages WHERE idempotency_key = ?", (key,)).fetchone()
+        return dict(row) if row else None
+
+    def claim_due(self, keys: list = None, limit: int = 100) -> list:
+        """Mark up to `limit` due pending messages as sending and return them."""
+        where = "status = ? AND next_attempt_at <= ?"
+        params = [PENDING, time.time()]
+        if keys is not None:
+            where += f" AND idempotency_key IN ({', '.join('?' * len(keys))})"
+            params.extend(keys)
+
+        with self._lock, self._conn:
+            rows = self._conn.execute(
+                f"SELECT * FROM messages WHERE {where} ORDER BY next_attempt_at LIMIT ?", (*params, limit)
+            ).fetchall()
+            self._conn.executemany(
+                "UPDATE messages SET status = ?, updated_at = ? WHERE idempotency_key = ?",
+                [(SENDING, _now(), row["idempotency_key"]) for row in rows],
+            )
+        return [dict(row) for row in rows]
+
+    def next_due(self, keys: list = None):
+        """Earliest next_attempt_at among pending messages, or None when nothing is pending."""
+        where = "status = ?"
+        params = [PENDING]
+        if keys is not None:
+            where += f" AND idempotency_key IN ({', '.join('?' * len(keys))})"
+            params.extend(keys)
+        with self._lock:
+            return self._conn.execute(f"SELECT MIN(next_attempt_at) FROM messages WHERE {where}", params).fetchone()[0]
+
+    def _update(self, key: str, **fields) -> None:
+        fields["updated_at"] = _now()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"UPDATE messages SET {assignments} WHERE idempotency_key = ?", (*fields.values(), key)
+            )
+
+    def mark_sent(self, key: str, attempts: int, sid: str, twilio_status: str) -> None:
+        self._update(key, status=SENT, attempts=attempts, sid=sid, twilio_status=twilio_status, error=None)
+
+    def mark_retry(self, key: str, attempts: int, error: str, delay_s: float) -> None:
+        self._update(key, status=PENDING, attempts=attempts, error=error, next_attempt_at=time.time() + delay_s)
+
+    def mark_failed(self, key: str, attempts: int, error: str) -> None:
+        self._update(key, status=FAILED, attempts=attempts, error=error)
+
+    def stuck(self, older_than_s: float = 600) -> list:
+        """Messages left in 'sending' (e.g. by a crash), to check in the Twilio console before requeueing."""
+        cutoff = datetime.fromtimestamp(time.time() - older_than_s).isoformat(timespec="seconds")
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM messages WHERE status = ? AND updated_at < ?", (SENDING, cutoff)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def requeue(self, key: str) -> None:
+        """Put a stuck or failed message back to pending (it may then be delivered twice)."""
+        self._update(key, status=PENDING, next_attempt_at=0)
+
+    def counts(self) -> dict:
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM messages GROUP BY status").fetchall()
+        return {status: n for status, n in rows}
+
+
+_outboxes = {}
+_outboxes_lock = threading.Lock()
+
+
+def get_outbox(path: str) -> Outbox:
+    """Shared Outbox for path, one connection per process."""
+    with _outboxes_lock:
+        outbox = _outboxes.get(path)
+        if outbox is None:
+            outbox = _outboxes[path] = Outbox(path)
+        return outbox
+
+
+_send_limiters = {}
+
+
+def _send_limiter(sends_per_min: int) -> RateLimiter:
+    with _outboxes_lock:
+        limiter = _send_limiters.get(sends_per_min)
+        if limiter is None:
+            limiter = _send_limiters[sends_per_min] = RateLimiter(rpm=sends_per_min)
+        return limiter
+
+
+def _is_retryable(error: Exception) -> bool:
+    if isinstance(error, TwilioRestException):
+        return error.status == 429 or error.status >= 500
+    return isinstance(error, (requests.ConnectionError, requests.Timeout, httpx.TransportError))
+
+
+def _backoff_delay(attempt: int) -> float:
+    return random.uniform(0, min(MAX_DELAY_S, BASE_DELAY_S * 2 ** attempt))
+
+
+def deliver(
+    outbox: Outbox,
+    credentials: dict,
+    keys: list = None,
+    max_workers: int = DEFAULT_SEND_WORKERS,
+    sends_per_min: int = DEFAULT_SENDS_PER_MIN,
+    max_attempts: int = MAX_ATTEMPTS,
+    wait: bool = True,
+    rate_limiter: RateLimiter = None,
+    transport: Transport = None,
+) -> dict:
+    """
+    Send the outbox's pending messages.
+
+    Messages go out concurrently on max_workers threads, all through one transport
+    (the shared Twilio client by default), no faster than sends_per_min. 429/5xx/connection errors are retried with
+    jittered exponential backoff up to max_attempts; other errors fail the message.
+
+    Args:
+        outbox (Outbox): The outbox.
+        credentials (dict): account_sid → auth_token (tokens are never stored in the outbox).
+        keys (list): Only deliver these idempotency keys; all pending messages if None.
+        wait (bool): Keep going until no retry is scheduled; if False, make one pass and
+            leave backed-off messages pending for a later call.
+        sends_per_min (int): Send rate limit; None sends as fast as the workers allow.
+        rate_limiter (RateLimiter): Send budget; by default one shared by every deliver()
+            call in the process at sends_per_min, so concurrent graph runs share it too.
+        transport (Transport): Where messages go; transports.DEFAULT_TRANSPORT if None.
+
+    Returns:
+        dict: Message counts per status after delivery.
+    """
+    limiter = rate_limiter or (_send_limiter(sends_per_min) if sends_per_min else None)
+    transport = transport or get_transport()
+
+    def _send(message):
+        key = message["idempotency_key"]
+        attempts = message["attempts"] + 1
+        try:
+            auth_token = credentials[message["account_sid"]]
+            if limiter:
+                limiter.acquire(0)
+            response = transport.send(
+                message["body"],
+                message["from_number"],
+                message["to_number"],
+                message["account_sid"],
+                auth_token,
+                retry=attempts > 1,
+            )
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            if _is_retryable(e) and attempts < max_attempts:
+                outbox.mark_retry(key, attempts, error, _backoff_delay(attempts - 1))
+            else:
+                print(f"❌ Whisper to {message['to_number']} failed: {error}")
+                outbox.mark_failed(key, attempts, error)
+            return
+        outbox.mark_sent(key, attempts, response["sid"], response["status"])
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        while True:
+            batch = outbox.claim_due(keys, limit=max_workers * 4)
+            if batch:
+                list(pool.map(propagate(_send), batch))
+                continue
+
+            next_due = outbox.next_due(keys)
+            if next_due is None or not wait:
+                break
+            time.sleep(max(next_due - time.time(), 0.05))
+
+    return outbox.counts()
+
+
+class _TimedTransport(Transport):
+    """Wraps a transport, recording when each send started and how long it took."""
+
+    def __init__(self, transport: Transport):
+        self.transport = transport
+        self.name = transport.name
+        self.sends = []  # (started, elapsed_s), perf_counter clock
+        self._lock = threading.Lock()
+
+    def send(self, body, from_number, to_number, account_sid=None, auth_token=None, retry=False):
+        started = time.perf_counter()
+        try:
+            return self.transport.send(body, from_number, to_number, account_sid, auth_token, retry=retry)
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self.sends.append((started, elapsed))
+
+
+def _percentiles_ms(values: list) -> dict:
+    if not values:
+        return {"p50": None, "p95": None, "p99": None}
+    if len(values) == 1:
+        return {p: round(values[0] * 1000, 1) for p in ("p50", "p95", "p99")}
+    cuts = statistics.quantiles(values, n=100, method="inclusive")
+    return {"p50": round(cuts[49] * 1000, 1), "p95": round(cuts[94] * 1000, 1), "p99": round(cuts[98] * 1000, 1)}
+
+
+def simulate_deliveries(
+    n: int = 10000,
+    transport: Transport = None,
+    max_workers: int = DEFAULT_SEND_WORKERS,
+    sends_per_min: int = None,
+    max_attempts: int = MAX_ATTEMPTS,
+    outbox_path: str = None,
+) -> dict:
+    """
+    Load-test the send path: enqueue n simulated whispers and deliver them.
+
+    Only the outbox and the transport are exercised (no graph, no LLM). Use the
+    "local" transport to imitate Twilio's API with its latency and 429s, or "jsonl"
+    to measure the outbox alone.
+
+    Args:
+        n (int): Messages to send (one user each, so none is deduplicated).
+        transport (Transport): Defaults to get_transport("local").
+        max_workers (int): Concurrent sends.
+        sends_per_min (int): Send rate limit; None for unlimited.
+        outbox_path (str): Outbox to use; a temporary one (deleted afterwards) if None.
+
+    Returns:
+        dict: Message counts, elapsed time, sends per second, and p50/p95/p99 in ms of
+        queue wait (enqueued → send started; includes any backoff) and send latency.
+    """
+    timed = _TimedTransport(transport or get_transport("local"))
+    temp_dir = None
+    if outbox_path is None:
+        temp_dir = tempfile.TemporaryDirectory()
+        outbox_path = os.path.join(temp_dir.name, "outbox.sqlite")
+
+    outbox = Outbox(outbox_path)
+    try:
+        keys = []
+        for i in range(n):
+            stored = outbox.enqueue(
+                f"load-{i}", None, f"🌿 Reflective Insight:\nSimulated whisper {i}\n",
+                account_sid="AClocal", from_number="whatsapp:+10000000000", to_number=f"whatsapp:+1{i:010d}",
+            )
+            keys.append(stored["idempotency_key"])
+
+        # Everything is enqueued before delivery starts: queue wait is measured from here
+        started = time.perf_counter()
+        deliver(
+            outbox,
+            {"AClocal": "local"},
+            max_workers=max_workers,
+            sends_per_min=sends_per_min,
+            max_attempts=max_attempts,
+            transport=timed,
+        )
+        elapsed = time.perf_counter() - started
+        counts = outbox.counts()
+    finally:
+        outbox.close()
+        if temp_dir is not None:
+            temp_dir.cleanup()
+
+    stats = {
+        "transport": timed.name,
+        "messages": n,
+        "sends": len(timed.sends),
+        "counts": counts,
+        "elapsed_s": round(elapsed, 2),
+        "sends_per_s": round(len(timed.sends) / elapsed, 1) if elapsed > 0 else 0.0,
+        "queue_wait_ms": _percentiles_ms(sorted(s - started for s, _ in timed.sends)),
+        "send_latency_ms": _percentiles_ms(sorted(e for _, e in timed.sends)),
+    }
+    print(
+        f"📨 {n} whispers via {stats['transport']} in {stats['elapsed_s']}s "
+        f"({stats['sends_per_s']} sends/s, {counts.get(SENT, 0)} sent, {counts.get(FAILED, 0)} failed); "
+        f"send p50/p95/p99 {stats['send_latency_ms']['p50']}/{stats['send_latency_ms']['p95']}/"
+        f"{stats['send_latency_ms']['p99']} ms"
+    )
+    return stats